@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks of the Bedford Basin Monitoring Program analysis
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Times download_bbmp_data() against a local HTTP server with a synthetic
+bbmp_aggregated_profiles.csv and plot_hovmoeller() for growing numbers of
+casts (the real file has roughly 1000 casts).
+"""
+
+#%% Import all packages which we will need
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from pipeline import benchmark, standins, synthetic
+
+import analysis
+
+
+#%%
+@benchmark.case('bbmp.download_bbmp_data', sizes=[100, 1000, 10000])
+def bench_download(ncasts, workdir):
+
+    # synthetic aggregated profiles served from a local directory
+    srvdir = os.path.join(workdir, 'server')
+    synthetic.write_bbmp_csv(os.path.join(srvdir, 'bbmp.csv'), ncasts)
+
+    with standins.serve_directory(srvdir) as url:
+        yield lambda: analysis.download_bbmp_data(
+            'bbmp.nc', url='{}/bbmp.csv'.format(url))
+
+
+#%%
+@benchmark.case('bbmp.download_bbmp_data.flaky', sizes=[100, 1000, 10000])
+def bench_download_flaky(ncasts, workdir):
+
+    srvdir = os.path.join(workdir, 'server')
+    fname = synthetic.write_bbmp_csv(os.path.join(srvdir, 'bbmp.csv'), ncasts)
+
+    # the connection drops three times, after a quarter of the file each
+    drop_after = os.path.getsize(fname) // 4 + 1
+
+    with standins.serve_flaky(srvdir, drop_after=drop_after, ndrops=3) as url:
+        yield lambda: analysis.download_bbmp_data(
+            'bbmp.nc', url='{}/bbmp.csv'.format(url))
+
+
+#%%
+@benchmark.case('bbmp.plot_hovmoeller', sizes=[100, 1000, 10000])
+def bench_plot_hovmoeller(ncasts, workdir):
+
+    ds = synthetic.bbmp_dataset(ncasts)
+
+    def target():
+        fig, ax = plt.subplots()
+        analysis.plot_hovmoeller(ds, 'temperature', ax)
+        fig.savefig(os.path.join(workdir, 'hovmoeller.png'))
+        plt.close(fig)
+
+    return target
+
+
+#%%
+@benchmark.case('bbmp.ftp_read_casts', sizes=[100, 1000])
+def bench_ftp_read_casts(ncasts, workdir):
+
+    from pipeline import ftpcasts
+
+    # per-cast files in yearly directories served by a local FTP server
+    srvdir = os.path.join(workdir, 'server')
+    files = synthetic.write_bbmp_casts(
+        os.path.join(srvdir, ftpcasts.BBMP_CSV_DIR), ncasts)
+    years = sorted({os.path.basename(os.path.dirname(f)) for f in files})
+
+    with standins.serve_ftp(srvdir) as (host, port):
+        with ftpcasts.CastClient(host, port, nsessions=4) as client:
+
+            def target():
+                casts = client.read_casts(client.list_years(years))
+                return {'ncasts': len(casts)}
+
+            yield target
+
+
+#%%
+@benchmark.case('bbmp.convert_casts', sizes=[100, 1000, 5000])
+def bench_convert_casts(ncasts, workdir):
+
+    from pipeline import castarchive
+
+    indir = os.path.join(workdir, 'casts')
+    synthetic.write_bbmp_casts(indir, ncasts)
+    outfile = os.path.join(workdir, 'bbmp_casts.h5')
+
+    return lambda: castarchive.convert_directory(indir, outfile)
+
+
+#%%
+@benchmark.case('bbmp.add_derived', sizes=[1000, 10000])
+def bench_add_derived(ncasts, workdir):
+
+    from pipeline import derived
+
+    ds = synthetic.bbmp_dataset(ncasts)
+
+    return lambda: derived.add_derived(ds, recompute_sigma=True)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks of the removal of duplicate (time, pressure) rows
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Finds ('find') and removes ('drop') the duplicate (time, pressure) rows of
+a synthetic BBMP archive (sizes: number of rows) with a MultiIndex
+(set_index -> index.duplicated -> loc, as tutorial 03 did) and with
+pipeline/dedup.py. The rows are in the order of the file (sorted by time and
+pressure) or shuffled (packed int64 keys).
+"""
+
+#%% Import all packages which we will need
+import numpy as np
+import pandas as pd
+
+from pipeline import benchmark, dedup, synthetic
+
+SIZES = [100000, 1000000, 10000000]
+
+COLUMNS = ['time_string', 'pressure', 'temperature', 'salinity',
+           'sigmaTheta', 'oxygen']
+
+# casts per block of the archive
+BLOCK = 1000
+
+
+#%%
+def _archive(nrows, order):
+    '''
+    Synthetic archive of nrows rows. Blocks of casts are shifted by 2 hours
+    (weekly casts from 1999 would run past the datetime64[ns] range).
+    '''
+
+    block = synthetic.bbmp_profiles(BLOCK)[COLUMNS]
+    block['time_string'] = pd.to_datetime(block['time_string'],
+                                          format='%Y-%m-%d %H:%M:%S')
+
+    nblocks = -(-nrows // len(block))
+    df = pd.concat([block.assign(time_string=block['time_string'] +
+                                 pd.Timedelta(hours=2 * ii))
+                    for ii in range(nblocks)], ignore_index=True)
+
+    if order == 'file':
+        index = np.argsort(df['time_string'].values, kind='stable')
+    else:
+        index = np.random.default_rng(42).permutation(len(df))
+
+    return df.take(index[:nrows]).reset_index(drop=True)
+
+
+#%%
+def _multiindex(df, drop):
+    '''
+    Duplicates found or removed with a MultiIndex.
+    '''
+
+    df = df.set_index(['time_string', 'pressure'])
+    first = ~df.index.duplicated(keep='first')
+
+    return df.loc[first] if drop else first
+
+
+#%%
+def _packed(df, drop):
+    '''
+    Duplicates found or removed with pipeline/dedup.py.
+    '''
+
+    if drop:
+        return dedup.drop_duplicates(df)[0]
+
+    return dedup.find_duplicates(df)[0]
+
+
+#%%
+def _register(step, method, order):
+
+    name = 'dedup.{0}.{1}.{2}'.format(step, method, order)
+
+    @benchmark.case(name, sizes=SIZES)
+    def bench_dedup(nrows, workdir):
+
+        df = _archive(nrows, order)
+        func = _multiindex if method == 'multiindex' else _packed
+
+        def target():
+            out = func(df, step == 'drop')
+            nkept = len(out) if step == 'drop' else int(out.sum())
+            return {'nduplicates': len(df) - nkept}
+
+        return target
+
+
+for step in ['find', 'drop']:
+    for method in ['multiindex', 'packed']:
+        for order in ['file', 'shuffled']:
+            _register(step, method, order)
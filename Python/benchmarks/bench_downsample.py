@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks of the whole-mission depth trace of tutorial 02
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Times plotting and drawing the depth trace of a glider mission with all
+samples and downsampled with pipeline/downsample.py. The largest difference
+between the extremes of the plotted and of all samples is reported as
+`extreme_error` (0: all dive extremes are shown).
+"""
+
+#%% Import all packages which we will need
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+
+from pipeline import benchmark, downsample, synthetic
+
+# number of samples of the mission
+SIZES = [100000, 1000000, 4000000]
+
+
+#%%
+def _mission(nrows):
+    '''
+    Synthetic glider mission with time index.
+    '''
+
+    df = synthetic.glider_profiles(nrows)
+    df['time'] = pd.to_datetime(df['time'], format='%Y-%m-%dT%H:%M:%SZ')
+
+    return df.set_index('time')
+
+
+#%%
+def _register(method):
+
+    @benchmark.case('plot.depth_trace.{}'.format(method), sizes=SIZES)
+    def bench_depth_trace(nrows, workdir):
+
+        import matplotlib.pyplot as plt
+
+        df = _mission(nrows)
+        depth = df['depth'].values
+
+        def target():
+            fig, ax = plt.subplots(figsize=(9.3, 7.5))
+            if method == 'full':
+                line, = ax.plot(df.index, df['depth'], color='grey')
+            else:
+                line = downsample.plot(ax, df.index, df['depth'],
+                                       method=method, color='grey')
+            fig.canvas.draw()
+            plt.close(fig)
+
+            # did the plot keep the deepest and shallowest sample?
+            shown = np.asarray(line.get_ydata(), dtype=float)
+            error = max(abs(np.nanmax(shown) - np.nanmax(depth)),
+                        abs(np.nanmin(shown) - np.nanmin(depth)))
+            return {'npoints': shown.size, 'extreme_error': error}
+
+        return target
+
+
+for method in ['full', 'minmax', 'lttb']:
+    _register(method)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks of the multi-format export
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Writes a synthetic glider mission (sizes: number of samples) with
+pipeline/export.py to each format alone, and to all formats one after the
+other and at the same time. Parquet is only used if pyarrow or fastparquet
+is installed.
+"""
+
+#%% Import all packages which we will need
+import importlib.util
+import os
+
+import pandas as pd
+
+from pipeline import benchmark, export, synthetic
+
+SIZES = [100000, 1000000]
+
+# suffixes of the formats
+SUFFIXES = ['.csv', '.h5', '.nc']
+if any(importlib.util.find_spec(engine) is not None
+       for engine in ['pyarrow', 'fastparquet']):
+    SUFFIXES.append('.parquet')
+
+
+#%%
+def _mission(nrows):
+    '''
+    Synthetic glider mission with time index.
+    '''
+
+    df = synthetic.glider_profiles(nrows)
+    df['time'] = pd.to_datetime(df['time'], format='%Y-%m-%dT%H:%M:%SZ')
+
+    return df.set_index('time')
+
+
+#%%
+def _register(suffix):
+
+    @benchmark.case('export.format{}'.format(suffix), sizes=SIZES)
+    def bench_format(nrows, workdir):
+
+        df = _mission(nrows)
+        outfile = os.path.join(workdir, 'mission' + suffix)
+
+        def target():
+            sizes = export.export(df, [outfile])
+            return {'nbytes': sum(sizes.values())}
+
+        return target
+
+
+for suffix in SUFFIXES:
+    _register(suffix)
+
+
+#%%
+def _register_all(parallel):
+
+    name = 'export.all.{}'.format('parallel' if parallel else 'sequential')
+
+    @benchmark.case(name, sizes=SIZES)
+    def bench_all(nrows, workdir):
+
+        df = _mission(nrows)
+        outfiles = [os.path.join(workdir, 'mission' + suffix)
+                    for suffix in SUFFIXES]
+
+        def target():
+            sizes = export.export(df, outfiles, parallel=parallel)
+            return {'nbytes': sum(sizes.values())}
+
+        return target
+
+
+for parallel in [False, True]:
+    _register_all(parallel)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks of the figure server
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Requests the Hovmoeller diagram of the temperature of a synthetic BBMP cube
+from pipeline/figserver.py over HTTP: rendered by a worker process ('cold',
+sizes: number of casts; the cache is cleared before each call) and from the
+cache ('hit', sizes: number of requests, reported as `ms_per_request`).
+"""
+
+#%% Import all packages which we will need
+import os
+import time
+import urllib.request
+
+from pipeline import benchmark, cli, figserver, synthetic
+
+PATH = '/hovmoeller.png?var=temperature'
+
+# casts of the cube of the 'hit' case
+NCASTS = 500
+
+
+#%%
+def _server(ncasts):
+    '''
+    Figure server of a synthetic BBMP cube in the working directory, and
+    its base URL.
+    '''
+
+    os.makedirs(os.path.dirname(cli.BBMP_NC), exist_ok=True)
+    synthetic.bbmp_dataset(ncasts).to_netcdf(cli.BBMP_NC)
+
+    server = figserver.FigureServer(jobs=1)
+    url = server.listen(port=0)
+
+    return server, url
+
+
+#%%
+def _get(url):
+
+    with urllib.request.urlopen(url) as response:
+        return len(response.read()), response.headers['X-Cache']
+
+
+#%%
+@benchmark.case('figserver.cold', sizes=[500, 2000])
+def bench_cold(ncasts, workdir):
+
+    server, url = _server(ncasts)
+
+    def target():
+        server.cache.clear()
+        nbytes, cache = _get(url + PATH)
+        assert cache == 'miss'
+        return {'nbytes': nbytes}
+
+    try:
+        yield target
+    finally:
+        server.close()
+
+
+#%%
+@benchmark.case('figserver.hit', sizes=[100, 1000])
+def bench_hit(nrequests, workdir):
+
+    server, url = _server(NCASTS)
+    _get(url + PATH)
+
+    def target():
+        tic = time.perf_counter()
+        for _ in range(nrequests):
+            nbytes, cache = _get(url + PATH)
+        assert cache == 'hit'
+        ms = 1e3 * (time.perf_counter() - tic) / nrequests
+        return {'nbytes': nbytes, 'ms_per_request': ms}
+
+    try:
+        yield target
+    finally:
+        server.close()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks of the glider and OISST data processing
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Times get_glider_data() against a local ERDDAP-like HTTP server, get_oisst()
+with a local directory of synthetic daily OISST files, and the animation of
+tutorial 05 (which needs ffmpeg).
+"""
+
+#%% Import all packages which we will need
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+import pandas as pd
+
+from pipeline import benchmark, standins, synthetic
+
+import tutorial_05
+
+
+#%%
+@benchmark.case('glider.get_glider_data', sizes=[10000, 100000, 1000000])
+def bench_get_glider_data(nrows, workdir):
+
+    ID = 'synthetic_glider'
+
+    # ERDDAP serves the data as <ID>.csvp, the query string is ignored by the
+    # local server
+    srvdir = os.path.join(workdir, 'server')
+    synthetic.write_glider_csvp(os.path.join(srvdir, ID + '.csvp'), nrows)
+
+    with standins.serve_directory(srvdir) as url:
+        yield lambda: tutorial_05.get_glider_data(ID, base_url=url)
+
+
+#%%
+@benchmark.case('oisst.get_oisst', sizes=[2, 8, 32])
+def bench_get_oisst(ndays, workdir):
+
+    dates = pd.date_range('2015-10-27', periods=ndays, freq='D')
+    srvdir = os.path.join(workdir, 'oisst')
+    synthetic.write_oisst_days(srvdir, dates)
+
+    # load the lazily opened data to include reading in the timing
+    return lambda: tutorial_05.get_oisst(dates, base_url=srvdir).load()
+
+
+#%%
+@benchmark.case('animation.animate_glider_sst', sizes=[2, 8, 32])
+def bench_animation(ndays, workdir):
+
+    # glider samples every 4 seconds for ndays
+    nrows = ndays * 21600
+    df = synthetic.glider_profiles(nrows).dropna()
+    df['time'] = pd.to_datetime(df['time'], format='%Y-%m-%dT%H:%M:%SZ')
+    df = df.set_index('time')
+
+    dates = df.index.normalize().unique()
+    srvdir = os.path.join(workdir, 'oisst')
+    synthetic.write_oisst_days(srvdir, dates)
+    sst = tutorial_05.get_oisst(dates, base_url=srvdir)
+
+    extent = [df['lon'].min() - 5. + 360., df['lon'].max() + 5. + 360.,
+              df['lat'].min() - 5., df['lat'].max() + 5.]
+    sst = sst.sel(lon=slice(extent[0], extent[1]),
+                  lat=slice(extent[2], extent[3])).load()
+
+    outfile = os.path.join(workdir, 'animations', 'synthetic.mp4')
+
+    return lambda: tutorial_05.animate_glider_sst(df, sst, extent, outfile)
+
+
+#%%
+@benchmark.case('matchup.glider_sst_matchup', sizes=[100000, 1000000, 10000000])
+def bench_matchup(nrows, workdir):
+
+    from pipeline import matchup
+
+    # keep all samples, so nrows is the number of interpolated points
+    df = synthetic.glider_profiles(nrows).dropna()
+    df['time'] = pd.to_datetime(df['time'], format='%Y-%m-%dT%H:%M:%SZ')
+    df = df.set_index('time')
+
+    # daily SST fields which enclose the whole track in time
+    dates = pd.date_range(df.index[0].normalize(),
+                          df.index[-1].normalize() + pd.Timedelta('1D'))
+    srvdir = os.path.join(workdir, 'oisst')
+    synthetic.write_oisst_days(srvdir, dates)
+    sst = tutorial_05.get_oisst(dates, base_url=srvdir).load()
+
+    return lambda: matchup.glider_sst_matchup(df, sst, z_lim=float('inf'))
+
+
+#%%
+@benchmark.case('glider.qc_flags', sizes=[100000, 1000000, 5000000])
+def bench_qc_flags(nrows, workdir):
+
+    from pipeline import qc
+
+    df = synthetic.glider_profiles(nrows)
+
+    return lambda: qc.flag_dataframe(df, qc.GLIDER_TESTS, group='profile_id')
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks of the HDF5 stores of glider data
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Compares the fixed-format store written with HDFStore.put() (the whole file
+is rewritten for every update and read for every selection) with the
+appendable table of pipeline/gliderstore.py for growing missions: adding one
+day of new samples and reading one day of data.
+"""
+
+#%% Import all packages which we will need
+import os
+
+import pandas as pd
+
+from pipeline import benchmark, gliderstore, synthetic
+
+# number of samples in the store (4 seconds sampling: 21600 samples per day)
+SIZES = [100000, 1000000, 4000000]
+
+# samples of one day
+NDAY = 21600
+
+
+#%%
+def _mission(nrows):
+    '''
+    Synthetic glider mission with time index, and the samples of the next day.
+    '''
+
+    df = synthetic.glider_profiles(nrows + NDAY)
+    df['time'] = pd.to_datetime(df['time'], format='%Y-%m-%dT%H:%M:%SZ')
+    df = df.set_index('time')
+
+    return df.iloc[:nrows], df.iloc[nrows:]
+
+
+#%%
+def _put(df, outfile):
+    '''
+    Write the data like get_glider_data() did before (fixed format).
+    '''
+
+    with pd.HDFStore(outfile, 'w') as store:
+        store.put('df', df, data_columns=df.columns)
+
+
+#%%
+@benchmark.case('gliderstore.update.rewrite', sizes=SIZES)
+def bench_update_rewrite(nrows, workdir):
+
+    df, new = _mission(nrows)
+    full = pd.concat([df, new])
+    outfile = os.path.join(workdir, 'fixed.h5')
+
+    def target():
+        _put(full, outfile)
+        return {'nbytes': os.path.getsize(outfile)}
+
+    return target
+
+
+#%%
+@benchmark.case('gliderstore.update.append', sizes=SIZES)
+def bench_update_append(nrows, workdir):
+
+    df, new = _mission(nrows)
+    outfile = os.path.join(workdir, 'table.h5')
+    gliderstore.write_store(df, outfile)
+
+    # each call adds the same day again, which hardly changes the size
+    def target():
+        gliderstore.append_store(new, outfile)
+        return {'nbytes': os.path.getsize(outfile)}
+
+    return target
+
+
+#%%
+@benchmark.case('gliderstore.read_day.fixed', sizes=SIZES)
+def bench_read_day_fixed(nrows, workdir):
+
+    df, new = _mission(nrows)
+    outfile = os.path.join(workdir, 'fixed.h5')
+    _put(df, outfile)
+
+    # the last full day of the mission
+    stop = df.index[-1].normalize()
+    start = stop - pd.Timedelta(days=1)
+
+    return lambda: gliderstore.read_store(outfile, start, stop)
+
+
+#%%
+@benchmark.case('gliderstore.read_day.table', sizes=SIZES)
+def bench_read_day_table(nrows, workdir):
+
+    df, new = _mission(nrows)
+    outfile = os.path.join(workdir, 'table.h5')
+    gliderstore.write_store(df, outfile)
+
+    stop = df.index[-1].normalize()
+    start = stop - pd.Timedelta(days=1)
+
+    return lambda: gliderstore.read_store(outfile, start, stop)
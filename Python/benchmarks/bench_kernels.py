@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks of the gridding and binning kernels
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Compares the backends of pipeline/kernels.py with the pandas path:
+gridding the BBMP profiles (sizes: number of casts) and the mean, count and
+standard deviation of glider temperature in 1 m depth bins (sizes: number of
+samples). The largest difference to the pandas result is reported as
+`max_diff` (0 for the gridding if the datasets are identical). The numba
+cases are only registered if Numba is installed.
+"""
+
+#%% Import all packages which we will need
+import numpy as np
+import pandas as pd
+
+from pipeline import benchmark, kernels, synthetic
+
+# backends which are compared
+BACKENDS = ['pandas', 'numpy'] + (['numba'] if kernels.numba else [])
+
+GRID_SIZES = [100, 1000, 10000]
+BIN_SIZES = [100000, 1000000, 4000000]
+
+COLUMNS = ['time_string', 'pressure', 'temperature', 'salinity',
+           'sigmaTheta', 'oxygen']
+
+
+#%%
+def _keep(p):
+    return (p % .5 == 0.) & (p <= 70.)
+
+
+#%%
+def _profiles(ncasts):
+    '''
+    Synthetic BBMP profiles as after reading and quality control.
+    '''
+
+    df = synthetic.bbmp_profiles(ncasts)[COLUMNS]
+    df['time_string'] = pd.to_datetime(df['time_string'],
+                                       format='%Y-%m-%d %H:%M:%S')
+
+    return df
+
+
+#%%
+def _binned_pandas(index, values, nbins):
+    '''
+    Count, mean and standard deviation per bin with pandas groupby.
+    '''
+
+    stats = pd.Series(values).groupby(index).agg(['count', 'mean', 'std'])
+    stats = stats.reindex(np.arange(nbins))
+
+    return (stats['count'].fillna(0).values, stats['mean'].values,
+            stats['std'].values)
+
+
+#%%
+def _register(backend):
+
+    @benchmark.case('kernels.grid.{}'.format(backend), sizes=GRID_SIZES)
+    def bench_grid(ncasts, workdir):
+
+        df = _profiles(ncasts)
+        ref = kernels.grid_profiles(df, keep=_keep, backend='pandas')
+
+        def target():
+            ds = kernels.grid_profiles(df, keep=_keep, backend=backend)
+            return {'max_diff': 0. if ds.identical(ref) else np.inf}
+
+        return target
+
+    @benchmark.case('kernels.binned_stats.{}'.format(backend),
+                    sizes=BIN_SIZES)
+    def bench_binned_stats(nrows, workdir):
+
+        df = synthetic.glider_profiles(nrows)
+        index = np.floor(df['depth'].values).astype(np.int64)
+        values = df['temperature'].values
+        nbins = int(index.max()) + 1
+        ref = _binned_pandas(index, values, nbins)
+
+        def target():
+            if backend == 'pandas':
+                stats = _binned_pandas(index, values, nbins)
+            else:
+                stats = kernels.binned_stats(index, values, nbins,
+                                             backend=backend)
+            diff = max(np.nanmax(np.abs(a - b)) for a, b in zip(stats, ref))
+            return {'max_diff': float(diff), 'nbins': nbins}
+
+        return target
+
+
+for backend in BACKENDS:
+    _register(backend)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks of the along-track sections of glider data
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Times building the (distance, depth) section of pipeline/section.py from the
+glider store, plotting it from the cached section file, and for comparison
+the scatter plot of all samples which the tutorials draw (only up to 1
+million samples, it takes more than 20 s for 4 million).
+"""
+
+#%% Import all packages which we will need
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+import pandas as pd
+
+from pipeline import benchmark, gliderstore, section, synthetic
+
+# number of samples of the mission
+SIZES = [100000, 1000000, 4000000]
+
+ID = 'synthetic_glider'
+
+
+#%%
+def _store(nrows, workdir):
+    '''
+    Write a synthetic glider mission to a glider store.
+    '''
+
+    df = synthetic.glider_profiles(nrows)
+    df['time'] = pd.to_datetime(df['time'], format='%Y-%m-%dT%H:%M:%SZ')
+    df = df.set_index('time')
+
+    infile = os.path.join(workdir, 'data', 'raw', ID + '.h5')
+    gliderstore.write_store(df, infile)
+
+    return df, infile
+
+
+#%%
+@benchmark.case('section.build', sizes=SIZES)
+def bench_build(nrows, workdir):
+
+    df, infile = _store(nrows, workdir)
+    outdir = os.path.join(workdir, 'sections')
+
+    def target():
+        # the section file is removed, so it is built every time
+        outfile = section.section_file(ID, outdir=outdir)
+        if os.path.isfile(outfile):
+            os.remove(outfile)
+        ds = section.get_section(ID, infile=infile, outdir=outdir)
+        return {'nbytes': os.path.getsize(outfile),
+                'nbins': ds['nsamples'].size}
+
+    return target
+
+
+#%%
+@benchmark.case('section.plot_cached', sizes=SIZES)
+def bench_plot_cached(nrows, workdir):
+
+    import matplotlib.pyplot as plt
+
+    df, infile = _store(nrows, workdir)
+    outdir = os.path.join(workdir, 'sections')
+    section.get_section(ID, infile=infile, outdir=outdir)
+
+    def target():
+        ds = section.get_section(ID, infile=infile, outdir=outdir)
+        ax = section.plot_section(ds, 'temperature')
+        ax.figure.canvas.draw()
+        plt.close(ax.figure)
+
+    return target
+
+
+#%%
+@benchmark.case('section.plot_scatter', sizes=SIZES[:2])
+def bench_plot_scatter(nrows, workdir):
+
+    import cmocean.cm as cmo
+    import matplotlib.pyplot as plt
+
+    df, infile = _store(nrows, workdir)
+
+    def target():
+        df = gliderstore.read_store(infile)
+        fig, ax = plt.subplots(figsize=(9.3, 5.))
+        ax.scatter(df.index, df['depth'], c=df['temperature'], s=3,
+                   cmap=cmo.thermal)
+        fig.canvas.draw()
+        plt.close(fig)
+
+    return target
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks of the segmentation of glider data
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Times the dive/climb segmentation and leg detection of pipeline/segment.py,
+and for comparison the offsets of the profiles from the profile_id column of
+the server with pandas groupby. The largest difference between the detected
+profile boundaries and the changes of the synthetic profile_id is reported as
+`boundary_error` (in samples).
+"""
+
+#%% Import all packages which we will need
+import numpy as np
+import pandas as pd
+
+from pipeline import benchmark, segment, synthetic
+
+# number of samples of the mission
+SIZES = [100000, 1000000, 4000000]
+
+
+#%%
+def _mission(nrows):
+    '''
+    Synthetic glider mission with time index.
+    '''
+
+    df = synthetic.glider_profiles(nrows)
+    df['time'] = pd.to_datetime(df['time'], format='%Y-%m-%dT%H:%M:%SZ')
+
+    return df.set_index('time')
+
+
+#%%
+@benchmark.case('segment.profiles', sizes=SIZES)
+def bench_profiles(nrows, workdir):
+
+    df = _mission(nrows)
+    changes = np.flatnonzero(np.diff(df['profile_id'].values)) + 1
+
+    def target():
+        offsets = segment.profiles(df)
+        start = offsets['start'].values[1:]
+        error = (np.abs(start - changes).max()
+                 if start.size == changes.size else np.inf)
+        return {'nprofiles': len(offsets), 'boundary_error': float(error)}
+
+    return target
+
+
+#%%
+@benchmark.case('segment.groupby_profile_id', sizes=SIZES)
+def bench_groupby_profile_id(nrows, workdir):
+
+    df = _mission(nrows)
+
+    def target():
+        rows = pd.Series(np.arange(len(df)), index=df.index)
+        offsets = rows.groupby(df['profile_id'].values).agg(['min', 'max'])
+        return {'nprofiles': len(offsets)}
+
+    return target
+
+
+#%%
+@benchmark.case('segment.legs', sizes=SIZES)
+def bench_legs(nrows, workdir):
+
+    df = _mission(nrows)
+
+    def target():
+        legs = segment.legs(df)
+        return {'nlegs': len(legs)}
+
+    return target
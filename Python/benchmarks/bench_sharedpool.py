@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks of the shared-memory worker pool
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Runs the same analysis over a global OISST cube (one correlation map with
+the SST at a reference point per task) in JOBS worker processes, which
+either open and decode the NetCDF file themselves or attach to the cube in
+shared memory (pipeline/sharedpool.py). The time includes loading and
+sharing the cube. The private memory of all workers is reported as
+`worker_private_mb`; the shared cube is counted once as `shared_mb`.
+"""
+
+#%% Import all packages which we will need
+import collections
+import concurrent.futures
+import os
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from pipeline import benchmark, sharedpool
+
+# number of days of the global OISST cube (0.25 degree grid)
+SIZES = [10, 30, 60]
+
+JOBS = 4
+
+# one task per reference point
+NTASKS = 8
+
+
+#%%
+def _cube(ndays, workdir, res=.25, seed=42):
+    '''
+    Write a global OISST-like cube (time, lat, lon) and return the file name.
+    '''
+
+    rng = np.random.default_rng(seed)
+
+    lat = np.arange(-90. + res / 2., 90., res)
+    lon = np.arange(res / 2., 360., res)
+    base = 28. * np.cos(np.deg2rad(lat))[:, np.newaxis] - 1.
+
+    sst = np.empty((ndays, lat.size, lon.size), dtype=np.float32)
+    for ii in range(ndays):
+        sst[ii] = base + .3 * rng.standard_normal((lat.size, lon.size))
+
+    ds = xr.Dataset({'sst': (('time', 'lat', 'lon'), sst)},
+                    coords={'time': pd.date_range('2016-01-01',
+                                                  periods=ndays),
+                            'lat': lat, 'lon': lon})
+
+    outfile = os.path.join(workdir, 'oisst.nc')
+    ds.to_netcdf(outfile)
+
+    return outfile
+
+
+#%%
+def _private_mb():
+    '''
+    Private (not shared) memory of this process in MB (Linux only).
+    '''
+
+    total = 0
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith(('Private_Clean', 'Private_Dirty')):
+                    total += int(line.split()[1])
+    except OSError:
+        return np.nan
+
+    return total / 1024.
+
+
+#%%
+def _correlation(sst, itask):
+    '''
+    Correlation of the SST everywhere with the SST at one reference point.
+    '''
+
+    x = sst.values
+    n = x.shape[0]
+    ref = x[:, 100 + 60 * itask, 20 + 170 * itask].astype(np.float64)
+
+    # moments without temporary copies of the cube
+    ref = (ref - ref.mean()) / ref.std()
+    cov = np.tensordot(ref.astype(np.float32), x, axes=(0, 0)) / n
+    mean = x.mean(axis=0)
+    var = np.einsum('ijk,ijk->jk', x, x) / n - mean ** 2
+    corr = cov / np.sqrt(np.maximum(var, 1e-12))
+
+    return os.getpid(), _private_mb(), float(np.nanmax(np.abs(corr)))
+
+
+#%%
+def _task_reopen(infile, itask):
+    with xr.open_dataset(infile) as ds:
+        return _correlation(ds['sst'].load(), itask)
+
+
+#%%
+def _task_shared(key, itask):
+    return _correlation(sharedpool.get(key)['sst'], itask)
+
+
+#%%
+def _metrics(results):
+    '''
+    Sum of the largest private memory of each worker.
+    '''
+
+    peak = collections.defaultdict(float)
+    for pid, mb, _ in results:
+        peak[pid] = max(peak[pid], mb)
+
+    return {'worker_private_mb': sum(peak.values()), 'nworkers': len(peak)}
+
+
+#%%
+@benchmark.case('sharedpool.reopen', sizes=SIZES)
+def bench_reopen(ndays, workdir):
+
+    infile = _cube(ndays, workdir)
+
+    def target():
+        with concurrent.futures.ProcessPoolExecutor(JOBS) as ex:
+            results = list(ex.map(_task_reopen, [infile] * NTASKS,
+                                  range(NTASKS)))
+        return _metrics(results)
+
+    return target
+
+
+#%%
+@benchmark.case('sharedpool.attach', sizes=SIZES)
+def bench_attach(ndays, workdir):
+
+    infile = _cube(ndays, workdir)
+
+    def target():
+        with sharedpool.SharedPool({'oisst': infile}, jobs=JOBS) as pool:
+            results = list(pool.map(_task_shared, ['oisst'] * NTASKS,
+                                    range(NTASKS)))
+            nbytes = pool.nbytes
+        metrics = _metrics(results)
+        metrics['shared_mb'] = nbytes / 1024. ** 2
+        return metrics
+
+    return target
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks of the SST maps of the tutorial 05 animation
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Times the rendering of one SST map frame with 255 levels of filled contours
+(as tutorial 05 did before) and with the renderer of pipeline/sstmap.py
+(image or QuadMesh which is updated for each frame). The sizes are the number
+of grid points per degree of the map (OISST: 4). The RMS difference to the
+contourf frame is reported as `rms_diff`.
+"""
+
+#%% Import all packages which we will need
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+
+from pipeline import benchmark, sstmap
+
+# grid points per degree
+SIZES = [4, 10, 20]
+
+# map extent of the tutorial 05 glider mission (OISST longitudes)
+EXTENT = [290., 310., 38., 52.]
+
+# frames rendered per call
+NFRAMES = 10
+
+# colour scale of tutorial 05
+VMIN, VMAX = 3., 27.
+
+
+#%%
+def _sst(npd, nframes=NFRAMES, seed=42):
+    '''
+    Smooth synthetic SST maps with a land mask (NaN) on the map extent.
+    '''
+
+    rng = np.random.default_rng(seed)
+
+    res = 1. / npd
+    lon = np.arange(EXTENT[0] + res / 2., EXTENT[1], res)
+    lat = np.arange(EXTENT[2] + res / 2., EXTENT[3], res)
+    x, y = np.meshgrid(lon, lat)
+
+    # meridional gradient with a few eddies that drift from frame to frame
+    sst = np.empty((nframes, lat.size, lon.size), dtype=np.float32)
+    centres = rng.uniform([EXTENT[0], EXTENT[2]], [EXTENT[1], EXTENT[3]],
+                          size=(8, 2))
+    for frame in range(nframes):
+        field = 28. * np.cos(np.deg2rad(y)) - 3.
+        for cx, cy in centres + .2 * frame:
+            field += 3. * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / 2.)
+        sst[frame] = field
+
+    # land in the north-west corner
+    sst[:, (y - 44.) > .8 * (300. - x)] = np.nan
+
+    return lon, lat, sst
+
+
+#%%
+def _figure(lon, lat, sst, method, extent=EXTENT):
+    '''
+    Map figure and a function which draws the SST map of a frame.
+    '''
+
+    import cartopy.crs as ccrs
+    import cmocean.cm as cmo
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(6., 4.5), dpi=100)
+    ax = fig.add_subplot(111, projection=ccrs.PlateCarree())
+    ax.set_extent(extent, crs=ccrs.PlateCarree())
+
+    if method == 'contourf':
+
+        def draw(frame):
+            # remove the contours of the previous frame, which the
+            # animation kept drawing underneath
+            for coll in list(ax.collections):
+                coll.remove()
+            ax.contourf(lon, lat, sst[frame], 255, vmin=VMIN, vmax=VMAX,
+                        cmap=cmo.thermal, transform=ccrs.PlateCarree())
+    else:
+        renderer = sstmap.SSTMap(ax, lon, lat, method=method, vmin=VMIN,
+                                 vmax=VMAX, cmap=cmo.thermal)
+
+        def draw(frame):
+            renderer.update(sst[frame])
+
+    return fig, draw
+
+
+#%%
+def _register(method):
+
+    @benchmark.case('sstmap.frame.{}'.format(method), sizes=SIZES)
+    def bench_frame(npd, workdir):
+
+        import matplotlib.pyplot as plt
+
+        lon, lat, sst = _sst(npd)
+        fig, draw = _figure(lon, lat, sst, method)
+
+        # difference to the first frame of the contourf renderer, on the
+        # area between the outer grid points (contourf leaves the outer half
+        # grid cells blank) and without land (contourf ends at the last grid
+        # point at the coast, the image half a grid cell later, which is
+        # covered by the land polygons in the animation)
+        inner = [lon[0], lon[-1], lat[0], lat[-1]]
+        ocean = np.where(np.isnan(sst), np.nanmean(sst), sst)
+        figs = [_figure(lon, lat, ocean, name, inner)
+                for name in ['contourf', method]]
+        for ff, draw_ff in figs:
+            draw_ff(0)
+        rms_diff = sstmap.compare(figs[0][0], figs[1][0])
+        for ff, draw_ff in figs:
+            plt.close(ff)
+
+        def target():
+            tic = time.perf_counter()
+            for frame in range(NFRAMES):
+                draw(frame)
+                fig.canvas.draw()
+            ms = 1e3 * (time.perf_counter() - tic) / NFRAMES
+            return {'ms_per_frame': ms, 'rms_diff': rms_diff}
+
+        try:
+            yield target
+        finally:
+            plt.close(fig)
+
+
+for method in ['contourf', 'image', 'mesh']:
+    _register(method)
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+""" Benchmark of the start-up time of the command-line interface
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Times the import of the 'fetch' subcommand in a fresh interpreter. The budget
+is checked with 'python -m pipeline startup'.
+"""
+
+#%% Import all packages which we will need
+from pipeline import benchmark, cli
+
+
+#%%
+@benchmark.case('startup.fetch_import', sizes=[1])
+def bench_fetch_import(size, workdir):
+
+    def target():
+        seconds, heavy = cli.fetch_import_time()
+        return {'import_s': seconds, 'heavy_modules': heavy}
+
+    return target
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks of the NetCDF storage of the BBMP cube
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Compares the default output of Dataset.to_netcdf() with the chunked and
+compressed layouts of pipeline/storage.py: write time and file size (reported
+as nbytes), and the two common reads, the time series at one depth and the
+profile at one time.
+"""
+
+#%% Import all packages which we will need
+import os
+
+import xarray as xr
+
+from pipeline import benchmark, storage, synthetic
+
+# layouts which are compared: name -> function(ds, outfile)
+LAYOUTS = {'default': lambda ds, outfile: ds.to_netcdf(outfile),
+           'float32': storage.write_netcdf,
+           'int16': lambda ds, outfile: storage.write_netcdf(ds, outfile,
+                                                             pack=True)}
+
+SIZES = [500, 2000, 10000]
+
+# number of time series / profiles read per timed call
+NREADS = 20
+
+
+#%%
+def _prepare(ncasts, workdir, layout):
+    '''
+    Write a synthetic BBMP cube in a layout and return the file name.
+    '''
+
+    ds = synthetic.bbmp_dataset(ncasts)
+    outfile = os.path.join(workdir, 'bbmp_{}.nc'.format(layout))
+    LAYOUTS[layout](ds, outfile)
+
+    return outfile
+
+
+#%%
+def _register(layout):
+
+    @benchmark.case('storage.write.{}'.format(layout), sizes=SIZES)
+    def bench_write(ncasts, workdir):
+
+        ds = synthetic.bbmp_dataset(ncasts)
+        outfile = os.path.join(workdir, 'bbmp.nc')
+
+        def target():
+            LAYOUTS[layout](ds, outfile)
+            return {'nbytes': os.path.getsize(outfile)}
+
+        return target
+
+    @benchmark.case('storage.read_depth.{}'.format(layout), sizes=SIZES)
+    def bench_read_depth(ncasts, workdir):
+
+        fname = _prepare(ncasts, workdir, layout)
+
+        def target():
+            for ii in range(NREADS):
+                with xr.open_dataset(fname) as ds:
+                    ds['temperature'].isel(pressure=ii * 7).load()
+
+        return target
+
+    @benchmark.case('storage.read_profile.{}'.format(layout), sizes=SIZES)
+    def bench_read_profile(ncasts, workdir):
+
+        fname = _prepare(ncasts, workdir, layout)
+        step = max(ncasts // NREADS, 1)
+
+        def target():
+            for ii in range(NREADS):
+                with xr.open_dataset(fname) as ds:
+                    ds['temperature'].isel(time=(ii * step) % ncasts).load()
+
+        return target
+
+
+for layout in LAYOUTS:
+    _register(layout)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+""" Benchmarks of the weekly regridding of the BBMP cube
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Times the regridding of pipeline/weekly.py (sizes: number of casts, with
+every tenth cast missing and a gap of 30 casts) and reading the cached
+weekly cube. For comparison, Dataset.interp() of xarray interpolates onto
+the same axis (without gap masks).
+"""
+
+#%% Import all packages which we will need
+import os
+
+import numpy as np
+
+from pipeline import benchmark, synthetic, weekly
+
+SIZES = [500, 2000, 10000]
+
+
+#%%
+def _casts(ncasts):
+    '''
+    Synthetic BBMP cube with irregular casts.
+    '''
+
+    ds = synthetic.bbmp_dataset(ncasts)
+    keep = np.arange(ncasts) % 10 != 3
+    keep[ncasts // 2:ncasts // 2 + 30] = False
+
+    return ds.isel(time=keep)
+
+
+#%%
+def _register(method):
+
+    @benchmark.case('weekly.regrid.{}'.format(method), sizes=SIZES)
+    def bench_regrid(ncasts, workdir):
+
+        ds = _casts(ncasts)
+
+        def target():
+            dsw = weekly.regrid(ds, method=method)
+            return {'nweeks': dsw.sizes['time'],
+                    'ngaps': int(dsw['gap'].sum())}
+
+        return target
+
+
+for method in weekly.METHODS:
+    _register(method)
+
+
+#%%
+@benchmark.case('weekly.xarray_interp', sizes=SIZES)
+def bench_xarray_interp(ncasts, workdir):
+
+    ds = _casts(ncasts)
+
+    def target():
+        dsw = ds.interp(time=weekly.weekly_axis(ds['time'].values))
+        return {'nweeks': dsw.sizes['time']}
+
+    return target
+
+
+#%%
+@benchmark.case('weekly.read_cached', sizes=SIZES)
+def bench_read_cached(ncasts, workdir):
+
+    infile = os.path.join(workdir, 'bbmp.nc')
+    outfile = os.path.join(workdir, 'bbmp_weekly.nc')
+    _casts(ncasts).to_netcdf(infile)
+    weekly.get_weekly(infile, outfile)
+
+    def target():
+        dsw = weekly.get_weekly(infile, outfile)
+        return {'nbytes': os.path.getsize(outfile)}
+
+    return target
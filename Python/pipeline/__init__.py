@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+""" Shared pipeline tools for the Bedford Basin and glider tutorials
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+This package collects helper modules which are used by the data analysis
+scripts of the individual tutorials (e.g. tutorial_04/src/analysis.py and
+tutorial_05/src/tutorial_05.py). The tutorial scripts make it importable by
+adding the Python/ directory to the search path.
+"""
+
+import os
+import sys
+
+# directories of the tutorials' source code
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BBMP_SRC = os.path.join(PYTHON_DIR, 'tutorial_04', 'src')
+GLIDER_SRC = os.path.join(PYTHON_DIR, 'tutorial_05', 'src')
+
+
+def add_tutorial_paths():
+    '''
+    Make the tutorial modules (analysis.py and tutorial_05.py) importable.
+    '''
+
+    for path in (BBMP_SRC, GLIDER_SRC):
+        if path not in sys.path:
+            sys.path.append(path)
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+""" Entry point for 'python -m pipeline', see pipeline/cli.py """
+
+import sys
+
+from pipeline import cli
+
+sys.exit(cli.main())
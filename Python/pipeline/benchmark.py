@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+""" Benchmark runner for the data pipelines
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Benchmark cases live in Python/benchmarks/bench_*.py. Each case is a function
+which takes the problem size and a temporary working directory, prepares the
+input data, and returns (or yields) the function which is timed:
+
+    from pipeline import benchmark
+
+    @benchmark.case('bbmp.plot_hovmoeller', sizes=[100, 1000])
+    def bench_plot(ncasts, workdir):
+        ds = synthetic.bbmp_dataset(ncasts)
+        return lambda: analysis.plot_hovmoeller(ds, 'temperature', ax)
+
+A generator is useful if something has to be cleaned up afterwards, e.g. a
+local server which is running during the timing.
+
+Results are stored as JSON files named after the current git commit in
+Python/benchmarks/results, so that runs of different commits can be compared:
+
+    python -m pipeline.benchmark run
+    python -m pipeline.benchmark compare <commit1> <commit2>
+"""
+
+#%% Import all packages which we will need
+import argparse
+import collections
+import datetime
+import glob
+import importlib.util
+import inspect
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+from pipeline import PYTHON_DIR, add_tutorial_paths, instrument
+
+# default locations of benchmark cases and results
+BENCH_DIR = os.path.join(PYTHON_DIR, 'benchmarks')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+# registry of all benchmark cases: name -> (function, sizes)
+CASES = collections.OrderedDict()
+
+
+#%%
+def case(name, sizes):
+    '''
+    Decorator which registers a benchmark case.
+
+    Input:
+    - name: name of the benchmark case
+    - sizes: list of problem sizes for the size sweep
+    '''
+
+    def decorator(func):
+        CASES[name] = (func, list(sizes))
+        return func
+
+    return decorator
+
+
+#%%
+def load_cases(bench_dir=BENCH_DIR):
+    '''
+    Import all bench_*.py files which register their cases on import.
+    '''
+
+    add_tutorial_paths()
+
+    for fname in sorted(glob.glob(os.path.join(bench_dir, 'bench_*.py'))):
+
+        modname = os.path.splitext(os.path.basename(fname))[0]
+        spec = importlib.util.spec_from_file_location(modname, fname)
+        module = importlib.util.module_from_spec(spec)
+
+        # registered, so that functions of the module can be sent to worker
+        # processes
+        sys.modules[modname] = module
+
+        try:
+            spec.loader.exec_module(module)
+        except ImportError as err:
+            # cases with missing optional dependencies are skipped
+            del sys.modules[modname]
+            print('Skipping {0}: {1}'.format(modname, err))
+
+
+#%%
+def _metric(name, value):
+    '''
+    Return a metric reported by a benchmark case as JSON scalar (NumPy
+    scalars are converted to Python numbers).
+    '''
+
+    if getattr(value, 'ndim', None) == 0 and hasattr(value, 'item'):
+        value = value.item()
+
+    if value is not None and not isinstance(value, (bool, int, float, str)):
+        raise TypeError('metric {0!r} is a {1}, not a number or string'.format(
+            name, type(value).__name__))
+
+    return value
+
+
+#%%
+def run_case(name, size, repeat=3):
+    '''
+    Run a single benchmark case for one problem size.
+
+    Input:
+    - name: name of a registered benchmark case
+    - size: problem size
+    - (optional) repeat: number of timed repetitions
+
+    Output:
+    - result: dictionary with timings (seconds), peak memory and the metrics
+      of the case (or an error message)
+    '''
+
+    func = CASES[name][0]
+    result = {'case': name, 'size': size, 'repeat': repeat}
+
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    cwd = os.getcwd()
+
+    try:
+        # the pipeline functions write relative to the working directory
+        os.chdir(workdir)
+
+        # setup is not timed
+        setup = func(size, workdir)
+        if inspect.isgenerator(setup):
+            target = next(setup)
+        else:
+            target = setup
+
+        # the RSS is sampled while the target runs, so the peak is the one
+        # of this case (not of all cases which ran in this process)
+        try:
+            times = []
+            with instrument.RSSSampler() as sampler:
+                for ii in range(repeat):
+                    t0 = time.perf_counter()
+                    extra = target()
+                    times.append(time.perf_counter() - t0)
+        finally:
+            if inspect.isgenerator(setup):
+                setup.close()
+
+        result.update({'min_s': min(times),
+                       'median_s': statistics.median(times),
+                       'max_s': max(times),
+                       'peak_rss_mb': sampler.peak_mb})
+
+        # cases may report additional metrics (e.g. file sizes), a value
+        # which cannot be stored fails this case, not the whole report
+        if isinstance(extra, dict):
+            result.update({key: _metric(key, value)
+                           for key, value in extra.items()})
+
+    except Exception:
+        result['error'] = traceback.format_exc(limit=3)
+
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return result
+
+
+#%%
+def git_commit():
+    '''
+    Return the hash of the current git commit (with a suffix if there are
+    uncommitted changes) or 'unknown' outside of a git repository.
+    '''
+
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PYTHON_DIR,
+            stderr=subprocess.DEVNULL).decode().strip()
+        dirty = subprocess.check_output(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=PYTHON_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+    return commit + '-dirty' if dirty else commit
+
+
+#%%
+def run(pattern='', quick=False, repeat=3, outdir=RESULTS_DIR):
+    '''
+    Run all registered benchmark cases and store the results.
+
+    Input:
+    - (optional) pattern: only run cases whose name contains pattern
+    - (optional) quick: only run the smallest size of each case
+    - (optional) repeat: number of timed repetitions
+    - (optional) outdir: directory for result files
+
+    Output:
+    - outfile: name of the result file
+    '''
+
+    load_cases()
+
+    results = []
+    for name, (func, sizes) in CASES.items():
+
+        if pattern not in name:
+            continue
+
+        for size in (sizes[:1] if quick else sizes):
+
+            res = run_case(name, size, repeat=repeat)
+            results.append(res)
+
+            if 'error' in res:
+                print('{0:40s} {1:>10} FAILED'.format(name, size))
+            else:
+                print('{0:40s} {1:>10} {2:10.4f} s'.format(name, size,
+                                                         res['min_s']))
+
+    commit = git_commit()
+    report = {'commit': commit,
+              'date': datetime.datetime.now().isoformat(),
+              'python': sys.version.split()[0],
+              'platform': platform.platform(),
+              'results': results}
+
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    outfile = os.path.join(outdir, '{}.json'.format(commit))
+    with open(outfile, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    return outfile
+
+
+#%%
+def load_results(commit, outdir=RESULTS_DIR):
+    '''
+    Read stored results of a commit as dictionary (case, size) -> result.
+    '''
+
+    with open(os.path.join(outdir, '{}.json'.format(commit))) as f:
+        report = json.load(f)
+
+    return {(r['case'], r['size']): r for r in report['results']
+            if 'error' not in r}
+
+
+#%%
+def compare(base, head, threshold=1.1, outdir=RESULTS_DIR):
+    '''
+    Compare the results of two commits and print the ratio of the minimum
+    times. Ratios above threshold are marked as regressions.
+
+    Input:
+    - base: commit of the reference results
+    - head: commit of the new results
+    - (optional) threshold: ratio head/base which counts as regression
+
+    Output:
+    - regressions: list of (case, size, ratio) of all regressions
+    '''
+
+    res0 = load_results(base, outdir)
+    res1 = load_results(head, outdir)
+
+    regressions = []
+    for key in sorted(set(res0) & set(res1), key=str):
+
+        ratio = res1[key]['min_s'] / res0[key]['min_s']
+        flag = ''
+        if ratio > threshold:
+            flag = 'REGRESSION'
+            regressions.append(key + (ratio,))
+
+        print('{0:40s} {1:>10} {2:8.2f}x {3}'.format(key[0], key[1], ratio,
+                                                     flag))
+
+    return regressions
+
+
+#%%
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    sub = parser.add_subparsers(dest='command')
+
+    prun = sub.add_parser('run', help='run benchmarks of the current commit')
+    prun.add_argument('-k', '--pattern', default='',
+                      help='only run cases whose name contains PATTERN')
+    prun.add_argument('--quick', action='store_true',
+                      help='only run the smallest size of each case')
+    prun.add_argument('--repeat', type=int, default=3)
+
+    pcmp = sub.add_parser('compare', help='compare results of two commits')
+    pcmp.add_argument('base')
+    pcmp.add_argument('head')
+    pcmp.add_argument('--threshold', type=float, default=1.1)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        print(run(args.pattern, quick=args.quick, repeat=args.repeat))
+    elif args.command == 'compare':
+        if compare(args.base, args.head, threshold=args.threshold):
+            return 1
+    else:
+        parser.print_help()
+
+    return 0
+
+
+#%%
+if __name__ == "__main__":
+
+    # the benchmark files register their cases in pipeline.benchmark, which
+    # is a different module object than __main__
+    from pipeline import benchmark
+    sys.exit(benchmark.main())
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+""" Bulk conversion of per-cast BBMP files into one indexed archive
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Each per-cast file of the Bedford Basin Monitoring Program starts with 10
+lines of metadata ('name: value') followed by the CSV data of the cast (see
+tutorial_01/src/get_data.py). This module parses thousands of these files in
+a process pool and writes them into a single HDF5 file with two tables:
+
+- 'casts': one row per cast with the metadata (time, position, ...), indexed
+  by cast ID, and the rows of the cast in the data table (start, stop)
+- 'data': the data of all casts with a cast_id column, written in chunks
+
+    from pipeline import castarchive
+
+    meta = castarchive.convert_directory('data/raw/casts',
+                                         'data/processed/bbmp_casts.h5')
+    df = castarchive.read_cast('data/processed/bbmp_casts.h5', 'D17667001')
+"""
+
+#%% Import all packages which we will need
+import concurrent.futures
+import glob
+import io
+import os
+import time
+
+import pandas as pd
+
+from pipeline import instrument
+from pipeline.ftpcasts import HEADER_LINES
+
+# maximum length of the strings in the archive
+ID_LENGTH = 16
+TEXT_LENGTH = 64
+
+
+#%%
+def parse_header(lines):
+    '''
+    Parse the metadata lines of a cast file into a dictionary. The names are
+    converted to lower case with underscores, e.g. 'Cast ID' -> 'cast_id'.
+
+    Input:
+    - lines: list of metadata lines ('name: value', str or bytes)
+
+    Output:
+    - attrs: dictionary name -> value (str)
+    '''
+
+    attrs = {}
+
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('latin-1')
+        name, sep, value = line.partition(':')
+        if sep:
+            attrs[name.strip().lower().replace(' ', '_')] = value.strip()
+
+    return attrs
+
+
+#%%
+def read_cast_file(source):
+    '''
+    Read the metadata and the data of a cast file.
+
+    Input:
+    - source: file name or tuple (name, bytes) with the content of the file
+
+    Output:
+    - attrs: dictionary with the metadata
+    - df: pandas.DataFrame() with the data of the cast
+    '''
+
+    if isinstance(source, tuple):
+        name, f = source[0], io.BytesIO(source[1])
+    else:
+        name, f = source, open(source, 'rb')
+
+    with f:
+        attrs = parse_header([f.readline() for ii in range(HEADER_LINES)])
+        df = pd.read_csv(f)
+
+    # fall back to the file name if the header has no cast ID
+    attrs.setdefault('cast_id', os.path.splitext(os.path.basename(name))[0])
+
+    return attrs, df
+
+
+#%%
+def _parse_batch(sources):
+    '''
+    Parse a batch of cast files (in a worker process) into one table of
+    metadata and one table of data.
+    '''
+
+    meta = []
+    data = []
+
+    for source in sources:
+        attrs, df = read_cast_file(source)
+        attrs['nrows'] = len(df)
+        df.insert(0, 'cast_id', attrs['cast_id'])
+        meta.append(attrs)
+        data.append(df)
+
+    return pd.DataFrame(meta), pd.concat(data, ignore_index=True)
+
+
+#%%
+def _clean_metadata(meta):
+    '''
+    Convert the metadata columns to proper types.
+    '''
+
+    if 'time' in meta:
+        meta['time'] = pd.to_datetime(meta['time'])
+
+    for col in ['latitude', 'longitude', 'number_of_scans']:
+        if col in meta:
+            meta[col] = pd.to_numeric(meta[col], errors='coerce')
+
+    # end of the rows of each cast in the data table
+    meta['stop'] = meta['nrows'].cumsum()
+    meta['start'] = meta['stop'] - meta['nrows']
+
+    return meta.drop(columns='nrows').set_index('cast_id')
+
+
+#%%
+def convert_casts(sources, outfile, nprocs=4, batch=64, complib='blosc:lz4',
+                  complevel=5):
+    '''
+    Parse cast files in a process pool and write them into one archive.
+
+    Input:
+    - sources: list of file names or tuples (name, bytes)
+    - outfile: name of the HDF5 archive (overwritten)
+    - (optional) nprocs: number of worker processes
+    - (optional) batch: number of casts parsed per task
+    - (optional) complib: compression library (zlib is several times slower)
+    - (optional) complevel: compression level of the archive
+
+    Output:
+    - meta: pandas.DataFrame() with the metadata of all casts
+    '''
+
+    outdir = os.path.dirname(outfile)
+    if outdir and not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    batches = [sources[i0:i0 + batch] for i0 in range(0, len(sources), batch)]
+
+    t0 = time.perf_counter()
+    meta = []
+    columns = None
+
+    with instrument.stage('castarchive.convert_casts'), \
+            concurrent.futures.ProcessPoolExecutor(nprocs) as ex, \
+            pd.HDFStore(outfile, 'w', complevel=complevel,
+                        complib=complib) as store:
+
+        # batches are written in order as soon as they are parsed, so the
+        # rows of each cast are contiguous in the data table
+        for bmeta, bdata in ex.map(_parse_batch, batches):
+
+            # all batches must have the columns of the first one
+            if columns is None:
+                columns = list(bdata.columns)
+            bdata = bdata.reindex(columns=columns)
+
+            store.append('data', bdata, format='table', index=False,
+                         data_columns=['cast_id'],
+                         min_itemsize={'cast_id': ID_LENGTH},
+                         expectedrows=len(bdata) * len(batches))
+            meta.append(bmeta)
+
+        if not meta:
+            raise ValueError('No cast files to convert')
+
+        meta = _clean_metadata(pd.concat(meta, ignore_index=True))
+
+        # index the cast IDs once after all data are appended
+        store.create_table_index('data', columns=['cast_id'])
+
+        text = meta.select_dtypes(['object', 'string']).columns
+        store.put('casts', meta, format='table', data_columns=True,
+                  min_itemsize=dict({'index': ID_LENGTH},
+                                    **{c: TEXT_LENGTH for c in text}))
+
+    seconds = time.perf_counter() - t0
+    print('converted {0} casts in {1:.2f} s ({2:.0f} casts/s)'.format(
+        len(meta), seconds, len(meta) / seconds))
+
+    return meta
+
+
+#%%
+def convert_directory(indir, outfile, nprocs=4, batch=64):
+    '''
+    Convert all cast files (*.csv) in a directory and its subdirectories
+    (e.g. the yearly directories written by 'python -m pipeline fetch casts').
+    '''
+
+    files = sorted(glob.glob(os.path.join(indir, '**', '*.csv'),
+                             recursive=True))
+
+    return convert_casts(files, outfile, nprocs=nprocs, batch=batch)
+
+
+#%%
+def convert_ftp(client, paths, outfile, nprocs=4, batch=64):
+    '''
+    Read cast files over FTP (see ftpcasts.CastClient) and convert them. The
+    files are only transferred into memory and parsed in the process pool.
+    '''
+
+    raw = client.read_casts(paths, parser=lambda f: f.read())
+    sources = [(path, raw[os.path.splitext(os.path.basename(path))[0]])
+               for path in paths]
+
+    return convert_casts(sources, outfile, nprocs=nprocs, batch=batch)
+
+
+#%%
+def read_metadata(archive):
+    '''
+    Return the metadata of all casts in an archive.
+    '''
+
+    return pd.read_hdf(archive, 'casts')
+
+
+#%%
+def read_cast(archive, cast_id):
+    '''
+    Return the data of a single cast from an archive.
+
+    Input:
+    - archive: name of the HDF5 archive
+    - cast_id: ID of the cast, e.g. 'D17667001'
+
+    Output:
+    - df: pandas.DataFrame() with the data of the cast
+    '''
+
+    with pd.HDFStore(archive, 'r') as store:
+        row = store.select('casts', where='index == cast_id')
+        if row.empty:
+            raise KeyError(cast_id)
+        df = store.select('data', start=int(row['start'].iloc[0]),
+                          stop=int(row['stop'].iloc[0]))
+
+    return df.reset_index(drop=True)
@@ -0,0 +1,497 @@
+# -*- coding: utf-8 -*-
+""" Command-line interface of the data pipelines
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Run the individual steps of the Bedford Basin and glider pipelines from the
+command line (from the Python/ directory or with Python/ on the search path):
+
+    python -m pipeline fetch bbmp
+    python -m pipeline fetch casts --year 2017 --year 2018
+    python -m pipeline fetch glider --id otn200_20151027_53_delayed
+    python -m pipeline convert
+    python -m pipeline grid
+    python -m pipeline derive
+    python -m pipeline weekly --method bin
+    python -m pipeline plot
+    python -m pipeline plot --each -j 4
+    python -m pipeline animate --id otn200_20151027_53_delayed
+    python -m pipeline section --id otn200_20151027_53_delayed --var salinity
+    python -m pipeline export -i data/processed/bbmp_weekly.nc -o bbmp.csv
+    python -m pipeline follow --id Fundy_20180913_89_realtime
+    python -m pipeline query --load "SELECT source, COUNT(*) FROM obs GROUP BY source"
+    python -m pipeline serve --port 8050 -j 2
+
+or run all steps which are out of date with 'python -m pipeline run -j 4'.
+
+Each subcommand only imports the packages it needs: 'fetch' only uses the
+standard library, 'grid' needs pandas and xarray, 'plot' and 'animate' also
+need matplotlib, cmocean and cartopy. 'python -m pipeline startup' checks that
+the import time of 'fetch' stays within FETCH_IMPORT_BUDGET_S.
+"""
+
+#%% Import all packages which we will need (standard library only!)
+import argparse
+import os
+import subprocess
+import sys
+
+from pipeline import add_tutorial_paths, instrument
+
+# default file names (relative to the working directory)
+BBMP_CSV = 'data/raw/bbmp_aggregated_profiles.csv'
+BBMP_NC = 'data/raw/bedford_basin_monitoring_program.nc'
+BBMP_DERIVED = 'data/processed/bbmp_derived.nc'
+BBMP_WEEKLY = 'data/processed/bbmp_weekly.nc'
+BBMP_FIG = 'figures/bbmp_hovmeoller_diagrams.png'
+BBMP_CASTS = 'data/raw/casts'
+BBMP_ARCHIVE = 'data/processed/bbmp_casts.h5'
+HOLDINGS_DB = 'data/holdings.sqlite'
+GLIDER_ID = 'otn200_20151027_53_delayed'
+REALTIME_ID = 'Fundy_20180913_89_realtime'
+
+# maximum import time of the 'fetch' subcommand in seconds
+FETCH_IMPORT_BUDGET_S = .15
+
+# packages which must not be imported by the 'fetch' subcommand
+HEAVY_MODULES = ['numpy', 'pandas', 'xarray', 'matplotlib', 'cmocean',
+                 'cartopy']
+
+
+#%%
+def cmd_fetch(args):
+    '''
+    Download raw data files.
+    '''
+
+    from pipeline import fetch
+
+    if args.dataset == 'bbmp':
+        fetch.fetch_bbmp(args.output or BBMP_CSV)
+    elif args.dataset == 'casts':
+        from pipeline import ftpcasts
+        import datetime
+        years = args.year or [datetime.date.today().year]
+        with ftpcasts.CastClient(nsessions=args.jobs) as client:
+            paths = client.list_years(years)
+            client.download_casts(paths, args.output or BBMP_CASTS)
+    else:
+        fetch.fetch_glider(args.id, outfile=args.output)
+
+
+#%%
+def cmd_convert(args):
+    '''
+    Convert per-cast BBMP files into one indexed archive.
+    '''
+
+    from pipeline import castarchive
+
+    if args.year:
+        # read the casts straight from the FTP server
+        from pipeline import ftpcasts
+        with ftpcasts.CastClient(nsessions=args.jobs) as client:
+            paths = client.list_years(args.year)
+            castarchive.convert_ftp(client, paths, args.output,
+                                    nprocs=args.jobs)
+    else:
+        castarchive.convert_directory(args.input, args.output,
+                                      nprocs=args.jobs)
+
+
+#%%
+def cmd_grid(args):
+    '''
+    Grid the BBMP profiles onto a (time, pressure) grid and save as NetCDF.
+    '''
+
+    add_tutorial_paths()
+    import analysis
+
+    ds = analysis.grid_bbmp_data(args.input, args.output)
+    ndup = ds['nduplicates']
+    print('{0} casts, removed {1} duplicate rows in {2} casts -> {3}'.format(
+        ds.sizes['time'], int(ndup.sum()), int((ndup > 0).sum()),
+        args.output))
+
+
+#%%
+def cmd_derive(args):
+    '''
+    Add derived variables (N2, mixed-layer depth, ...) to the gridded BBMP
+    data and save them as NetCDF.
+    '''
+
+    from pipeline import derived
+
+    chunks = {'time': args.chunk} if args.chunk else None
+    derived.derive_file(args.input, args.output, chunks=chunks)
+
+
+#%%
+def cmd_weekly(args):
+    '''
+    Regrid the gridded BBMP data onto a weekly time axis and save it as
+    NetCDF.
+    '''
+
+    from pipeline import weekly
+
+    ds = weekly.get_weekly(args.input, args.output, method=args.method)
+    print('{0} weeks, {1} without data -> {2}'.format(
+        ds.sizes['time'], int(ds['gap'].sum()), args.output))
+
+
+#%%
+def cmd_plot(args):
+    '''
+    Plot Hovmoeller diagrams of the gridded BBMP data.
+    '''
+
+    if args.each:
+        from pipeline import tasks
+        tasks.plot_variables(args.input, jobs=args.jobs,
+                             figdir=os.path.dirname(args.output))
+        return
+
+    add_tutorial_paths()
+    import analysis
+    import xarray as xr
+
+    with xr.open_dataset(args.input) as ds:
+        analysis.plot_hovmoeller_figure(ds, args.output)
+
+
+#%%
+def cmd_animate(args):
+    '''
+    Animate OISST maps and the glider track of a glider mission.
+    '''
+
+    add_tutorial_paths()
+    import tutorial_05
+
+    tutorial_05.glider_sst_animation(args.id)
+
+
+#%%
+def cmd_export(args):
+    '''
+    Write a glider store (*.h5) or a NetCDF file to several formats at once.
+    '''
+
+    from pipeline import export
+
+    if args.input.endswith('.nc'):
+        import xarray as xr
+        data = xr.load_dataset(args.input)
+    else:
+        from pipeline import gliderstore
+        data = gliderstore.read_store(args.input)
+
+    sizes = export.export(data, args.output, float_format=args.float_format)
+    for outfile, nbytes in sizes.items():
+        print('{0}: {1:.1f} MB'.format(outfile, nbytes / 1e6))
+
+
+#%%
+def cmd_section(args):
+    '''
+    Build (or read) the along-track section of a glider mission and plot it.
+    '''
+
+    import matplotlib
+    matplotlib.use('Agg')
+
+    from pipeline import section
+
+    ds = section.get_section(args.id, dx=args.dx, dz=args.dz)
+    section.plot_section(ds, args.var, args.output or
+                         'figures/{0}_section_{1}.png'.format(args.id,
+                                                              args.var))
+
+
+#%%
+def cmd_follow(args):
+    '''
+    Poll ERDDAP for new rows of realtime glider deployments.
+    '''
+
+    from pipeline import fetch, realtime
+
+    realtime.follow(args.id or [REALTIME_ID],
+                    base_url=args.url or fetch.ERDDAP_URL,
+                    interval=args.interval, count=1 if args.once else None,
+                    render=not args.no_render, jobs=args.jobs)
+
+
+#%%
+def cmd_serve(args):
+    '''
+    Serve Hovmoeller diagrams and glider sections over HTTP, rendered on
+    request (see figserver.py).
+    '''
+
+    from pipeline import figserver
+
+    with figserver.FigureServer(jobs=args.jobs,
+                                cache_mb=args.cache_mb) as server:
+        url = server.listen(args.host, args.port)
+        print('serving figures at {}/ (Ctrl+C to stop)'.format(url))
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+#%%
+def cmd_run(args):
+    '''
+    Run all outdated steps of the pipelines (see tasks.py).
+    '''
+
+    from pipeline import tasks
+
+    graph = tasks.build_graph(deployments=args.id or [GLIDER_ID])
+
+    if args.list:
+        for name in graph.select(args.targets):
+            print(name)
+        return
+
+    ran = graph.run(args.targets, jobs=args.jobs, force=args.force,
+                    dry_run=args.dry_run)
+
+    if args.dry_run:
+        print('\n'.join(ran) if ran else 'Everything is up to date.')
+
+
+#%%
+def cmd_query(args):
+    '''
+    Load data into the SQL database of the holdings and run a query.
+    '''
+
+    from pipeline import query
+
+    with query.Holdings(args.db) as db:
+
+        if args.load:
+            # gridded BBMP data and all glider stores in data/raw
+            import glob
+            if os.path.isfile(BBMP_NC):
+                db.add_bbmp(BBMP_NC)
+            for fname in sorted(glob.glob('data/raw/*.h5')):
+                db.add_glider(fname)
+
+        for fname in args.glider or []:
+            db.add_glider(fname)
+
+        result = db.query(args.sql) if args.sql else db.sources()
+        print(result.to_string(index=False))
+
+
+#%%
+def fetch_import_time():
+    '''
+    Measure the import time of the 'fetch' subcommand in a fresh interpreter.
+
+    Output:
+    - seconds: import time in seconds
+    - heavy: list of heavy packages which were imported
+    '''
+
+    code = ('import sys, time\n'
+            't0 = time.perf_counter()\n'
+            'from pipeline import cli, fetch\n'
+            'dt = time.perf_counter() - t0\n'
+            'heavy = [m for m in {0!r} if m in sys.modules]\n'
+            'print(dt, *heavy)\n').format(HEAVY_MODULES)
+
+    # run from the Python/ directory so the package can be found
+    pydir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=pydir)
+
+    fields = out.decode().split()
+
+    return float(fields[0]), fields[1:]
+
+
+#%%
+def cmd_startup(args):
+    '''
+    Check the import time of the 'fetch' subcommand against the budget.
+    '''
+
+    # take the best of a few runs to reduce the noise
+    results = [fetch_import_time() for ii in range(args.repeat)]
+    seconds = min(r[0] for r in results)
+    heavy = results[0][1]
+
+    print('fetch import time: {0:.3f} s (budget {1:.3f} s)'.format(
+        seconds, args.budget))
+
+    if heavy:
+        print('heavy packages imported: {}'.format(', '.join(heavy)))
+
+    if heavy or seconds > args.budget:
+        return 1
+
+
+#%%
+def build_parser():
+    '''
+    Set up the argument parser with one subparser per pipeline step.
+    '''
+
+    parser = argparse.ArgumentParser(
+        prog='python -m pipeline',
+        description='Bedford Basin and glider data pipelines')
+    parser.add_argument('-C', '--workdir', default='.',
+                        help='working directory (default: current directory)')
+    parser.add_argument('--report',
+                        help='write timing report to this *.json/*.csv file')
+    sub = parser.add_subparsers(dest='command')
+    sub.required = True
+
+    p = sub.add_parser('fetch', help='download raw data files')
+    p.add_argument('dataset', choices=['bbmp', 'casts', 'glider'])
+    p.add_argument('--id', default=GLIDER_ID, help='glider deployment ID')
+    p.add_argument('--year', type=int, action='append',
+                   help='year of BBMP casts (can be repeated, default: '
+                   'current year)')
+    p.add_argument('-j', '--jobs', type=int, default=4,
+                   help='number of FTP sessions for casts')
+    p.add_argument('-o', '--output', help='name of output file/directory')
+    p.set_defaults(func=cmd_fetch)
+
+    p = sub.add_parser('convert', help='convert BBMP casts to one archive')
+    p.add_argument('-i', '--input', default=BBMP_CASTS,
+                   help='directory with cast files')
+    p.add_argument('--year', type=int, action='append',
+                   help='read casts of this year from the FTP server instead '
+                   '(can be repeated)')
+    p.add_argument('-j', '--jobs', type=int, default=4,
+                   help='number of worker processes and FTP sessions')
+    p.add_argument('-o', '--output', default=BBMP_ARCHIVE)
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser('grid', help='grid BBMP profiles to NetCDF')
+    p.add_argument('-i', '--input', default=BBMP_CSV)
+    p.add_argument('-o', '--output', default=BBMP_NC)
+    p.set_defaults(func=cmd_grid)
+
+    p = sub.add_parser('derive', help='derive N2 and mixed-layer depth')
+    p.add_argument('-i', '--input', default=BBMP_NC)
+    p.add_argument('-o', '--output', default=BBMP_DERIVED)
+    p.add_argument('--chunk', type=int,
+                   help='compute with dask in chunks of this many casts')
+    p.set_defaults(func=cmd_derive)
+
+    p = sub.add_parser('weekly', help='regrid BBMP data onto weekly axis')
+    p.add_argument('-i', '--input', default=BBMP_NC)
+    p.add_argument('-o', '--output', default=BBMP_WEEKLY)
+    p.add_argument('--method', default='linear', choices=['linear', 'bin'],
+                   help='interpolate between casts or average within weeks')
+    p.set_defaults(func=cmd_weekly)
+
+    p = sub.add_parser('plot', help='plot BBMP Hovmoeller diagrams')
+    p.add_argument('-i', '--input', default=BBMP_NC)
+    p.add_argument('-o', '--output', default=BBMP_FIG)
+    p.add_argument('--each', action='store_true',
+                   help='one figure per variable, plotted in parallel')
+    p.add_argument('-j', '--jobs', type=int,
+                   help='number of worker processes (with --each)')
+    p.set_defaults(func=cmd_plot)
+
+    p = sub.add_parser('animate', help='animate glider track and OISST')
+    p.add_argument('--id', default=GLIDER_ID, help='glider deployment ID')
+    p.set_defaults(func=cmd_animate)
+
+    p = sub.add_parser('export', help='write data to several formats')
+    p.add_argument('-i', '--input', required=True,
+                   help='glider store (*.h5) or NetCDF file (*.nc)')
+    p.add_argument('-o', '--output', nargs='+', required=True,
+                   help='output files (*.csv, *.h5, *.parquet, *.nc)')
+    p.add_argument('--float-format',
+                   help="format of floats in CSV files, e.g. '%%.4f'")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('section', help='plot along-track glider section')
+    p.add_argument('--id', default=GLIDER_ID, help='glider deployment ID')
+    p.add_argument('--var', default='temperature',
+                   choices=['temperature', 'salinity', 'density'])
+    p.add_argument('--dx', type=float, default=2.,
+                   help='size of the distance bins in km')
+    p.add_argument('--dz', type=float, default=1.,
+                   help='size of the depth bins in m')
+    p.add_argument('-o', '--output', help='name of the figure')
+    p.set_defaults(func=cmd_section)
+
+    p = sub.add_parser('follow', help='poll realtime glider deployments')
+    p.add_argument('--id', action='append',
+                   help='realtime deployment ID (can be repeated)')
+    p.add_argument('--url', help='URL of ERDDAP tabledap server')
+    p.add_argument('--interval', type=float, default=600.,
+                   help='time between polls in seconds')
+    p.add_argument('--once', action='store_true', help='poll only once')
+    p.add_argument('--no-render', action='store_true',
+                   help='do not render the figures of updated deployments')
+    p.add_argument('-j', '--jobs', type=int, default=1,
+                   help='number of parallel worker processes for figures')
+    p.set_defaults(func=cmd_follow)
+
+    p = sub.add_parser('query', help='run SQL queries on all holdings')
+    p.add_argument('sql', nargs='?',
+                   help='SQL query (default: list the loaded sources)')
+    p.add_argument('--db', default=HOLDINGS_DB, help='database file')
+    p.add_argument('--load', action='store_true',
+                   help='(re)load the BBMP NetCDF file and glider stores')
+    p.add_argument('--glider', action='append',
+                   help='(re)load a glider *.h5/*.csv file (can be repeated)')
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser('serve', help='serve figures rendered on request')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8050)
+    p.add_argument('-j', '--jobs', type=int,
+                   help='number of worker processes which render figures')
+    p.add_argument('--cache-mb', type=float, default=256.,
+                   help='size of the cache of rendered figures in MB')
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser('run', help='run all outdated pipeline steps')
+    p.add_argument('targets', nargs='*',
+                   help='task names or prefixes, e.g. figure or grid:bbmp')
+    p.add_argument('--id', action='append',
+                   help='glider deployment ID (can be repeated)')
+    p.add_argument('-j', '--jobs', type=int, default=1,
+                   help='number of parallel worker processes')
+    p.add_argument('--force', action='store_true',
+                   help='run tasks even if they are up to date')
+    p.add_argument('-n', '--dry-run', action='store_true',
+                   help='only show which tasks would run')
+    p.add_argument('--list', action='store_true', help='list the tasks')
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser('startup', help='check import time of fetch')
+    p.add_argument('--budget', type=float, default=FETCH_IMPORT_BUDGET_S)
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(func=cmd_startup)
+
+    return parser
+
+
+#%%
+def main(argv=None):
+
+    args = build_parser().parse_args(argv)
+
+    os.chdir(args.workdir)
+
+    status = args.func(args)
+
+    if args.report:
+        instrument.write_report(args.report)
+
+    return status or 0
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+""" Pre-clipped and cached land polygons for cartopy maps
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+ax.add_feature(cfeature.NaturalEarthFeature('physical', 'land', '50m')) makes
+cartopy read, project and clip the global land polygons every time the map is
+drawn, e.g. in every frame of an animation. The land around a glider mission
+only covers a few degrees, so here the polygons are
+
+- clipped to the map extent (plus a margin) and projected to the map
+  projection once,
+- saved as WKB file in data/cache/, keyed by scale, extent and projection,
+  so later runs do not touch the global polygons at all,
+- converted to matplotlib paths once per process.
+
+add_land() adds the result as a single PathCollection in the data
+coordinates of the map, which is drawn without any further projection:
+
+    from pipeline import coastline
+
+    ax.set_extent(extent, crs=ccrs.PlateCarree())
+    coastline.add_land(ax, facecolor=[.6, .6, .6])
+"""
+
+#%% Import all packages which we will need
+import functools
+import hashlib
+import os
+
+# directory of the cached geometries (relative to the working directory)
+CACHE_DIR = 'data/cache'
+
+# Natural Earth scale of the land polygons
+LAND_SCALE = '50m'
+
+# margin around the map extent in degrees, so that the edges of the clipped
+# polygons are outside the map
+MARGIN = 1.
+
+
+#%%
+def _normalize_extent(extent):
+    '''
+    Return the extent [lonmin, lonmax, latmin, latmax] with longitudes
+    between -180 and 180 degrees (OISST uses 0 to 360 degrees).
+    '''
+
+    lonmin, lonmax, latmin, latmax = [float(x) for x in extent]
+
+    if lonmin > 180.:
+        lonmin, lonmax = lonmin - 360., lonmax - 360.
+
+    return [lonmin, lonmax, latmin, latmax]
+
+
+#%%
+def cache_file(extent, crs, scale=LAND_SCALE, cachedir=CACHE_DIR):
+    '''
+    Return the name of the cache file of the land polygons of a map.
+
+    Input:
+    - extent: map extent [lonmin, lonmax, latmin, latmax]
+    - crs: cartopy projection of the map
+    - (optional) scale: Natural Earth scale ('10m', '50m' or '110m')
+    - (optional) cachedir: directory of the cache files
+    '''
+
+    # extents which differ by less than 0.001 degrees share the geometry
+    key = '{0}|{1}|{2}'.format(
+        scale, ['{:.3f}'.format(x) for x in _normalize_extent(extent)],
+        crs.proj4_init)
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+
+    return os.path.join(cachedir, 'land_{0}_{1}.wkb'.format(scale, digest))
+
+
+#%%
+def clipped_land(extent, crs=None, scale=LAND_SCALE, cachedir=CACHE_DIR):
+    '''
+    Return the land polygons in the map extent, projected to the map
+    projection. The result is read from the cache file if it exists.
+
+    Input:
+    - extent: map extent [lonmin, lonmax, latmin, latmax] in degrees
+    - (optional) crs: cartopy projection of the map (default: PlateCarree)
+    - (optional) scale: Natural Earth scale ('10m', '50m' or '110m')
+    - (optional) cachedir: directory of the cache files
+
+    Output:
+    - geom: shapely geometry in the coordinates of the map projection
+    '''
+
+    import cartopy.crs as ccrs
+    import shapely
+
+    if crs is None:
+        crs = ccrs.PlateCarree()
+
+    fname = cache_file(extent, crs, scale, cachedir)
+
+    if os.path.isfile(fname):
+        with open(fname, 'rb') as f:
+            return shapely.from_wkb(f.read())
+
+    import cartopy.feature as cfeature
+    from pipeline import instrument
+
+    lonmin, lonmax, latmin, latmax = _normalize_extent(extent)
+    box = shapely.box(lonmin - MARGIN, latmin - MARGIN, lonmax + MARGIN,
+                      latmax + MARGIN)
+
+    with instrument.stage('coastline.clip_project'):
+
+        # only the polygons which intersect the map, clipped to the map
+        land = cfeature.NaturalEarthFeature('physical', 'land', scale)
+        geoms = land.intersecting_geometries(list(box.bounds[::2]) +
+                                             list(box.bounds[1::2]))
+        geom = shapely.intersection(shapely.union_all(list(geoms)), box)
+
+        # project once into the coordinates of the map
+        geom = crs.project_geometry(geom, ccrs.PlateCarree())
+
+    if cachedir and not os.path.isdir(cachedir):
+        os.makedirs(cachedir)
+
+    # write to a temporary file first, so parallel runs never read a
+    # partially written file
+    with open(fname + '.tmp', 'wb') as f:
+        f.write(shapely.to_wkb(geom))
+    os.replace(fname + '.tmp', fname)
+
+    return geom
+
+
+#%%
+@functools.lru_cache(maxsize=16)
+def _land_paths(extent, crs, scale, cachedir):
+    '''
+    Matplotlib paths of the land polygons of a map (kept for the lifetime of
+    the process, e.g. for all frames of an animation).
+    '''
+
+    from cartopy.mpl.path import shapely_to_path
+
+    geom = clipped_land(list(extent), crs, scale, cachedir)
+
+    # the clipped land can also contain lines and points
+    polygons = [g for g in getattr(geom, 'geoms', [geom])
+                if g.geom_type in ('Polygon', 'MultiPolygon') and
+                not g.is_empty]
+
+    return tuple(shapely_to_path(poly) for poly in polygons)
+
+
+#%%
+def add_land(ax, extent=None, scale=LAND_SCALE, cachedir=CACHE_DIR, **kwargs):
+    '''
+    Add land polygons to a cartopy map as a single PathCollection.
+
+    Input:
+    - ax: cartopy GeoAxes (call ax.set_extent() first)
+    - (optional) extent: [lonmin, lonmax, latmin, latmax] in degrees of the
+      clipped land (default: the area shown by the map, which is larger than
+      the extent passed to ax.set_extent() for most projections)
+    - (optional) scale: Natural Earth scale ('10m', '50m' or '110m')
+    - (optional) cachedir: directory of the cache files
+    - (optional) kwargs: properties of the PathCollection, e.g. facecolor,
+      edgecolor, linewidth, zorder
+
+    Output:
+    - collection: matplotlib.collections.PathCollection
+    '''
+
+    import cartopy.crs as ccrs
+    from matplotlib.collections import PathCollection
+
+    if extent is None:
+        extent = ax.get_extent(crs=ccrs.PlateCarree())
+
+    paths = _land_paths(tuple(float(x) for x in extent), ax.projection,
+                        scale, cachedir)
+
+    kwargs.setdefault('zorder', 1.5)
+    collection = PathCollection(paths, transform=ax.transData, **kwargs)
+    ax.add_collection(collection, autolim=False)
+
+    return collection
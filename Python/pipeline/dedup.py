@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+""" Removal of duplicate (time, pressure) rows of the BBMP profiles
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+bbmp_aggregated_profiles.csv contains duplicate (time, pressure) pairs, of
+which only the first row is kept. With pandas this is
+
+    df = df.set_index(['time_string', 'pressure'])
+    df = df.loc[~df.index.duplicated(keep='first')]
+
+which builds a MultiIndex of all rows and hashes its codes. Here the pair of
+each row is packed into one int64 key instead: the number of the cast (the
+rank of its time) times the number of pressure levels plus the pressure as
+integer (pressure * 2 on the 0.5 dbar grid, levels in between are put on a
+finer grid). The keys are in the order of (time, pressure) and there are
+about as many possible keys as rows, so the first row of each key is found
+with np.minimum.at into a table of all possible keys (or with the stable
+sort of np.unique(return_index=True) if the table would be large). If the
+rows are already in the order of (time, pressure), as in the file, the keys
+are not needed: duplicates are neighbours with the same time and pressure.
+
+The result is the same as with pandas for all rows (NaN and NaT included).
+drop_duplicates() also returns the number of rows and removed duplicates of
+each cast:
+
+    from pipeline import dedup
+
+    df, report = dedup.drop_duplicates(df, 'time_string', 'pressure')
+    print(dedup.summary(report))
+"""
+
+#%% Import all packages which we will need
+import numpy as np
+import pandas as pd
+
+# pressure levels per dbar of the packed keys (0.5 dbar grid), and the
+# finest grid which is used for pressures in between
+SCALE = 2
+MAX_SCALE = 1024
+
+# largest table of keys (per row) for unsorted rows
+MAX_TABLE = 4
+
+# int64 value of NaT
+_NAT = np.iinfo(np.int64).min
+
+
+#%%
+def _is_sorted(a):
+    '''
+    True if an array is in ascending order.
+    '''
+
+    return bool((a[1:] >= a[:-1]).all())
+
+
+#%%
+def cast_numbers(time):
+    '''
+    Number of the cast of each row, in the order of the times (NaT last).
+
+    Input:
+    - time: array of datetime64 values
+
+    Output:
+    - code: int64 array with the cast number of each row
+    - casts: datetime64 array with the time of each cast
+    '''
+
+    time = np.asarray(time, dtype='datetime64[ns]')
+    t = time.view(np.int64)
+
+    if t.size and t[0] != _NAT and _is_sorted(t):
+        # the rows of a cast are contiguous
+        new = t[1:] != t[:-1]
+        code = np.zeros(t.size, dtype=np.int64)
+        np.cumsum(new, out=code[1:])
+        start = np.concatenate([[0], np.flatnonzero(new) + 1])
+        return code, time[start]
+
+    code, casts = pd.factorize(time, sort=True)
+    casts = np.asarray(casts, dtype='datetime64[ns]')
+
+    # pandas.factorize() gives NaT the code -1
+    nat = code < 0
+    if nat.any():
+        code[nat] = casts.size
+        casts = np.append(casts, np.datetime64('NaT', 'ns'))
+
+    return code.astype(np.int64, copy=False), casts
+
+
+#%%
+def pressure_levels(pressure, scale=SCALE):
+    '''
+    Pressures as integers from 0: pressure * scale, where scale is doubled
+    (up to MAX_SCALE) until all pressures are whole numbers. Values which
+    are not whole numbers even then (and NaN) get numbers above the others,
+    one per distinct value.
+
+    Input:
+    - pressure: array of pressures
+    - (optional) scale: levels per unit of pressure (2: 0.5 dbar)
+
+    Output:
+    - level: int64 array
+    '''
+
+    pressure = np.asarray(pressure, dtype=float)
+    if pressure.size == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    p = pressure * scale
+    q = np.rint(p)
+
+    # False for NaN
+    exact = q == p
+
+    # a finer grid for the levels in between (the scale only grows in powers
+    # of two, so the levels keep the order of the pressures)
+    if not exact.all():
+        finer = pressure[~exact & np.isfinite(pressure)]
+        while scale < MAX_SCALE and finer.size:
+            scale *= 2
+            if (np.rint(finer * scale) == finer * scale).all():
+                p = pressure * scale
+                q = np.rint(p)
+                exact = q == p
+                break
+
+    if exact.all():
+        level = q.astype(np.int64)
+        level -= level.min()
+        return level
+
+    inexact = ~exact
+    q[inexact] = 0.
+    level = q.astype(np.int64)
+
+    if exact.any():
+        lo = int(np.min(q, where=exact, initial=np.inf))
+        top = int(np.max(q, where=exact, initial=-np.inf)) - lo + 1
+        level -= lo
+    else:
+        top = 0
+
+    # pandas.factorize() gives NaN the code -1
+    codes, uniques = pd.factorize(p[inexact])
+    level[inexact] = top + np.where(codes < 0, uniques.size, codes)
+
+    return level
+
+
+#%%
+def pack_keys(time, pressure, scale=SCALE):
+    '''
+    Pack (time, pressure) pairs into int64 keys. Equal pairs have equal
+    keys, and the keys are in the order of (time, pressure) if all pressures
+    are multiples of 1/MAX_SCALE.
+
+    Input:
+    - time: array of datetime64 values
+    - pressure: array of pressures
+    - (optional) scale: pressure levels per unit of pressure (2: 0.5 dbar)
+
+    Output:
+    - keys: int64 array from 0
+    - nkeys: number of possible keys
+    - code, casts: cast number of each row and time of each cast (see
+      cast_numbers())
+    '''
+
+    code, casts = cast_numbers(time)
+    level = pressure_levels(pressure, scale)
+
+    nlevels = int(level.max()) + 1 if level.size else 1
+
+    keys = code * nlevels
+    keys += level
+
+    return keys, casts.size * nlevels, code, casts
+
+
+#%%
+def first_occurrence(keys, nkeys=None):
+    '''
+    Boolean mask of the first row of each key.
+
+    Input:
+    - keys: int64 array
+    - (optional) nkeys: number of possible keys (keys from 0 to nkeys - 1),
+      for the table of unsorted keys
+    '''
+
+    keys = np.asarray(keys)
+    first = np.ones(keys.size, dtype=bool)
+
+    if keys.size < 2:
+        return first
+
+    # sorted keys: duplicates are neighbours
+    if _is_sorted(keys):
+        np.not_equal(keys[1:], keys[:-1], out=first[1:])
+        return first
+
+    rows = np.arange(keys.size)
+
+    if nkeys is not None and nkeys <= MAX_TABLE * keys.size:
+        # first row of each key in a table of all keys
+        table = np.full(nkeys, keys.size, dtype=np.int64)
+        np.minimum.at(table, keys, rows)
+        return table[keys] == rows
+
+    # np.unique() sorts stably with return_index, so the index of each key
+    # is its first row
+    _, index = np.unique(keys, return_index=True)
+    first[:] = False
+    first[index] = True
+
+    return first
+
+
+#%%
+def _sorted_first(t, p):
+    '''
+    first_occurrence() of rows in the order of (time, pressure) without
+    packing them (None if the rows are not sorted): duplicates are
+    neighbours with the same time and pressure.
+    '''
+
+    if t.size < 2 or t[0] == _NAT or not _is_sorted(t):
+        return None
+
+    same_time = t[1:] == t[:-1]
+
+    # NaN pressures are never in order
+    if not (~same_time | (p[1:] >= p[:-1])).all():
+        return None
+
+    first = np.ones(t.size, dtype=bool)
+    first[1:] = ~(same_time & (p[1:] == p[:-1]))
+
+    return first
+
+
+#%%
+def find_duplicates(df, time='time_string', pressure='pressure',
+                    scale=SCALE):
+    '''
+    Find the rows of duplicate (time, pressure) pairs but the first, like
+    df.set_index([time, pressure]).index.duplicated().
+
+    Input:
+    - df: pandas.DataFrame() with time and pressure columns
+    - (optional) time, pressure: names of the time and pressure columns
+    - (optional) scale: pressure levels per unit of pressure (2: 0.5 dbar)
+
+    Output:
+    - first: boolean array, True for the rows which are kept
+    - report: pandas.DataFrame() indexed by the cast times with the number
+      of rows ('nrows') and of removed duplicates ('nduplicates') per cast
+    '''
+
+    time = np.asarray(df[time].values, dtype='datetime64[ns]')
+    t = time.view(np.int64)
+    p = np.asarray(df[pressure].values, dtype=float)
+
+    # rows in the order of the file: no keys needed, the rows of a cast are
+    # contiguous
+    first = _sorted_first(t, p)
+    if first is not None:
+        start = np.concatenate([[0], np.flatnonzero(t[1:] != t[:-1]) + 1])
+        nrows = np.diff(np.append(start, t.size))
+        ndup = np.add.reduceat(~first, start, dtype=np.int64)
+        casts = time[start]
+    else:
+        keys, nkeys, code, casts = pack_keys(time, p, scale)
+        first = first_occurrence(keys, nkeys)
+        nrows = np.bincount(code, minlength=casts.size)
+        ndup = np.bincount(code[~first], minlength=casts.size)
+
+    report = pd.DataFrame({'nrows': nrows, 'nduplicates': ndup},
+                          index=pd.Index(casts, name='time'))
+
+    return first, report
+
+
+#%%
+def drop_duplicates(df, time='time_string', pressure='pressure',
+                    scale=SCALE):
+    '''
+    Remove the rows of duplicate (time, pressure) pairs but the first, like
+    df.loc[~df.set_index([time, pressure]).index.duplicated()].
+
+    Input:
+    - df: pandas.DataFrame() with time and pressure columns
+    - (optional) time, pressure: names of the time and pressure columns
+    - (optional) scale: pressure levels per unit of pressure (2: 0.5 dbar)
+
+    Output:
+    - df: pandas.DataFrame() without duplicates (the index is kept)
+    - report: pandas.DataFrame() indexed by the cast times with the number
+      of rows ('nrows') and of removed duplicates ('nduplicates') per cast
+    '''
+
+    first, report = find_duplicates(df, time, pressure, scale)
+
+    if first.all():
+        return df, report
+
+    return df.loc[first], report
+
+
+#%%
+def summary(report):
+    '''
+    One line summary of the report of drop_duplicates().
+    '''
+
+    dup = report['nduplicates']
+
+    return ('removed {0} duplicate rows of {1} in {2} of {3} '
+            'casts'.format(int(dup.sum()), int(report['nrows'].sum()),
+                           int((dup > 0).sum()), len(report)))
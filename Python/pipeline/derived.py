@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+""" Derived oceanographic quantities of the gridded BBMP data
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Stratification products computed from temperature, salinity and pressure for
+all casts of the (time, pressure) cube at once:
+
+- potential temperature and potential density anomaly sigma-theta (UNESCO
+  EOS-80, Fofonoff and Millard 1983)
+- buoyancy frequency squared N2
+- mixed-layer depth with the density threshold method (de Boyer Montegut et
+  al. 2004)
+
+All functions work on NumPy arrays and on xarray DataArrays, including
+DataArrays backed by dask arrays (open the data with chunks={'time': ...}),
+in which case the results are computed chunk by chunk. add_derived() stores
+the results as new data variables, so they can be plotted like the measured
+ones:
+
+    from pipeline import derived
+
+    derived.derive_file('data/raw/bedford_basin_monitoring_program.nc',
+                        'data/processed/bbmp_derived.nc')
+    ds = xr.open_dataset('data/processed/bbmp_derived.nc')
+    analysis.plot_hovmoeller(ds, 'N2', ax)
+
+The pressure in dbar is used as depth in m for the vertical derivatives
+(the difference is below 1% in the Bedford Basin).
+"""
+
+#%% Import all packages which we will need
+import numpy as np
+
+# gravitational acceleration in m s-2
+GRAVITY = 9.81
+
+# mixed-layer depth criterion: reference pressure (dbar) and increase of
+# sigma-theta (kg m-3) from the reference pressure
+MLD_REFERENCE = 10.
+MLD_THRESHOLD = .03
+
+
+#%%
+def _t68(t):
+    '''
+    Convert temperature from ITS-90 to IPTS-68 (used by EOS-80).
+    '''
+
+    return t * 1.00024
+
+
+#%%
+def density_surface(s, t):
+    '''
+    Density of seawater at zero pressure (UNESCO 1981).
+
+    Input:
+    - s: practical salinity
+    - t: (potential) temperature in degrees C (ITS-90)
+
+    Output:
+    - rho: density in kg m-3
+    '''
+
+    t = _t68(t)
+
+    # density of standard mean ocean water
+    smow = (999.842594 + (6.793952e-2 + (-9.095290e-3 + (1.001685e-4 +
+            (-1.120083e-6 + 6.536332e-9 * t) * t) * t) * t) * t)
+
+    b = (8.24493e-1 + (-4.0899e-3 + (7.6438e-5 + (-8.2467e-7 +
+         5.3875e-9 * t) * t) * t) * t)
+    c = -5.72466e-3 + (1.0227e-4 - 1.6546e-6 * t) * t
+
+    return smow + b * s + c * s ** 1.5 + 4.8314e-4 * s ** 2
+
+
+#%%
+def _lapse_rate(s, t68, p):
+    '''
+    Adiabatic temperature gradient in K/dbar (Bryden 1973), temperature in
+    IPTS-68.
+    '''
+
+    ds = s - 35.
+
+    return (3.5803e-5 + (8.5258e-6 + (-6.836e-8 + 6.6228e-10 * t68) * t68)
+            * t68 + (1.8932e-6 - 4.2393e-8 * t68) * ds +
+            ((1.8741e-8 + (-6.7795e-10 + (8.733e-12 - 5.4481e-14 * t68) * t68)
+              * t68) + (-1.1351e-10 + 2.7759e-12 * t68) * ds) * p +
+            (-4.6206e-13 + (1.8676e-14 - 2.1687e-16 * t68) * t68) * p ** 2)
+
+
+#%%
+def potential_temperature(s, t, p, pref=0.):
+    '''
+    Potential temperature (Fofonoff and Millard 1983, fourth-order
+    Runge-Kutta integration of the adiabatic lapse rate).
+
+    Input:
+    - s: practical salinity
+    - t: in-situ temperature in degrees C (ITS-90)
+    - p: pressure in dbar
+    - (optional) pref: reference pressure in dbar
+
+    Output:
+    - theta: potential temperature in degrees C (ITS-90)
+    '''
+
+    t = _t68(t)
+    dp = pref - p
+    sqrt2 = np.sqrt(2.)
+
+    dth = dp * _lapse_rate(s, t, p)
+    th = t + .5 * dth
+    q = dth
+    dth = dp * _lapse_rate(s, th, p + .5 * dp)
+    th = th + (1. - 1. / sqrt2) * (dth - q)
+    q = (2. - sqrt2) * dth + (-2. + 3. / sqrt2) * q
+    dth = dp * _lapse_rate(s, th, p + .5 * dp)
+    th = th + (1. + 1. / sqrt2) * (dth - q)
+    q = (2. + sqrt2) * dth + (-2. - 3. / sqrt2) * q
+    dth = dp * _lapse_rate(s, th, p + dp)
+    th = th + (dth - 2. * q) / 6.
+
+    return th / 1.00024
+
+
+#%%
+def sigma_theta(s, t, p):
+    '''
+    Potential density anomaly referenced to the surface.
+
+    Input:
+    - s: practical salinity
+    - t: in-situ temperature in degrees C (ITS-90)
+    - p: pressure in dbar
+
+    Output:
+    - sigma: potential density - 1000 kg m-3
+    '''
+
+    return density_surface(s, potential_temperature(s, t, p)) - 1000.
+
+
+#%%
+def buoyancy_frequency(sigma, dim='pressure'):
+    '''
+    Squared buoyancy (Brunt-Vaisala) frequency N2 = g / rho * d(rho)/dz from
+    the vertical gradient of potential density (centred differences, one-sided
+    at the top and bottom).
+
+    Input:
+    - sigma: xarray.DataArray with sigma-theta in kg m-3
+    - (optional) dim: vertical dimension (pressure in dbar ~ depth in m)
+
+    Output:
+    - N2: xarray.DataArray with N2 in s-2 (positive for stable stratification)
+    '''
+
+    return GRAVITY / (1000. + sigma) * sigma.differentiate(dim)
+
+
+#%%
+def _mld_kernel(sigma, p, pref, threshold):
+    '''
+    Mixed-layer depth of profiles along the last axis of sigma (NumPy).
+    '''
+
+    # sigma-theta at the reference pressure (nearest level)
+    iref = int(np.argmin(np.abs(p - pref)))
+    target = sigma[..., iref:iref + 1] + threshold
+
+    # first level below the reference which exceeds the threshold
+    below = np.arange(p.size) > iref
+    exceed = (sigma > target) & below
+    i1 = np.argmax(exceed, axis=-1)
+    found = exceed.any(axis=-1)
+
+    # interpolate linearly between the levels above and at the crossing
+    i0 = np.maximum(i1 - 1, 0)
+    s0 = np.take_along_axis(sigma, i0[..., None], axis=-1)[..., 0]
+    s1 = np.take_along_axis(sigma, i1[..., None], axis=-1)[..., 0]
+    target = target[..., 0]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = np.where(np.isfinite(s0) & (s1 != s0),
+                     (target - s0) / (s1 - s0), 1.)
+
+    mld = p[i0] + np.clip(w, 0., 1.) * (p[i1] - p[i0])
+
+    # no crossing (mixed to the bottom) or no data at the reference
+    return np.where(found & np.isfinite(target), mld, np.nan)
+
+
+#%%
+def mixed_layer_depth(sigma, pref=MLD_REFERENCE, threshold=MLD_THRESHOLD,
+                      dim='pressure'):
+    '''
+    Mixed-layer depth with the threshold method: the depth at which
+    sigma-theta exceeds its value at the reference depth by threshold.
+
+    Input:
+    - sigma: xarray.DataArray with sigma-theta in kg m-3
+    - (optional) pref: reference pressure in dbar
+    - (optional) threshold: increase of sigma-theta in kg m-3
+    - (optional) dim: vertical dimension
+
+    Output:
+    - mld: xarray.DataArray with the mixed-layer depth (NaN if the profile is
+      mixed to the bottom or has no data at the reference depth)
+    '''
+
+    import xarray as xr
+
+    # each profile must be in one piece
+    if sigma.chunks is not None:
+        sigma = sigma.chunk({dim: -1})
+
+    return xr.apply_ufunc(_mld_kernel, sigma, sigma[dim],
+                          input_core_dims=[[dim], [dim]],
+                          kwargs={'pref': pref, 'threshold': threshold},
+                          dask='parallelized', output_dtypes=[float])
+
+
+#%%
+def add_derived(ds, recompute_sigma=False):
+    '''
+    Add potential temperature, N2 and mixed-layer depth (and sigma-theta if
+    it is missing) as data variables to the gridded BBMP data.
+
+    Input:
+    - ds: xarray.Dataset with temperature, salinity (time, pressure)
+    - (optional) recompute_sigma: replace sigmaTheta by the EOS-80 values
+
+    Output:
+    - ds: xarray.Dataset with additional data variables
+    '''
+
+    s, t, p = ds['salinity'], ds['temperature'], ds['pressure']
+
+    ds = ds.assign(potentialTemperature=potential_temperature(s, t, p))
+    ds['potentialTemperature'].attrs = {'long_name': 'potential temperature',
+                                        'units': 'degree_C'}
+
+    if recompute_sigma or 'sigmaTheta' not in ds:
+        ds['sigmaTheta'] = density_surface(s, ds['potentialTemperature']) - 1e3
+        ds['sigmaTheta'].attrs = {'long_name': 'potential density anomaly',
+                                  'units': 'kg m-3'}
+
+    ds['N2'] = buoyancy_frequency(ds['sigmaTheta'])
+    ds['N2'].attrs = {'long_name': 'squared buoyancy frequency',
+                      'units': 's-2'}
+
+    ds['mld'] = mixed_layer_depth(ds['sigmaTheta'])
+    ds['mld'].attrs = {'long_name': 'mixed-layer depth', 'units': 'm',
+                       'reference_pressure': MLD_REFERENCE,
+                       'threshold': MLD_THRESHOLD}
+
+    return ds
+
+
+#%%
+def derive_file(infile, outfile, chunks=None):
+    '''
+    Compute the derived variables of a gridded BBMP file and save the data
+    with the derived variables as new NetCDF file.
+
+    Input:
+    - infile: name of NetCDF file written by grid_bbmp_data
+    - outfile: name of output NetCDF file
+    - (optional) chunks: e.g. {'time': 500} to compute with dask chunk by
+      chunk instead of in memory
+    '''
+
+    import xarray as xr
+
+    from pipeline import instrument, qc, storage
+
+    with xr.open_dataset(infile) as ds:
+
+        # values which fail the quality control are not used
+        ds = qc.mask_dataset(ds)
+
+        # the file is read lazily, chunk by chunk; the kernels need complete
+        # profiles in each chunk
+        if chunks is not None:
+            ds = ds.chunk(dict(chunks, pressure=-1))
+
+        with instrument.stage('derived.compute'):
+            ds = add_derived(ds)
+            if chunks is None:
+                ds = ds.load()
+        with instrument.stage('derived.write_netcdf') as st:
+            st.add_bytes(storage.write_netcdf(ds, outfile))
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+""" Downsampling of long time series for line plots
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+A glider mission has millions of samples, but a line plot is only a few
+thousand pixels wide. Plotting every sample (ax.plot(df.index, df['depth']))
+is slow, and plotting every n-th sample (like plot_time_series() of the R
+tutorials) misses the extremes of the dives. Here the samples are reduced to
+
+- minmax(): the smallest and largest value of each pixel column (the
+  envelope of the line, which keeps all extremes exactly),
+- lttb(): Largest-Triangle-Three-Buckets, which keeps the samples that
+  form the largest triangles with their neighbours (the shape of the line
+  with fewer points, e.g. for markers).
+
+Both return the positions of the kept samples, so they can be used to
+select rows of a DataFrame. plot() draws a downsampled line which is
+resampled when the x-axis limits change (zooming in shows all details):
+
+    from pipeline import downsample
+
+    downsample.plot(ax, df.index, df['depth'], color='grey')
+"""
+
+#%% Import all packages which we will need
+import numpy as np
+
+# number of pixel columns if the width of the axes is not known
+NPIXELS = 2000
+
+
+#%%
+def _as_number(x):
+    '''
+    Return the x-coordinates as numbers (datetimes as int64 nanoseconds,
+    without a copy).
+    '''
+
+    x = np.asarray(x)
+
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]', copy=False).view(np.int64)
+
+    return x
+
+
+#%%
+def _valid(x, y):
+    '''
+    Positions of the samples which are not NaN, and the x-coordinates (as
+    float relative to the first sample) and values of these samples.
+    '''
+
+    x = _as_number(x)
+    y = np.asarray(y, dtype=float)
+    ok = np.isfinite(y)
+
+    if ok.all():
+        ok = np.arange(y.size)
+    else:
+        ok = np.flatnonzero(ok)
+        x, y = x[ok], y[ok]
+
+    return ok, (x - x[:1]).astype(float) if x.size else x, y
+
+
+#%%
+def minmax(x, y, npixels=NPIXELS):
+    '''
+    Positions of the smallest and largest sample in each of npixels columns
+    of equal width in x (at most 2 * npixels samples).
+
+    Input:
+    - x: 1D array with increasing x-coordinates (numbers or datetimes)
+    - y: 1D array with values (NaN are ignored)
+    - (optional) npixels: number of columns, e.g. width of the plot in pixels
+
+    Output:
+    - idx: increasing positions of the selected samples
+    '''
+
+    x = _as_number(x)
+    y = np.asarray(y, dtype=float)
+
+    if y.size <= 2 * npixels:
+        return np.flatnonzero(np.isfinite(y))
+
+    # first sample of each pixel column (x is sorted), without the columns
+    # which have no samples
+    bounds = x[0] + (x[-1] - x[0]) * (np.arange(npixels) / npixels)
+    starts = np.unique(np.searchsorted(x, bounds.astype(x.dtype)))
+
+    # smallest and largest value of each column (NaN are ignored)
+    counts = np.diff(starts, append=y.size)
+    lo = np.fmin.reduceat(y, starts)
+    hi = np.fmax.reduceat(y, starts)
+
+    # the first sample of each column which has the smallest (largest) value
+    idx = []
+    for extreme in [lo, hi]:
+        pos = np.flatnonzero(y == np.repeat(extreme, counts))
+        first = np.searchsorted(pos, starts[np.isfinite(extreme)])
+        idx.append(pos[first])
+
+    return np.union1d(*idx)
+
+
+#%%
+def lttb(x, y, npoints=2 * NPIXELS):
+    '''
+    Positions of the samples selected by Largest-Triangle-Three-Buckets
+    (Steinarsson, 2013). The first and last samples are always kept, the
+    others are split into npoints - 2 buckets of equal size, and from each
+    bucket the sample is kept which forms the largest triangle with the
+    sample kept from the previous bucket and the mean of the next bucket.
+
+    Input:
+    - x: 1D array with increasing x-coordinates (numbers or datetimes)
+    - y: 1D array with values (NaN are ignored)
+    - (optional) npoints: number of selected samples
+
+    Output:
+    - idx: increasing positions of the selected samples
+    '''
+
+    ok, xv, yv = _valid(x, y)
+    n = ok.size
+
+    if n <= npoints or npoints < 3:
+        return ok
+
+    # bucket boundaries (without the first and last sample)
+    edges = (1 + np.arange(npoints - 1) * ((n - 2) / (npoints - 2))).astype(
+        np.int64)
+    edges[-1] = n - 1
+
+    # mean of each bucket, and of the last sample as bucket after the last
+    counts = np.diff(edges)
+    xmean = np.append(np.add.reduceat(xv[:-1], edges[:-1]) / counts, xv[-1])
+    ymean = np.append(np.add.reduceat(yv[:-1], edges[:-1]) / counts, yv[-1])
+
+    # the kept sample of a bucket depends on the one kept before, so the
+    # buckets are processed in order (each one vectorized)
+    idx = np.empty(npoints, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    ax, ay = xv[0], yv[0]
+
+    for ii in range(npoints - 2):
+        i0, i1 = edges[ii], edges[ii + 1]
+        cx, cy = xmean[ii + 1], ymean[ii + 1]
+
+        # twice the area of the triangles (a, sample, c)
+        area = np.abs((ax - cx) * (yv[i0:i1] - ay) -
+                      (ax - xv[i0:i1]) * (cy - ay))
+
+        best = i0 + int(np.argmax(area))
+        idx[ii + 1] = best
+        ax, ay = xv[best], yv[best]
+
+    return ok[idx]
+
+
+#%%
+METHODS = {'minmax': minmax, 'lttb': lttb}
+
+
+#%%
+def downsample(x, y, npixels=NPIXELS, method='minmax'):
+    '''
+    Downsampled copy of a time series.
+
+    Input:
+    - x: x-coordinates (e.g. pandas.DatetimeIndex)
+    - y: values (e.g. pandas.Series)
+    - (optional) npixels: width of the plot in pixels
+    - (optional) method: 'minmax' or 'lttb' (2 * npixels samples)
+
+    Output:
+    - x, y: selected samples (same types as the input)
+    '''
+
+    func = METHODS[method]
+    idx = func(x, y, 2 * npixels if method == 'lttb' else npixels)
+
+    return x[idx], (y.iloc[idx] if hasattr(y, 'iloc') else
+                    np.asarray(y)[idx])
+
+
+#%%
+def plot(ax, x, y, npixels=None, method='minmax', **kwargs):
+    '''
+    Plot a downsampled line, which is resampled to the visible range when
+    the x-axis limits change (e.g. when zooming in).
+
+    Input:
+    - ax: matplotlib axes
+    - x: increasing x-coordinates (e.g. pandas.DatetimeIndex)
+    - y: values (e.g. pandas.Series)
+    - (optional) npixels: number of pixel columns (default: width of the
+      axes in pixels)
+    - (optional) method: 'minmax' or 'lttb'
+    - (optional) kwargs: properties of the line, e.g. color, label
+
+    Output:
+    - line: matplotlib.lines.Line2D
+    '''
+
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+
+    if npixels is None:
+        npixels = int(ax.get_window_extent().width) or NPIXELS
+
+    line, = ax.plot(*downsample(x, y, npixels, method), **kwargs)
+
+    # the units of the axis (e.g. days for dates) are a linear function of
+    # the x-coordinates, so only the first and last sample are converted
+    xn = _as_number(x)
+    u0, u1 = np.asarray(ax.convert_xunits(x[[0, -1]]), dtype=float)
+    scale = (xn[-1] - xn[0]) / (u1 - u0) if u1 > u0 else 0.
+    shown = [(0, x.size)]
+
+    def resample(ax):
+
+        lo, hi = sorted(ax.get_xlim())
+        bounds = xn[0] + (np.array([lo, hi]) - u0) * scale
+
+        # one sample beyond each side, so the line reaches the edges
+        i0 = max(np.searchsorted(xn, bounds[0].astype(xn.dtype)) - 1, 0)
+        i1 = min(np.searchsorted(xn, bounds[1].astype(xn.dtype),
+                                 side='right') + 1, x.size)
+
+        # e.g. autoscaling after the first plot
+        if (i0, i1) == shown[0]:
+            return
+        shown[0] = (i0, i1)
+
+        line.set_data(*downsample(x[i0:i1], y[i0:i1], npixels, method))
+
+    ax.callbacks.connect('xlim_changed', resample)
+
+    return line
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+""" Export of processed data to several file formats at once
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+The processed glider data are written to HDF5 and CSV one after the other
+(tutorial 02), and the BBMP data to NetCDF. export() writes one DataFrame or
+Dataset to all requested formats in one call:
+
+- the writers run concurrently in threads, so a run takes about as long as
+  the slowest format (CSV) instead of the sum of all formats (given more
+  than one CPU: most of the CSV formatting holds the GIL, the compression of
+  HDF5, NetCDF and Parquet does not),
+- all writers use the same data: the table of a Dataset (or the Dataset of
+  a DataFrame) is built once, and the columns are not copied,
+- CSV is written in chunks of rows, so it never needs a second copy of the
+  data as text.
+
+The format is chosen by the file suffix (.csv, .h5, .parquet, .nc). Parquet
+needs pyarrow or fastparquet. HDF5 is not thread-safe, so the HDF5 and NetCDF
+writers take turns.
+
+    from pipeline import export
+
+    export.export(df, ['data/processed/outward_leg.h5',
+                       'data/processed/outward_leg.csv',
+                       'data/processed/outward_leg.nc'])
+"""
+
+#%% Import all packages which we will need
+import concurrent.futures
+import importlib.util
+import os
+import threading
+
+from pipeline import instrument
+
+# rows per chunk of the CSV file
+CSV_CHUNK = 100000
+
+# file suffixes of the formats
+FORMATS = {'.csv': 'csv', '.h5': 'hdf', '.hdf5': 'hdf', '.parquet': 'parquet',
+           '.nc': 'netcdf'}
+
+# the HDF5 library is shared by PyTables and netCDF4
+_HDF5_LOCK = threading.Lock()
+
+
+#%%
+def _format(outfile):
+    '''
+    Format of a file from its suffix.
+    '''
+
+    suffix = os.path.splitext(outfile)[1].lower()
+
+    try:
+        return FORMATS[suffix]
+    except KeyError:
+        raise ValueError('unknown file format {0!r} of {1}, use one of '
+                         '{2}'.format(suffix, outfile, sorted(FORMATS)))
+
+
+#%%
+def _check_parquet():
+    '''
+    Raise an ImportError if no Parquet engine is installed.
+    '''
+
+    if not any(importlib.util.find_spec(engine) is not None
+               for engine in ['pyarrow', 'fastparquet']):
+        raise ImportError('writing Parquet files needs pyarrow or '
+                          'fastparquet')
+
+
+#%%
+def as_table(ds):
+    '''
+    Table (pandas.DataFrame) of a Dataset, with one row per grid point.
+    '''
+
+    return ds.to_dataframe()
+
+
+#%%
+def as_dataset(df):
+    '''
+    Dataset of a table. The columns of a table with a simple index become
+    variables along the index without copying them.
+    '''
+
+    import pandas as pd
+    import xarray as xr
+
+    if isinstance(df.index, pd.MultiIndex):
+        return xr.Dataset.from_dataframe(df)
+
+    dim = df.index.name or 'index'
+
+    return xr.Dataset({c: (dim, df[c].values) for c in df.columns},
+                      coords={dim: df.index.values})
+
+
+#%%
+def write_csv(df, outfile, chunk=CSV_CHUNK, float_format=None):
+    '''
+    Write a table as CSV file in chunks of rows.
+
+    Output:
+    - nbytes: size of the file in bytes
+    '''
+
+    with open(outfile, 'w', newline='') as f:
+        for start in range(0, max(len(df), 1), chunk):
+            df.iloc[start:start + chunk].to_csv(f, header=start == 0,
+                                                float_format=float_format)
+
+    return os.path.getsize(outfile)
+
+
+#%%
+def write_hdf(df, outfile):
+    '''
+    Write a table as HDF5 file (appendable table, see gliderstore.py).
+
+    Output:
+    - nbytes: size of the file in bytes
+    '''
+
+    import pandas as pd
+
+    from pipeline import gliderstore
+
+    with _HDF5_LOCK:
+        if isinstance(df.index, pd.DatetimeIndex):
+            return gliderstore.write_store(df, outfile)
+
+        df.to_hdf(outfile, key=gliderstore.STORE_KEY, mode='w',
+                  format='table', data_columns=True,
+                  complib=gliderstore.COMPLIB,
+                  complevel=gliderstore.COMPLEVEL)
+
+    return os.path.getsize(outfile)
+
+
+#%%
+def write_parquet(df, outfile):
+    '''
+    Write a table as Parquet file.
+
+    Output:
+    - nbytes: size of the file in bytes
+    '''
+
+    df.to_parquet(outfile)
+
+    return os.path.getsize(outfile)
+
+
+#%%
+def write_netcdf(ds, outfile, full_precision=True):
+    '''
+    Write a Dataset as chunked and compressed NetCDF file (see storage.py).
+    Unlike the BBMP cube, the data keep their precision by default (e.g.
+    float64 latitudes and longitudes of the glider).
+
+    Output:
+    - nbytes: size of the file in bytes
+    '''
+
+    from pipeline import storage
+
+    with _HDF5_LOCK:
+        return storage.write_netcdf(ds, outfile,
+                                    full_precision=full_precision)
+
+
+#%%
+def _write(fmt, data, outfile, chunk, float_format):
+    '''
+    Write one file and measure it as stage export.<format>.
+    '''
+
+    with instrument.stage('export.{}'.format(fmt)) as st:
+        if fmt == 'csv':
+            nbytes = write_csv(data, outfile, chunk, float_format)
+        elif fmt == 'hdf':
+            nbytes = write_hdf(data, outfile)
+        elif fmt == 'parquet':
+            nbytes = write_parquet(data, outfile)
+        else:
+            nbytes = write_netcdf(data, outfile)
+        st.add_bytes(nbytes)
+
+    return nbytes
+
+
+#%%
+def export(data, outfiles, chunk=CSV_CHUNK, float_format=None,
+           parallel=True):
+    '''
+    Write a DataFrame or Dataset to several files (format by file suffix).
+
+    Input:
+    - data: pandas.DataFrame() or xarray.Dataset()
+    - outfiles: list of file names (*.csv, *.h5, *.parquet, *.nc)
+    - (optional) chunk: rows per chunk of CSV files
+    - (optional) float_format: format of floats in CSV files, e.g. '%.4f'
+      (default: all digits)
+    - (optional) parallel: write the files at the same time
+
+    Output:
+    - nbytes: dictionary file name -> size in bytes
+    '''
+
+    import pandas as pd
+
+    formats = [_format(outfile) for outfile in outfiles]
+    if 'parquet' in formats:
+        _check_parquet()
+
+    # both views of the data are built once, before the writers start
+    if isinstance(data, pd.DataFrame):
+        df = data
+        ds = as_dataset(df) if 'netcdf' in formats else None
+    else:
+        ds = data
+        df = as_table(ds) if set(formats) - {'netcdf'} else None
+
+    for outfile in outfiles:
+        outdir = os.path.dirname(outfile)
+        if outdir and not os.path.isdir(outdir):
+            os.makedirs(outdir)
+
+    jobs = [(fmt, ds if fmt == 'netcdf' else df, outfile, chunk,
+             float_format) for fmt, outfile in zip(formats, outfiles)]
+
+    with instrument.stage('export') as st:
+        if parallel and len(jobs) > 1:
+            with concurrent.futures.ThreadPoolExecutor(
+                    len(jobs), thread_name_prefix='export') as ex:
+                sizes = list(ex.map(lambda job: _write(*job), jobs))
+        else:
+            sizes = [_write(*job) for job in jobs]
+        st.add_bytes(sum(sizes))
+
+    return dict(zip(outfiles, sizes))
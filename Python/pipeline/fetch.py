@@ -0,0 +1,531 @@
+# -*- coding: utf-8 -*-
+""" Download raw data files
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+This module downloads the raw data files of the tutorials (BBMP aggregated
+profiles and glider data from ERDDAP) to local files. It only uses the Python
+standard library, so it starts quickly and can be run from a cron job without
+importing pandas, xarray or any plotting package.
+
+Downloads are streamed into a temporary file (<outfile>.part). If the
+connection drops, the transfer continues where it stopped (HTTP Range
+requests, FTP REST), also in a later run. The ETag or Last-Modified header
+(FTP: MDTM and SIZE) of the remote file is kept next to it
+(<outfile>.part.validator), and a .part file is only resumed if the remote
+file is still the same (HTTP If-Range). At the end, the size (and, if given,
+the SHA-256 checksum) is verified before the file is renamed to outfile.
+
+open_url() downloads in a background thread and returns a file object, so a
+parser can read the data while they are still being transferred:
+
+    with fetch.open_url(url, 'data/raw/bbmp_aggregated_profiles.csv') as src:
+        df = pd.read_csv(src)
+"""
+
+#%% Import all packages which we will need
+import ftplib
+import hashlib
+import http.client
+import io
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from pipeline import instrument
+
+# aggregated CTD profiles of the Bedford Basin Monitoring Program
+BBMP_URL = ('ftp://ftp.dfo-mpo.gc.ca/'
+            'BIOWebMaster/BBMP/CSV/bbmp_aggregated_profiles.csv')
+
+# ERDDAP server of the Ocean Tracking Network and variables of glider data
+ERDDAP_URL = 'http://belafonte.ocean.dal.ca:8080/erddap/tabledap'
+GLIDER_VARIABLES = ['time', 'depth', 'latitude', 'longitude', 'conductivity',
+                    'temperature', 'salinity', 'density', 'pressure',
+                    'profile_id']
+
+# number of attempts to resume a dropped transfer, and timeout of a
+# connection in seconds
+RETRIES = 5
+TIMEOUT = 60.
+
+# number of bytes read at once
+CHUNK = 1024 * 1024
+
+# errors after which a transfer is resumed
+TRANSFER_ERRORS = (OSError, EOFError, http.client.HTTPException) + \
+    ftplib.all_errors
+
+
+#%%
+def glider_url(ID, base_url=ERDDAP_URL):
+    '''
+    Return the URL of the *.csvp file of a glider deployment on ERDDAP.
+    '''
+    return '{0}/{1}.csvp?{2}'.format(base_url, ID, '%2C'.join(GLIDER_VARIABLES))
+
+
+#%%
+class VerificationError(Exception):
+    '''
+    Raised if a downloaded file does not have the expected size or checksum.
+    '''
+    pass
+
+
+#%%
+class _Cancelled(Exception):
+    '''
+    Raised by the consumer of a download if its reader was closed. It is not
+    one of the TRANSFER_ERRORS, so the download stops without a retry.
+    '''
+    pass
+
+
+#%%
+def _read_validator(fname):
+    '''
+    Validator of the remote file of a .part file (None if there is none).
+    '''
+
+    try:
+        with open(fname) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+#%%
+def _write_validator(fname, validator):
+    '''
+    Keep the validator of the remote file next to a .part file (removed if
+    the remote file has none).
+    '''
+
+    if validator is None:
+        if os.path.exists(fname):
+            os.remove(fname)
+        return
+
+    with open(fname, 'w') as f:
+        f.write(validator + '\n')
+
+
+#%%
+def _replay(dst, nbytes, sha, consumer, chunk):
+    '''
+    Hash the first nbytes of a .part file (and pass them to the consumer).
+    '''
+
+    dst.seek(0)
+    while nbytes:
+        block = dst.read(min(chunk, nbytes))
+        sha.update(block)
+        if consumer is not None:
+            consumer(block)
+        nbytes -= len(block)
+    dst.seek(0, os.SEEK_END)
+
+
+#%%
+def _open_http(url, offset, validator=None):
+    '''
+    Open an HTTP(S) transfer starting at byte offset.
+
+    Input:
+    - url: URL of the remote file
+    - offset: byte offset of the first byte
+    - (optional) validator: ETag or Last-Modified of the bytes before
+      offset; the server sends the whole file if the file has changed since
+
+    Output:
+    - src: file object with the data
+    - start: byte offset of the first byte of src (0 if the server ignored
+      the Range request)
+    - total: size of the file in bytes (None if unknown)
+    - close: function which closes the transfer
+    - validator: ETag or Last-Modified of the remote file (None if unknown)
+    '''
+
+    request = urllib.request.Request(url)
+    if offset:
+        request.add_header('Range', 'bytes={}-'.format(offset))
+        if validator is not None:
+            request.add_header('If-Range', validator)
+
+    src = urllib.request.urlopen(request, timeout=TIMEOUT)
+
+    # weak ETags cannot be used with If-Range
+    etag = src.headers.get('ETag')
+    if etag is None or etag.startswith('W/'):
+        etag = src.headers.get('Last-Modified')
+
+    if src.status == 206:
+        # Content-Range: bytes <first>-<last>/<total>
+        byte_range, _, total = src.headers['Content-Range'].split()[1] \
+            .partition('/')
+        start = int(byte_range.split('-')[0])
+        total = None if total == '*' else int(total)
+    else:
+        start = 0
+        length = src.headers.get('Content-Length')
+        total = int(length) if length else None
+
+    return src, start, total, src.close, etag
+
+
+#%%
+def _open_ftp(url, offset, validator=None):
+    '''
+    Open an FTP transfer starting at byte offset (see _open_http). The
+    validator is the modification time (MDTM) and size of the file; the
+    transfer starts at byte 0 if it differs.
+    '''
+
+    parts = urllib.parse.urlsplit(url)
+    path = urllib.parse.unquote(parts.path).lstrip('/')
+
+    ftp = ftplib.FTP(timeout=TIMEOUT)
+    ftp.connect(parts.hostname, parts.port or 21)
+    ftp.login(parts.username or 'anonymous', parts.password or '')
+    ftp.voidcmd('TYPE I')
+
+    try:
+        total = ftp.size(path)
+    except ftplib.error_perm:
+        total = None
+
+    try:
+        mdtm = ftp.sendcmd('MDTM ' + path).split()[1]
+    except ftplib.error_perm:
+        mdtm = None
+
+    current = None
+    if mdtm is not None:
+        current = 'MDTM {0} SIZE {1}'.format(mdtm, total)
+
+    if current != validator:
+        offset = 0
+
+    conn = ftp.transfercmd('RETR ' + path, rest=offset or None)
+    src = conn.makefile('rb')
+
+    def close():
+        src.close()
+        conn.close()
+        try:
+            # 226 if the transfer is complete, 426 if it was aborted (the
+            # size is checked anyway)
+            ftp.voidresp()
+            ftp.quit()
+        except ftplib.all_errors:
+            ftp.close()
+
+    return src, offset, total, close, current
+
+
+#%%
+def download(url, outfile, size=None, sha256=None, retries=RETRIES,
+             chunk=CHUNK, consumer=None):
+    '''
+    Download a file (http://, https:// or ftp://) to a local file. The data
+    are written to <outfile>.part first. If the connection drops, the
+    transfer is resumed at the last received byte. A .part file of an earlier
+    run is resumed as well if the remote file has not changed since (same
+    ETag or Last-Modified, FTP: MDTM and SIZE), otherwise it is discarded.
+    The file is only renamed to outfile after its size and checksum were
+    verified.
+
+    Input:
+    - url: URL of the remote file
+    - outfile: name of the local file
+    - (optional) size: expected size in bytes (default: as reported by the
+      server)
+    - (optional) sha256: expected SHA-256 checksum (hexadecimal)
+    - (optional) retries: number of attempts to resume a dropped transfer
+    - (optional) chunk: number of bytes read at once
+    - (optional) consumer: function which is called with each block of bytes
+      in the order of the file (e.g. to parse the data during the transfer)
+
+    Output:
+    - outfile: name of the local file
+    '''
+
+    outdir = os.path.dirname(outfile)
+    if outdir and not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    opener = _open_ftp if url.startswith('ftp://') else _open_http
+    tmpfile = outfile + '.part'
+    validfile = tmpfile + '.validator'
+    sha = hashlib.sha256()
+
+    sname = 'fetch.{}'.format(os.path.basename(outfile))
+
+    with instrument.stage(sname) as st, open(tmpfile, 'ab+') as dst:
+
+        # bytes of an earlier, interrupted run: only resumed if the remote
+        # file has the same validator, they are hashed (and passed to the
+        # consumer) once the server confirmed it
+        offset = dst.seek(0, os.SEEK_END)
+        validator = _read_validator(validfile)
+        if validator is None:
+            dst.truncate(0)
+            offset = 0
+        earlier = offset
+
+        # True once the consumer received bytes, which cannot be taken back
+        consumed = False
+
+        total = size
+        attempt = 0
+
+        while total is None or offset < total:
+
+            try:
+                src, start, reported, close, current = opener(url, offset,
+                                                              validator)
+            except TRANSFER_ERRORS as err:
+                code = getattr(err, 'code', None)
+                if code == 416:
+                    # nothing left to transfer (the server only answers a
+                    # Range request with 416 if the If-Range validator
+                    # matches)
+                    break
+                # missing files etc. are not retried
+                if (code is not None and 400 <= code < 500) or \
+                        isinstance(err, ftplib.error_perm) or \
+                        attempt >= retries:
+                    raise
+                attempt += 1
+                print('fetch: {0} ({1}), retry {2}/{3}'.format(
+                    os.path.basename(outfile), err, attempt, retries),
+                    file=sys.stderr)
+                time.sleep(min(2. ** attempt, 30.) * .1)
+                continue
+
+            if offset and current != validator:
+                # the remote file has changed (or cannot be identified any
+                # more): start again from byte 0
+                if consumed:
+                    close()
+                    raise VerificationError('{}: remote file changed during '
+                                            'the transfer'.format(url))
+                print('fetch: {0} changed, restarting at byte 0'.format(
+                    os.path.basename(outfile)), file=sys.stderr)
+                dst.truncate(0)
+                offset = earlier = 0
+                sha = hashlib.sha256()
+                total = size
+                if start:
+                    close()
+                    validator = None
+                    continue
+
+            if earlier:
+                _replay(dst, earlier, sha, consumer, chunk)
+                consumed = consumer is not None
+                earlier = 0
+
+            if current != validator or not os.path.exists(validfile):
+                validator = current
+                _write_validator(validfile, validator)
+
+            if total is None:
+                total = reported
+
+            # a server without range requests sends the whole file again
+            skip = offset - start
+
+            try:
+                for block in iter(lambda: src.read(chunk), b''):
+                    if skip:
+                        n = min(skip, len(block))
+                        block = block[n:]
+                        skip -= n
+                        if not block:
+                            continue
+                    dst.write(block)
+                    sha.update(block)
+                    offset += len(block)
+                    if consumer is not None:
+                        consumed = True
+                        consumer(block)
+                complete = total is None or offset >= total
+            except TRANSFER_ERRORS as err:
+                complete = False
+                reason = err
+            else:
+                reason = 'connection closed at byte {}'.format(offset)
+            finally:
+                close()
+
+            if complete:
+                break
+
+            if attempt >= retries:
+                raise VerificationError('{0}: transfer failed after {1} '
+                                        'retries ({2})'.format(url, retries,
+                                                               reason))
+            attempt += 1
+            print('fetch: {0} ({1}), resuming at byte {2}, retry {3}/{4}'
+                  .format(os.path.basename(outfile), reason, offset, attempt,
+                          retries), file=sys.stderr)
+
+        # a complete .part file of an earlier run
+        if earlier:
+            _replay(dst, earlier, sha, consumer, chunk)
+
+        st.add_bytes(offset)
+
+    # verify the file before it replaces outfile
+    error = None
+    if total is not None and offset != total:
+        error = '{0}: received {1} bytes, expected {2}'.format(url, offset,
+                                                               total)
+    elif sha256 is not None and sha.hexdigest() != sha256.lower():
+        error = '{0}: SHA-256 checksum {1} does not match {2}'.format(
+            url, sha.hexdigest(), sha256)
+
+    if error is not None:
+        os.remove(tmpfile)
+    else:
+        os.replace(tmpfile, outfile)
+    if os.path.exists(validfile):
+        os.remove(validfile)
+    if error is not None:
+        raise VerificationError(error)
+
+    return outfile
+
+
+#%%
+class _StreamReader(io.RawIOBase):
+    '''
+    Read-only file object with the bytes of a download which runs in a
+    background thread (producer/consumer handoff through a bounded queue).
+    '''
+
+    def __init__(self, url, outfile, maxsize=16, **kwargs):
+
+        self._queue = queue.Queue(maxsize)
+        self._cancel = threading.Event()
+        self._buffer = b''
+        self._done = False
+
+        self._thread = threading.Thread(target=self._produce,
+                                        args=(url, outfile), kwargs=kwargs,
+                                        daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        # wait while the queue is full, unless the reader was closed
+        while True:
+            try:
+                self._queue.put(item, timeout=.1)
+                return
+            except queue.Full:
+                if self._cancel.is_set():
+                    raise _Cancelled('reader was closed')
+
+    def _produce(self, url, outfile, **kwargs):
+        try:
+            download(url, outfile, consumer=self._put, **kwargs)
+        except BaseException as err:
+            if not self._cancel.is_set():
+                self._put(err)
+            return
+        self._put(None)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+
+        while not self._buffer and not self._done:
+            item = self._queue.get()
+            if item is None:
+                # the download was complete and verified
+                self._done = True
+            elif isinstance(item, BaseException):
+                self._done = True
+                raise item
+            else:
+                self._buffer = item
+
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._cancel.set()
+            self._thread.join()
+        super().close()
+
+
+#%%
+def open_url(url, outfile, **kwargs):
+    '''
+    Download a file in a background thread (see download()) and return a
+    binary file object which yields the bytes as they arrive. The end of the
+    file is only reached after the download was verified; a failed
+    download raises an exception in read().
+
+    Input:
+    - url: URL of the remote file
+    - outfile: name of the local copy
+    - (optional) kwargs: size, sha256, retries, chunk (see download())
+
+    Output:
+    - src: binary file object
+    '''
+
+    return io.BufferedReader(_StreamReader(url, outfile, **kwargs))
+
+
+#%%
+def fetch_url(url, outfile, chunk=CHUNK, **kwargs):
+    '''
+    Download a file (http://, https:// or ftp://) to a local file. The data is
+    written to a temporary file first, so an interrupted download never leaves
+    an incomplete outfile behind (see download()).
+
+    Input:
+    - url: URL of the remote file
+    - outfile: name of the local file
+    - (optional) chunk: number of bytes read at once
+    - (optional) kwargs: size, sha256, retries (see download())
+
+    Output:
+    - outfile: name of the local file
+    '''
+
+    return download(url, outfile, chunk=chunk, **kwargs)
+
+
+#%%
+def fetch_bbmp(outfile='data/raw/bbmp_aggregated_profiles.csv', url=BBMP_URL):
+    '''
+    Download the aggregated BBMP profiles (CSV file).
+    '''
+    return fetch_url(url, outfile)
+
+
+#%%
+def fetch_glider(ID, outfile=None, base_url=ERDDAP_URL):
+    '''
+    Download the data of a glider deployment from ERDDAP (*.csvp file). By
+    default, the file is saved as data/raw/<ID>.csvp.
+    '''
+
+    if outfile is None:
+        outfile = 'data/raw/{}.csvp'.format(ID)
+
+    return fetch_url(glider_url(ID, base_url), outfile)
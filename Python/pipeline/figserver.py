@@ -0,0 +1,573 @@
+# -*- coding: utf-8 -*-
+""" Local HTTP server of rendered figures
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+The Hovmoeller diagrams of the BBMP data and the glider sections are saved
+as static files (figures/*.png, the PDFs of tutorial 03) which have to be
+made again by hand. This server renders them on request, for any variable,
+range of years, with or without anomalies and for any deployment:
+
+    python -m pipeline serve --port 8050 -j 2
+
+    http://127.0.0.1:8050/hovmoeller.png
+    http://127.0.0.1:8050/hovmoeller.pdf?var=temperature&start=2010&end=2015
+    http://127.0.0.1:8050/hovmoeller.png?var=salinity&anomaly=1&cube=weekly
+    http://127.0.0.1:8050/section.png?id=otn200_20151027_53_delayed&var=density
+    http://127.0.0.1:8050/status
+
+- the figures are drawn by analysis.plot_hovmoeller() and
+  section.plot_section() in a pool of worker processes, so a figure which is
+  rendered does not block the requests for other figures,
+- the rendered bytes are kept in an LRU cache (CACHE_MB) keyed by the
+  product, its parameters and the version (modification time and size) of
+  the data files it is made from, so a figure is rendered again when its
+  data change, and cached figures are served in about a millisecond,
+- requests for a figure which is being rendered wait for the same render,
+- deployment IDs are names of stores in glider_dir, and the bin sizes of the
+  sections are one of DISTANCE_BINS and DEPTH_BINS.
+
+/status returns the numbers of cache hits, misses and renders as JSON.
+"""
+
+#%% Import all packages which we will need
+import collections
+import concurrent.futures
+import functools
+import http.server
+import io
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+
+from pipeline import add_tutorial_paths, cli, instrument, tasks
+
+# default port of the server
+PORT = 8050
+
+# size of the cache of rendered figures in MB
+CACHE_MB = 256
+
+# longest time a request waits for a figure in seconds
+RENDER_TIMEOUT = 300.
+
+# BBMP data cubes which can be plotted
+CUBES = {'raw': cli.BBMP_NC, 'weekly': cli.BBMP_WEEKLY,
+         'derived': cli.BBMP_DERIVED}
+
+# file formats of the figures
+FORMATS = {'.png': 'image/png', '.pdf': 'application/pdf',
+           '.svg': 'image/svg+xml'}
+
+# products and their parameters (with default values)
+PRODUCTS = {
+    'hovmoeller': {'var': 'all', 'start': None, 'end': None,
+                   'anomaly': False, 'cube': 'raw'},
+    'section': {'id': cli.GLIDER_ID, 'var': 'temperature', 'dx': None,
+                'dz': None},
+}
+
+# deployment IDs (names of the stores in glider_dir), and the bin sizes of
+# the sections in km and m: each section is saved as file, and small bins
+# make large grids
+DEPLOYMENT_ID = re.compile(r'[A-Za-z0-9_-]+')
+DISTANCE_BINS = [.5, 1., 2., 5., 10.]
+DEPTH_BINS = [.5, 1., 2., 5., 10.]
+
+
+#%%
+def _init_worker():
+    '''
+    Import the plotting packages when a worker starts, not with its first
+    figure. The stages of the figures are recorded for as long as the
+    server runs, so only the latest ones are kept.
+    '''
+
+    instrument.limit(instrument.KEEP_STAGES)
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot
+
+    add_tutorial_paths()
+    import analysis
+    import cmocean
+
+
+#%%
+def _ready():
+    '''
+    Task which only returns when a worker has started.
+    '''
+
+    return os.getpid()
+
+
+#%%
+def _savefig(fig, fmt):
+    '''
+    Bytes of a figure in a file format ('png', 'pdf', 'svg').
+    '''
+
+    import matplotlib.pyplot as plt
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt)
+    plt.close(fig)
+
+    return buf.getvalue()
+
+
+#%%
+def render_hovmoeller(infile, variables=None, start=None, end=None,
+                      climfile=None, fmt='png'):
+    '''
+    Render Hovmoeller diagrams of the BBMP data.
+
+    Input:
+    - infile: NetCDF file with (time, pressure) data
+    - (optional) variables: list of variables (default: all (time,
+      pressure) variables)
+    - (optional) start, end: first and last year
+    - (optional) climfile: plot the anomalies from this climatology
+    - (optional) fmt: file format
+
+    Output:
+    - data: bytes of the figure
+    '''
+
+    add_tutorial_paths()
+    import analysis
+    import matplotlib.pyplot as plt
+    import xarray as xr
+
+    from pipeline import qc
+
+    with xr.open_dataset(infile) as ds:
+
+        # only (time, pressure) variables can be plotted, e.g. not the
+        # mixed-layer depth of the derived cube
+        ds = qc.mask_dataset(ds)
+        profiles = [v for v in ds.data_vars
+                    if ds[v].dims == ('time', 'pressure')]
+        variables = list(variables or profiles)
+        for vname in variables:
+            if vname not in profiles:
+                raise KeyError('no (time, pressure) variable {0} in {1}'
+                               .format(vname, infile))
+
+        ds = ds[variables].sel(time=slice(
+            None if start is None else str(start),
+            None if end is None else str(end))).load()
+
+    if ds.sizes['time'] == 0:
+        raise KeyError('no data between {0} and {1}'.format(start, end))
+
+    if climfile is not None:
+        ds = tasks.anomalies(ds, climfile)
+
+    # the layout of tasks.plot_variable() for one variable, and of
+    # analysis.plot_hovmoeller_figure() for several
+    fig, axs = plt.subplots(nrows=len(variables), ncols=1,
+                            figsize=(7.5, 3. if len(variables) == 1 else 9.3),
+                            sharex=True, sharey=True, squeeze=False)
+
+    for vname, ax in zip(variables, axs[:, 0]):
+        pcm = analysis.plot_hovmoeller(ds, vname, ax)
+        fig.colorbar(pcm, ax=ax)
+
+    ax.invert_yaxis()
+    fig.tight_layout()
+
+    return _savefig(fig, fmt)
+
+
+#%%
+def render_section(ID, infile, var='temperature', dx=None, dz=None,
+                   fmt='png'):
+    '''
+    Render the along-track section of a glider deployment (see section.py).
+
+    Input:
+    - ID: deployment ID
+    - infile: glider store
+    - (optional) var: variable
+    - (optional) dx, dz: bin sizes in km and m
+    - (optional) fmt: file format
+
+    Output:
+    - data: bytes of the figure
+    '''
+
+    import matplotlib.pyplot as plt
+
+    from pipeline import section
+
+    ds = section.get_section(ID, dx=dx or section.DISTANCE_BIN,
+                             dz=dz or section.DEPTH_BIN, infile=infile)
+
+    fig, ax = plt.subplots(figsize=(9.3, 5.))
+    section.plot_section(ds, var, ax=ax)
+
+    return _savefig(fig, fmt)
+
+
+#%%
+def _year(value):
+    '''
+    Year of a query parameter (None if it is not given).
+    '''
+
+    return None if value in (None, '') else int(value)
+
+
+#%%
+def _flag(value):
+    '''
+    Boolean of a query parameter (1, true, yes or on).
+    '''
+
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+#%%
+def _float(value):
+    '''
+    Number of a query parameter (None if it is not given).
+    '''
+
+    return None if value in (None, '') else float(value)
+
+
+#%%
+def _version(paths):
+    '''
+    Version of data files: modification time and size of each file.
+    '''
+
+    version = []
+    for path in paths:
+        if not os.path.isfile(path):
+            raise FileNotFoundError('no data file {}'.format(path))
+        st = os.stat(path)
+        version.append((path, st.st_mtime_ns, st.st_size))
+
+    return tuple(version)
+
+
+#%%
+class FigureCache(object):
+    '''
+    Least recently used cache of rendered figures (bytes) with a limit on
+    the total size. It is used by the threads of the HTTP server, so all
+    methods take a lock.
+    '''
+
+    def __init__(self, maxbytes=CACHE_MB * 2**20):
+
+        self.maxbytes = maxbytes
+        self.entries = collections.OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key):
+        '''
+        Return the bytes of a key (None if it is not cached).
+        '''
+
+        with self.lock:
+            data = self.entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        '''
+        Add the bytes of a key, and remove the least recently used entries
+        until the cache fits into maxbytes.
+        '''
+
+        if len(data) > self.maxbytes:
+            return
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= len(old)
+
+            self.entries[key] = data
+            self.nbytes += len(data)
+
+            while self.nbytes > self.maxbytes:
+                _, old = self.entries.popitem(last=False)
+                self.nbytes -= len(old)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'nbytes': self.nbytes,
+                    'maxbytes': self.maxbytes, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+
+#%%
+class _Handler(http.server.BaseHTTPRequestHandler):
+    '''
+    HTTP request handler of FigureServer (one thread per request).
+    '''
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code, body, ctype, headers=()):
+        self.send_response(code)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, code, obj):
+        self._send(code, json.dumps(obj, indent=1).encode(),
+                   'application/json')
+
+    def do_GET(self):
+
+        figures = self.server.figures
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+
+        if url.path == '/':
+            return self._send_json(200, {'products': PRODUCTS,
+                                         'formats': sorted(FORMATS)})
+
+        if url.path == '/status':
+            return self._send_json(200, figures.status())
+
+        try:
+            data, ctype, hit = figures.figure(url.path, query)
+        except ValueError as err:
+            return self._send_json(400, {'error': str(err)})
+        except (KeyError, FileNotFoundError) as err:
+            return self._send_json(404, {'error': err.args[0]})
+        except concurrent.futures.TimeoutError:
+            return self._send_json(504, {'error': 'rendering timed out'})
+        except Exception as err:
+            return self._send_json(500, {'error': repr(err)})
+
+        self._send(200, data, ctype,
+                   [('X-Cache', 'hit' if hit else 'miss'),
+                    ('Cache-Control', 'no-cache')])
+
+
+#%%
+class FigureServer(object):
+    '''
+    Renders figures in a process pool and caches them (see module
+    docstring). figure() can be called directly, listen() serves the
+    figures over HTTP.
+
+    Input:
+    - (optional) jobs: number of worker processes (default: number of CPUs)
+    - (optional) cache_mb: size of the figure cache in MB
+    - (optional) cubes: dictionary name -> NetCDF file of the BBMP cubes
+    - (optional) climfile: climatology of the anomalies
+    - (optional) glider_dir: directory of the glider stores (<ID>.h5)
+    '''
+
+    def __init__(self, jobs=None, cache_mb=CACHE_MB, cubes=CUBES,
+                 climfile=tasks.BBMP_CLIM, glider_dir='data/raw'):
+
+        self.jobs = jobs or os.cpu_count() or 1
+        self.cache = FigureCache(int(cache_mb * 2**20))
+        self.cubes = dict(cubes)
+        self.climfile = climfile
+        self.glider_dir = glider_dir
+
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            self.jobs, initializer=_init_worker)
+
+        # start all workers now, before the server threads run
+        concurrent.futures.wait([self.executor.submit(_ready)
+                                 for _ in range(self.jobs)])
+
+        self.httpd = None
+        self.thread = None
+
+        # renders in progress by key, and their statistics
+        self.inflight = {}
+        self.renders = 0
+        self.render_s = 0.
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _request(self, name, query):
+        '''
+        Render function, arguments and data files of a product.
+        '''
+
+        if name not in PRODUCTS:
+            raise KeyError('unknown product {0!r}, use one of {1}'.format(
+                name, sorted(PRODUCTS)))
+
+        unknown = set(query) - set(PRODUCTS[name])
+        if unknown:
+            raise ValueError('unknown parameters {0} of {1}'.format(
+                sorted(unknown), name))
+
+        params = dict(PRODUCTS[name], **query)
+
+        if name == 'hovmoeller':
+            if params['cube'] not in self.cubes:
+                raise ValueError('unknown cube {0!r}, use one of {1}'.format(
+                    params['cube'], sorted(self.cubes)))
+            infile = self.cubes[params['cube']]
+            climfile = self.climfile if _flag(params['anomaly']) else None
+            variables = (None if params['var'] == 'all'
+                         else tuple(params['var'].split(',')))
+            args = (infile, variables, _year(params['start']),
+                    _year(params['end']), climfile)
+            files = [infile] + ([climfile] if climfile else [])
+            return render_hovmoeller, args, files
+
+        from pipeline import section
+
+        if params['var'] not in section.VARIABLES:
+            raise ValueError('unknown variable {0!r}, use one of {1}'.format(
+                params['var'], section.VARIABLES))
+        if not DEPLOYMENT_ID.fullmatch(params['id']):
+            raise ValueError('invalid deployment ID {!r}'.format(params['id']))
+
+        dx, dz = _float(params['dx']), _float(params['dz'])
+        if dx is not None and dx not in DISTANCE_BINS:
+            raise ValueError('dx must be one of {}'.format(DISTANCE_BINS))
+        if dz is not None and dz not in DEPTH_BINS:
+            raise ValueError('dz must be one of {}'.format(DEPTH_BINS))
+
+        infile = os.path.join(self.glider_dir, '{}.h5'.format(params['id']))
+        args = (params['id'], infile, params['var'], dx, dz)
+
+        return render_section, args, [infile]
+
+    def _done(self, key, started, future):
+        '''
+        Cache a figure when it is rendered.
+        '''
+
+        with self.lock:
+            if future.exception() is None:
+                self.cache.put(key, future.result())
+                self.renders += 1
+                self.render_s += time.perf_counter() - started
+            self.inflight.pop(key, None)
+
+    def figure(self, path, query=None):
+        '''
+        Return a figure from the cache, or render it.
+
+        Input:
+        - path: product and format, e.g. '/hovmoeller.png'
+        - (optional) query: dictionary with the parameters of the product
+
+        Output:
+        - data: bytes of the figure
+        - ctype: content type
+        - hit: True if the figure was cached
+        '''
+
+        name, suffix = os.path.splitext(path.strip('/'))
+        if suffix not in FORMATS:
+            raise KeyError('unknown format {0!r}, use one of {1}'.format(
+                suffix, sorted(FORMATS)))
+
+        func, args, files = self._request(name, query or {})
+        key = (func.__name__, args, suffix, _version(files))
+
+        data = self.cache.get(key)
+        if data is not None:
+            return data, FORMATS[suffix], True
+
+        with self.lock:
+            future = self.inflight.get(key)
+            submitted = future is None
+            if submitted:
+                # rendered after the lookup above
+                if key in self.cache:
+                    return self.cache.get(key), FORMATS[suffix], True
+                future = self.executor.submit(func, *args, fmt=suffix[1:])
+                self.inflight[key] = future
+                started = time.perf_counter()
+
+        # outside of the lock: the callback takes the lock, and it runs in
+        # this thread if the render is already done
+        if submitted:
+            future.add_done_callback(functools.partial(self._done, key,
+                                                       started))
+
+        return future.result(RENDER_TIMEOUT), FORMATS[suffix], False
+
+    def status(self):
+        '''
+        Statistics of the cache and of the renders.
+        '''
+
+        stats = self.cache.stats()
+        with self.lock:
+            stats.update({'jobs': self.jobs, 'inflight': len(self.inflight),
+                          'renders': self.renders,
+                          'render_s': round(self.render_s, 3)})
+
+        return stats
+
+    def listen(self, host='127.0.0.1', port=PORT):
+        '''
+        Serve the figures over HTTP in a background thread.
+
+        Output:
+        - url: base URL of the server (port 0 chooses a free port)
+        '''
+
+        self.httpd = http.server.ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.figures = self
+
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+
+        return 'http://{0}:{1}'.format(*self.httpd.server_address)
+
+    def close(self):
+        '''
+        Stop the HTTP server and the worker processes.
+        '''
+
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+        self.executor.shutdown(cancel_futures=True)
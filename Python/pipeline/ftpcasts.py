@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+""" Concurrent FTP client for the per-cast BBMP files
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+On the DFO FTP server, the CTD casts of the Bedford Basin Monitoring Program
+are stored as one CSV file per cast in yearly directories
+(BIOWebMaster/BBMP/CSV/<year>/). The CastClient keeps a small pool of logged-in
+FTP sessions open, lists several years and reads many casts concurrently. The
+data connection of each transfer is handed straight to the CSV parser, so the
+files are neither written to disk nor downloaded twice.
+
+    from pipeline import ftpcasts
+
+    with ftpcasts.CastClient(nsessions=4) as client:
+        paths = client.list_years([2017, 2018])
+        casts = client.read_casts(paths)     # cast ID -> pandas.DataFrame
+"""
+
+#%% Import all packages which we will need
+import concurrent.futures
+import contextlib
+import ftplib
+import os
+import queue
+import threading
+
+from pipeline import instrument
+
+# DFO FTP server and directory with the yearly cast directories
+BBMP_FTP_HOST = 'ftp.dfo-mpo.gc.ca'
+BBMP_CSV_DIR = 'BIOWebMaster/BBMP/CSV'
+
+# number of metadata lines at the top of each cast file
+HEADER_LINES = 10
+
+
+#%%
+def read_cast_csv(f):
+    '''
+    Default parser of a cast file: skip the metadata header and read the data
+    into a pandas.DataFrame().
+
+    Input:
+    - f: binary file object (e.g. the data connection of an FTP transfer)
+    '''
+
+    import pandas as pd
+
+    return pd.read_csv(f, skiprows=HEADER_LINES)
+
+
+#%%
+class CastClient(object):
+    '''
+    Pool of persistent FTP sessions to the BBMP server.
+
+    Input:
+    - (optional) host: FTP server
+    - (optional) port: port of FTP server
+    - (optional) basedir: directory with the yearly cast directories
+    - (optional) nsessions: maximum number of simultaneous sessions
+    - (optional) timeout: socket timeout in seconds
+    '''
+
+    def __init__(self, host=BBMP_FTP_HOST, port=21, basedir=BBMP_CSV_DIR,
+                 nsessions=4, timeout=60.):
+
+        self.host = host
+        self.port = port
+        self.basedir = basedir.strip('/')
+        self.nsessions = nsessions
+        self.timeout = timeout
+
+        # idle sessions and number of open sessions
+        self._idle = queue.LifoQueue()
+        self._nopen = 0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(nsessions)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _connect(self):
+        '''
+        Open and log in a new FTP session.
+        '''
+
+        ftp = ftplib.FTP(timeout=self.timeout)
+        ftp.connect(self.host, self.port)
+        ftp.login()
+
+        # all transfers are binary, so this only needs to be set once
+        ftp.voidcmd('TYPE I')
+
+        with self._lock:
+            self._nopen += 1
+
+        return ftp
+
+    def _discard(self, ftp):
+        '''
+        Close a session which is no longer usable.
+        '''
+
+        try:
+            ftp.close()
+        finally:
+            with self._lock:
+                self._nopen -= 1
+
+    @contextlib.contextmanager
+    def session(self):
+        '''
+        Borrow a logged-in FTP session from the pool. Sessions are closed
+        (and replaced by a new one the next time) after any error, e.g. of a
+        parser, since they may be broken or wait for an unread reply.
+        '''
+
+        with self._slots:
+            try:
+                ftp = self._idle.get_nowait()
+            except queue.Empty:
+                ftp = self._connect()
+
+            try:
+                yield ftp
+            except BaseException:
+                self._discard(ftp)
+                raise
+            else:
+                self._idle.put(ftp)
+
+    def close(self):
+        '''
+        Log out of all idle sessions.
+        '''
+
+        while True:
+            try:
+                ftp = self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+            try:
+                ftp.quit()
+            except (ftplib.Error, OSError, EOFError):
+                pass
+
+            self._discard(ftp)
+
+    def list_year(self, year):
+        '''
+        Return the paths (relative to basedir) of all cast files of a year.
+        '''
+
+        path = '{0}/{1}'.format(self.basedir, year)
+
+        with self.session() as ftp:
+            names = ftp.nlst(path)
+
+        # depending on the server, nlst() returns names with or without path
+        return sorted('{0}/{1}'.format(year, os.path.basename(n))
+                      for n in names if n.lower().endswith('.csv'))
+
+    def list_years(self, years):
+        '''
+        Return the paths of all cast files of several years. The listings run
+        concurrently on the sessions of the pool.
+        '''
+
+        with concurrent.futures.ThreadPoolExecutor(self.nsessions) as ex:
+            listings = list(ex.map(self.list_year, years))
+
+        return [p for paths in listings for p in paths]
+
+    def read_cast(self, path, parser=read_cast_csv):
+        '''
+        Read a cast file and parse it while it is transferred.
+
+        Input:
+        - path: path of the cast file relative to basedir
+        - (optional) parser: function which takes a binary file object
+
+        Output:
+        - whatever the parser returns (default: pandas.DataFrame())
+        '''
+
+        cmd = 'RETR {0}/{1}'.format(self.basedir, path)
+
+        with self.session() as ftp:
+
+            # open the data connection and let the parser read from it
+            conn = ftp.transfercmd(cmd)
+            try:
+                with conn.makefile('rb') as f:
+                    result = parser(f)
+            finally:
+                conn.close()
+
+            # wait for the end-of-transfer response of the server
+            ftp.voidresp()
+
+        return result
+
+    def read_casts(self, paths, parser=read_cast_csv, retries=1):
+        '''
+        Read many cast files concurrently.
+
+        Input:
+        - paths: list of paths relative to basedir
+        - (optional) parser: function which takes a binary file object
+        - (optional) retries: number of retries of a failed transfer
+
+        Output:
+        - casts: dictionary cast ID (file name without suffix) -> result
+        '''
+
+        def work(path):
+            for attempt in range(retries + 1):
+                try:
+                    return self.read_cast(path, parser)
+                except (ftplib.Error, OSError, EOFError):
+                    if attempt == retries:
+                        raise
+
+        with instrument.stage('ftpcasts.read_casts'):
+            with concurrent.futures.ThreadPoolExecutor(self.nsessions) as ex:
+                results = list(ex.map(work, paths))
+
+        return {os.path.splitext(os.path.basename(p))[0]: r
+                for p, r in zip(paths, results)}
+
+    def download(self, path, outfile):
+        '''
+        Download a cast file to a local file.
+        '''
+
+        outdir = os.path.dirname(outfile)
+        if outdir and not os.path.isdir(outdir):
+            os.makedirs(outdir, exist_ok=True)
+
+        cmd = 'RETR {0}/{1}'.format(self.basedir, path)
+
+        with self.session() as ftp, open(outfile, 'wb') as f:
+            ftp.retrbinary(cmd, f.write)
+
+        return outfile
+
+    def download_casts(self, paths, outdir):
+        '''
+        Download many cast files concurrently to outdir/<year>/<file>.
+        '''
+
+        def work(path):
+            return self.download(path, os.path.join(outdir, path))
+
+        with instrument.stage('ftpcasts.download_casts') as st:
+            with concurrent.futures.ThreadPoolExecutor(self.nsessions) as ex:
+                files = list(ex.map(work, paths))
+            st.add_bytes(sum(os.path.getsize(f) for f in files))
+
+        return files
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+""" Appendable HDF5 stores of glider data
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+The glider data (data/raw/<ID>.h5) used to be written with HDFStore.put() in
+pandas' fixed format, which can only be written and read as a whole. Here the
+data are stored as an appendable table instead:
+
+- new rows (e.g. of a realtime deployment) are appended without rewriting the
+  rows which are already stored,
+- the time index is indexed by PyTables, so selections of a time range only
+  read the matching rows (the rows are sorted by time, so the cheapest index
+  kind is enough),
+- the table is compressed with blosc:lz4, which is about as fast to read as
+  uncompressed data.
+
+    from pipeline import gliderstore
+
+    gliderstore.write_store(df, 'data/raw/otn200_20151027_53_delayed.h5')
+    gliderstore.append_store(new, 'data/raw/otn200_20151027_53_delayed.h5')
+    df = gliderstore.read_store('data/raw/otn200_20151027_53_delayed.h5',
+                                start='2015-11-01', stop='2015-11-02')
+"""
+
+#%% Import all packages which we will need
+import os
+
+import pandas as pd
+
+from pipeline import instrument
+
+# key of the glider data in the HDF5 store
+STORE_KEY = 'df'
+
+# compression of the table
+COMPLIB = 'blosc:lz4'
+COMPLEVEL = 5
+
+# PyTables index of the time index
+INDEX_KIND = 'ultralight'
+INDEX_OPTLEVEL = 1
+
+
+#%%
+def _makedirs(outfile):
+    '''
+    Create the directory of a file if it does not exist.
+    '''
+
+    outdir = os.path.dirname(outfile)
+    if outdir and not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+
+#%%
+def _append(store, df, key, index=True):
+    '''
+    Append rows to a table. Only the time index is indexed: updating indexes
+    of all data columns would cost more than the append itself.
+    '''
+
+    store.append(key, df, format='table', data_columns=True,
+                 index=['index'] if index else False, complib=COMPLIB,
+                 complevel=COMPLEVEL)
+
+
+#%%
+def _create_index(store, key):
+    '''
+    Index the time index of a table. Indexing all rows at the end is faster
+    than while they are written.
+    '''
+
+    store.create_table_index(key, columns=['index'], kind=INDEX_KIND,
+                             optlevel=INDEX_OPTLEVEL)
+
+
+#%%
+def write_store(df, outfile, key=STORE_KEY):
+    '''
+    Write glider data as new appendable HDF5 table (an existing file is
+    overwritten).
+
+    Input:
+    - df: pandas.DataFrame() with DatetimeIndex
+    - outfile: name of the HDF5 file
+    - (optional) key: key of the table in the file
+
+    Output:
+    - nbytes: size of the file in bytes
+    '''
+
+    _makedirs(outfile)
+
+    with pd.HDFStore(outfile, 'w') as store:
+        _append(store, df, key, index=False)
+        _create_index(store, key)
+
+    return os.path.getsize(outfile)
+
+
+#%%
+def append_store(df, outfile, key=STORE_KEY):
+    '''
+    Append rows to the glider data in an HDF5 file. A file which does not
+    exist is created, and a store which was written in fixed format (e.g. by
+    HDFStore.put) is converted to a table once.
+
+    Input:
+    - df: pandas.DataFrame() with new rows
+    - outfile: name of the HDF5 file
+    - (optional) key: key of the table in the file
+    '''
+
+    if not os.path.isfile(outfile):
+        write_store(df, outfile, key)
+        return
+
+    with pd.HDFStore(outfile, 'a') as store:
+
+        if '/' + key not in store.keys():
+            _append(store, df, key, index=False)
+            _create_index(store, key)
+            return
+
+        if not store.get_storer(key).is_table:
+            old = store.get(key)
+            store.remove(key)
+            _append(store, old, key, index=False)
+            _create_index(store, key)
+
+        # columns must have the same types as in the table
+        dtypes = store.select(key, start=0, stop=0).dtypes
+        _append(store, df.astype(dtypes.to_dict()), key)
+
+
+#%%
+def nrows(outfile, key=STORE_KEY):
+    '''
+    Return the number of rows of the glider data in an HDF5 file.
+    '''
+
+    with pd.HDFStore(outfile, 'r') as store:
+        storer = store.get_storer(key)
+        return storer.nrows if storer.is_table else storer.shape[0]
+
+
+#%%
+def last_time(outfile, key=STORE_KEY):
+    '''
+    Return the time of the last row of a glider store (None if there is no
+    store or no data yet). Only the last row is read.
+    '''
+
+    if not os.path.isfile(outfile):
+        return None
+
+    with pd.HDFStore(outfile, 'r') as store:
+        if '/' + key not in store.keys():
+            return None
+        storer = store.get_storer(key)
+        n = storer.nrows if storer.is_table else storer.shape[0]
+        if not n:
+            return None
+        return store.select(key, start=n - 1).index[-1]
+
+
+#%%
+def last_profile(outfile, group='profile_id', key=STORE_KEY, chunk=1000):
+    '''
+    Return the rows of the last profile of a glider store (None if there is
+    no store, no data yet or the last row has no profile ID). The rows are
+    read backwards in chunks until the profile starts.
+
+    Input:
+    - outfile: name of the HDF5 file
+    - (optional) group: column with profile IDs
+    - (optional) key: key of the table in the file
+    - (optional) chunk: number of rows which are read at once
+    '''
+
+    if not os.path.isfile(outfile):
+        return None
+
+    with pd.HDFStore(outfile, 'r') as store:
+
+        if '/' + key not in store.keys():
+            return None
+        storer = store.get_storer(key)
+        n = storer.nrows if storer.is_table else storer.shape[0]
+        if not n:
+            return None
+
+        start = n
+        while True:
+            start = max(start - chunk, 0)
+            tail = store.select(key, start=start, stop=n)
+            pid = tail[group].values[-1]
+            if pd.isnull(pid):
+                return None
+            other = (tail[group].values != pid).nonzero()[0]
+            if len(other):
+                return tail.iloc[other[-1] + 1:]
+            if start == 0:
+                return tail
+            chunk *= 2
+
+
+#%%
+def replace_tail(df, outfile, key=STORE_KEY):
+    '''
+    Replace the rows of a glider store from the first time of df on by the
+    rows of df (e.g. stored rows whose flags changed, followed by new rows).
+
+    Input:
+    - df: pandas.DataFrame() with rows ordered by time
+    - outfile: name of the HDF5 file
+    - (optional) key: key of the table in the file
+    '''
+
+    # the condition refers to the local variable start
+    start = df.index[0]
+
+    with pd.HDFStore(outfile, 'a') as store:
+        if store.get_storer(key).is_table:
+            store.remove(key, where='index >= start')
+        else:
+            old = store.get(key)
+            store.remove(key)
+            _append(store, old.loc[old.index < start], key, index=False)
+            _create_index(store, key)
+
+    append_store(df, outfile, key)
+
+
+#%%
+def read_store(fname, start=None, stop=None, columns=None, key=STORE_KEY):
+    '''
+    Read glider data from an HDF5 file. With a time range, only the matching
+    rows are read from a table.
+
+    Input:
+    - fname: name of the HDF5 file
+    - (optional) start: first time (inclusive), e.g. '2015-11-01'
+    - (optional) stop: last time (exclusive)
+    - (optional) columns: list of columns which are read (default: all)
+    - (optional) key: key of the data in the file
+
+    Output:
+    - df: pandas.DataFrame() with glider data
+    '''
+
+    # the conditions refer to the local variables start and stop
+    where = []
+    if start is not None:
+        start = pd.Timestamp(start)
+        where.append('index >= start')
+    if stop is not None:
+        stop = pd.Timestamp(stop)
+        where.append('index < stop')
+
+    with instrument.stage('glider.read_hdf'), pd.HDFStore(fname, 'r') as store:
+
+        if store.get_storer(key).is_table:
+            return store.select(key, where=' & '.join(where) or None,
+                                columns=columns)
+
+        # fixed format: read everything and select in memory
+        df = store.get(key)
+        if start is not None:
+            df = df.loc[df.index >= start]
+        if stop is not None:
+            df = df.loc[df.index < stop]
+        return df if columns is None else df[columns]
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+""" Timing and memory instrumentation for pipeline stages
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+This module records wall time, CPU time, bytes transferred and memory
+(resident set size at the start and end of the stage, and the peak of the
+whole process so far) for named stages of a data pipeline, e.g. downloading,
+parsing, gridding, writing NetCDF files or plotting. A stage is measured with
+a context manager or a decorator:
+
+    from pipeline import instrument
+
+    with instrument.stage('bbmp.parse') as st:
+        df = pd.read_csv(fname)
+        st.add_bytes(os.path.getsize(fname))
+
+    @instrument.timed('bbmp.plot')
+    def plot_hovmoeller(ds, vname, ax):
+        ...
+
+    instrument.write_report('reports/analysis.json')
+
+Only a few clock reads, two reads of /proc/self/statm and one getrusage()
+call are made per stage, so the
+instrumentation is cheap enough to stay switched on all the time. Processes
+which run for days (e.g. 'python -m pipeline follow' or 'serve') only keep the
+latest stages:
+
+    instrument.limit(instrument.KEEP_STAGES)
+"""
+
+#%% Import all packages which we will need
+import collections
+import contextlib
+import csv
+import datetime
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+# the resource module is only available on Unix
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# number of stages kept by long-running processes
+KEEP_STAGES = 10000
+
+
+#%%
+def rss_mb():
+    '''
+    Return the current resident set size of the process in megabytes.
+
+    Output:
+    - RSS in MB or None if it cannot be determined on this platform (only
+      Linux is supported)
+    '''
+
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+    return pages * os.sysconf('SC_PAGE_SIZE') / 1024. ** 2
+
+
+#%%
+def peak_rss_mb():
+    '''
+    Return the peak resident set size of the current process in megabytes.
+    This is the high-water mark of the whole lifetime of the process, not of
+    a single stage (see RSSSampler).
+
+    Output:
+    - peak RSS in MB or None if it cannot be determined on this platform
+    '''
+
+    if resource is None:
+        return None
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is given in bytes on macOS and in kilobytes on Linux
+    if sys.platform == 'darwin':
+        return maxrss / 1024. ** 2
+
+    return maxrss / 1024.
+
+
+#%%
+class RSSSampler(object):
+    '''
+    Context manager which samples the resident set size in a background
+    thread and records its peak during the code block (e.g. one benchmark
+    case). Unlike peak_rss_mb(), this is the peak of the block only.
+
+        with instrument.RSSSampler() as sampler:
+            ...
+        print(sampler.peak_mb)
+
+    Input:
+    - (optional) interval: time between samples in seconds
+    '''
+
+    def __init__(self, interval=.01):
+
+        self.interval = interval
+        self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+
+        rss = rss_mb()
+        if rss is not None and (self.peak_mb is None or rss > self.peak_mb):
+            self.peak_mb = rss
+
+    def _run(self):
+
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def __exit__(self, *exc):
+
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+#%%
+class Stage(object):
+    '''
+    Measurements of a single named pipeline stage.
+    '''
+
+    def __init__(self, name):
+
+        self.name = name
+        self.started = None
+        self.wall_s = None
+        self.cpu_s = None
+        self.nbytes = 0
+        self.rss_start_mb = None
+        self.rss_end_mb = None
+        self.process_peak_rss_mb = None
+        self.ok = True
+
+    def add_bytes(self, nbytes):
+        '''
+        Add to the number of bytes transferred (read, downloaded or written)
+        during this stage.
+        '''
+        self.nbytes += int(nbytes)
+
+    def as_dict(self):
+        '''
+        Return the measurements as a dictionary (one row of the run report).
+        '''
+        return {'name': self.name,
+                'started': self.started,
+                'wall_s': self.wall_s,
+                'cpu_s': self.cpu_s,
+                'nbytes': self.nbytes,
+                'rss_start_mb': self.rss_start_mb,
+                'rss_end_mb': self.rss_end_mb,
+                'process_peak_rss_mb': self.process_peak_rss_mb,
+                'ok': self.ok}
+
+
+#%%
+class Recorder(object):
+    '''
+    Collects the measurements of all stages of a pipeline run.
+
+    Input:
+    - (optional) maxlen: number of stages which are kept (default: all), the
+      oldest stages are dropped first
+    '''
+
+    # column order of the run report
+    fields = ['name', 'started', 'wall_s', 'cpu_s', 'nbytes', 'rss_start_mb',
+              'rss_end_mb', 'process_peak_rss_mb', 'ok']
+
+    def __init__(self, maxlen=None):
+
+        self.stages = collections.deque(maxlen=maxlen)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        '''
+        Context manager which measures the code block as a stage called name.
+        The yielded Stage object can be used to add transferred bytes.
+        '''
+
+        st = Stage(name)
+        st.started = datetime.datetime.now().isoformat()
+        st.rss_start_mb = rss_mb()
+
+        wall0 = time.perf_counter()
+        cpu0 = time.process_time()
+
+        try:
+            yield st
+        except BaseException:
+            st.ok = False
+            raise
+        finally:
+            st.wall_s = time.perf_counter() - wall0
+            st.cpu_s = time.process_time() - cpu0
+            st.rss_end_mb = rss_mb()
+            st.process_peak_rss_mb = peak_rss_mb()
+            self.stages.append(st)
+
+    def timed(self, name=None):
+        '''
+        Decorator which measures every call of a function as a stage. If no
+        name is given, the qualified name of the function is used.
+        '''
+
+        def decorator(func):
+
+            sname = name or '{}.{}'.format(func.__module__, func.__qualname__)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(sname):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def records(self):
+        '''
+        Return the measurements of all stages as a list of dictionaries.
+        '''
+        return [st.as_dict() for st in self.stages]
+
+    def write_report(self, outfile):
+        '''
+        Write the run report to a JSON or CSV file (chosen by file suffix).
+
+        Input:
+        - outfile: name of the report file (*.json or *.csv)
+        '''
+
+        # create output directory if it does not exist
+        outdir = os.path.dirname(outfile)
+        if outdir and not os.path.isdir(outdir):
+            os.makedirs(outdir)
+
+        if outfile.endswith('.csv'):
+            with open(outfile, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=self.fields)
+                writer.writeheader()
+                writer.writerows(self.records())
+        else:
+            report = {'argv': sys.argv,
+                      'pid': os.getpid(),
+                      'written': datetime.datetime.now().isoformat(),
+                      'stages': self.records()}
+            with open(outfile, 'w') as f:
+                json.dump(report, f, indent=2)
+
+    def reset(self):
+        '''
+        Forget all measurements recorded so far.
+        '''
+        self.stages.clear()
+
+    def limit(self, maxlen):
+        '''
+        Only keep the latest maxlen stages (None: keep all stages).
+        '''
+        self.stages = collections.deque(self.stages, maxlen=maxlen)
+
+
+#%% Module-level recorder shared by all pipeline scripts
+RECORDER = Recorder()
+
+stage = RECORDER.stage
+timed = RECORDER.timed
+records = RECORDER.records
+write_report = RECORDER.write_report
+reset = RECORDER.reset
+limit = RECORDER.limit
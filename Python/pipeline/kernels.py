@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+""" Kernels for gridding and binning profile data
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Gridding the BBMP profiles with pandas (set_index -> duplicated -> to_xarray
+-> where) and binning glider samples by depth spend most of their time in
+pandas overheads. The two steps are simple loops over the rows:
+
+- scatter_first(): scatter the rows into a (time, pressure level) grid, the
+  first row of a grid cell wins (as index.duplicated(keep='first')),
+- binned_stats(): number of samples, mean and standard deviation of the
+  samples in each bin (NaN are ignored, as in pandas groupby).
+
+Both are compiled with Numba if it is installed (single pass over the rows).
+Otherwise, or with backend='numpy', they are computed with np.minimum.at
+and np.bincount. grid_profiles() grids a DataFrame of profiles into an
+xarray.Dataset, identical to the pandas path which is kept as
+backend='pandas':
+
+    from pipeline import kernels
+
+    ds = kernels.grid_profiles(df, 'time_string', 'pressure',
+                               keep=lambda p: (p % .5 == 0.) & (p <= 70.))
+    count, mean, std = kernels.binned_stats(index, values, nbins)
+"""
+
+#%% Import all packages which we will need
+import numpy as np
+
+# Numba is optional
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# backends of the kernels
+BACKENDS = ['numba', 'numpy']
+
+# default backend
+BACKEND = 'numba' if numba is not None else 'numpy'
+
+
+#%%
+def _backend(backend):
+    '''
+    Check the name of a backend (None: default backend).
+    '''
+
+    if backend is None:
+        return BACKEND
+
+    if backend not in BACKENDS:
+        raise ValueError('unknown backend {0!r}, use one of {1}'.format(
+            backend, BACKENDS))
+
+    if backend == 'numba' and numba is None:
+        raise ImportError('backend numba needs the numba package')
+
+    return backend
+
+
+#%%
+def _scatter_first_numpy(row, col, values, grid):
+    '''
+    scatter_first() with np.minimum.at (first row of each cell).
+    '''
+
+    nrows, ncols = grid.shape[:2]
+
+    rows = np.flatnonzero((row >= 0) & (col >= 0))
+    cells = row[rows] * ncols + col[rows]
+
+    first = np.full(nrows * ncols, row.size, dtype=np.int64)
+    np.minimum.at(first, cells, rows)
+
+    # gather the first row of each cell (np.take is faster than a masked
+    # assignment), then empty the cells without rows
+    filled = first < row.size
+    if rows.size:
+        out = grid.reshape(nrows * ncols, -1)
+        np.take(values, np.where(filled, first, 0), axis=0, out=out)
+        out[~filled] = np.nan
+
+
+#%%
+def _binned_stats_numpy(index, values, nbins, std):
+    '''
+    binned_stats() with np.bincount (two passes for the deviations).
+    '''
+
+    ok = np.isfinite(values) & (index >= 0) & (index < nbins)
+    index = index[ok]
+    values = values[ok]
+
+    count = np.bincount(index, minlength=nbins)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(index, weights=values, minlength=nbins) / count
+
+    if not std:
+        return count, mean, None
+
+    dev = values - mean[index]
+    m2 = np.bincount(index, weights=dev * dev, minlength=nbins)
+
+    return count, mean, m2
+
+
+#%%
+if numba is not None:
+
+    @numba.njit(cache=True)
+    def _scatter_first_numba(row, col, values, grid):
+        seen = np.zeros(grid.shape[:2], dtype=np.bool_)
+        for k in range(row.size):
+            ii = row[k]
+            jj = col[k]
+            if ii < 0 or jj < 0 or seen[ii, jj]:
+                continue
+            seen[ii, jj] = True
+            for vv in range(values.shape[1]):
+                grid[ii, jj, vv] = values[k, vv]
+
+    @numba.njit(cache=True)
+    def _binned_stats_numba(index, values, nbins):
+        # Welford's algorithm: mean and sum of squared deviations in one pass
+        count = np.zeros(nbins, dtype=np.int64)
+        mean = np.zeros(nbins)
+        m2 = np.zeros(nbins)
+        for k in range(index.size):
+            bb = index[k]
+            vv = values[k]
+            if bb < 0 or bb >= nbins or not np.isfinite(vv):
+                continue
+            count[bb] += 1
+            delta = vv - mean[bb]
+            mean[bb] += delta / count[bb]
+            m2[bb] += delta * (vv - mean[bb])
+        for bb in range(nbins):
+            if count[bb] == 0:
+                mean[bb] = np.nan
+        return count, mean, m2
+
+
+#%%
+def scatter_first(row, col, values, shape, backend=None):
+    '''
+    Scatter rows into a grid. If several rows fall into the same cell, the
+    first one is kept.
+
+    Input:
+    - row, col: 1D int arrays with the grid cell of each row (rows with a
+      negative row or col are not used)
+    - values: 2D array (rows, variables) or 1D array
+    - shape: (nrows, ncols) of the grid
+    - (optional) backend: 'numba' or 'numpy' (default: BACKEND)
+
+    Output:
+    - grid: float array (nrows, ncols, variables), NaN in empty cells
+    '''
+
+    backend = _backend(backend)
+
+    row = np.asarray(row, dtype=np.int64)
+    col = np.asarray(col, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+
+    grid = np.full(tuple(shape) + (values.shape[1],), np.nan)
+
+    if backend == 'numba':
+        _scatter_first_numba(row, col, values, grid)
+    else:
+        _scatter_first_numpy(row, col, values, grid)
+
+    return grid
+
+
+#%%
+def binned_stats(index, values, nbins, ddof=1, std=True, backend=None):
+    '''
+    Number of samples, mean and standard deviation of the samples in each
+    bin. NaN values and indices outside [0, nbins) are ignored.
+
+    Input:
+    - index: 1D int array with the bin of each sample
+    - values: 1D array
+    - nbins: number of bins
+    - (optional) ddof: delta degrees of freedom of the standard deviation
+      (pandas: 1)
+    - (optional) std: compute the standard deviation
+    - (optional) backend: 'numba' or 'numpy' (default: BACKEND)
+
+    Output:
+    - count: int array with the number of samples of each bin
+    - mean: mean of each bin (NaN in empty bins)
+    - std: standard deviation of each bin (NaN if count <= ddof, None if
+      std is False)
+    '''
+
+    backend = _backend(backend)
+
+    index = np.asarray(index, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+
+    if backend == 'numba':
+        count, mean, m2 = _binned_stats_numba(index, values, nbins)
+    else:
+        count, mean, m2 = _binned_stats_numpy(index, values, nbins, std)
+
+    if not std:
+        return count, mean, None
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.where(count > ddof,
+                       np.sqrt(np.maximum(m2, 0.) / (count - ddof)), np.nan)
+
+    return count, mean, std
+
+
+#%%
+def _grid_profiles_pandas(df, time, pressure, keep):
+    '''
+    grid_profiles() with pandas and xarray (the reference).
+    '''
+
+    # set time and pressure columns as index
+    df = df.set_index([time, pressure])
+
+    # there are duplicate indices, we only keep the first occurence
+    df = df.loc[~df.index.duplicated(keep='first')]
+
+    # convert DataFrame to xarray Dataset
+    ds = df.to_xarray().rename({time: 'time'})
+
+    if keep is not None:
+        ds = ds.where(keep(ds[pressure]), drop=True)
+
+    return ds
+
+
+#%%
+def grid_profiles(df, time='time_string', pressure='pressure', keep=None,
+                  backend=None):
+    '''
+    Grid profiles onto a (time, pressure) grid. The first row of duplicate
+    (time, pressure) pairs is used.
+
+    Input:
+    - df: pandas.DataFrame() with time and pressure columns
+    - (optional) time, pressure: names of the time and pressure columns
+    - (optional) keep: function which returns a boolean array of the
+      pressure levels to keep (default: all levels in the data)
+    - (optional) backend: 'numba', 'numpy' or 'pandas' (default: BACKEND)
+
+    Output:
+    - ds: xarray.Dataset() with dimensions (time, pressure) and one float
+      variable per other column
+    '''
+
+    import xarray as xr
+
+    if backend == 'pandas':
+        return _grid_profiles_pandas(df, time, pressure, keep)
+
+    backend = _backend(backend)
+
+    columns = [c for c in df.columns if c not in (time, pressure)]
+
+    import pandas as pd
+
+    # all times are kept, the pressure levels are filtered
+    row, times = pd.factorize(df[time].values, sort=True)
+
+    col, levels = pd.factorize(df[pressure].values.astype(float), sort=True)
+    if keep is not None:
+        kept = np.asarray(keep(levels), dtype=bool)
+        levels = levels[kept]
+
+        # column of the kept levels, -1 for the others (and for NaN)
+        remap = np.where(kept, np.cumsum(kept) - 1, -1)
+        col = np.where(col >= 0, remap[col], -1)
+
+    grid = scatter_first(row, col, df[columns].to_numpy(dtype=float),
+                         (times.size, levels.size), backend=backend)
+
+    data = {c: (('time', pressure), grid[:, :, ii])
+            for ii, c in enumerate(columns)}
+
+    return xr.Dataset(data, coords={'time': times, pressure: levels})
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+""" Matchups of glider measurements with satellite SST
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Pairs each near-surface glider sample with the OISST sea surface temperature
+at the same time and place. The SST cube is interpolated trilinearly in
+(time, lat, lon) for all samples at once: the fractional grid indices of the
+samples are computed with NumPy, and the eight surrounding grid values are
+gathered with fancy indexing, so there is no loop over points and no
+per-point .sel().
+
+    from pipeline import matchup
+
+    df = tutorial_05.get_glider_data(ID)
+    sst = tutorial_05.get_oisst(df.index)
+    table = matchup.glider_sst_matchup(df, sst)
+    print(matchup.summary(table))
+"""
+
+#%% Import all packages which we will need
+import numpy as np
+import pandas as pd
+
+# time step (in ns) and resolution (in degrees) of the daily OISST fields
+OISST_STEP = 86400 * 10**9
+OISST_RES = .25
+
+
+#%%
+def fractional_index(coord, values, step=None):
+    '''
+    Return the fractional index of values on a monotonic coordinate axis,
+    e.g. 2.25 for a value a quarter of the way between coord[2] and coord[3].
+    Values up to half a step beyond the ends of the axis get the index of the
+    nearest end (e.g. samples before noon of a daily field), values further
+    outside get NaN.
+
+    Input:
+    - coord: 1D array with increasing or decreasing coordinate values
+    - values: array with values
+    - (optional) step: grid spacing (default: spacing of coord at each end,
+      which is unknown for axes of length 1)
+
+    Output:
+    - idx: array with fractional indices (same shape as values)
+    '''
+
+    coord = np.asarray(coord, dtype=float)
+    values = np.asarray(values, dtype=float)
+    index = np.arange(coord.size, dtype=float)
+
+    # np.interp needs increasing coordinates
+    if coord.size > 1 and coord[0] > coord[-1]:
+        coord = coord[::-1]
+        index = index[::-1]
+
+    idx = np.interp(values, coord, index, left=np.nan, right=np.nan)
+
+    # half a step at the lower and upper end of the axis
+    if step is not None:
+        half = (abs(step) / 2.,) * 2
+    elif coord.size > 1:
+        half = ((coord[1] - coord[0]) / 2., (coord[-1] - coord[-2]) / 2.)
+    else:
+        half = (0., 0.)
+
+    with np.errstate(invalid='ignore'):
+        idx[(values < coord[0]) & (values >= coord[0] - half[0])] = index[0]
+        idx[(values > coord[-1]) & (values <= coord[-1] + half[1])] = \
+            index[-1]
+
+    return idx
+
+
+#%%
+def interp_trilinear(cube, it, ilat, ilon):
+    '''
+    Trilinear interpolation of a 3D array at fractional indices. Grid values
+    which are NaN (e.g. land) are left out and the weights of the remaining
+    corners are renormalized.
+
+    Input:
+    - cube: 3D array (time, lat, lon)
+    - it, ilat, ilon: 1D arrays with fractional indices (NaN = outside)
+
+    Output:
+    - values: 1D array with interpolated values
+    '''
+
+    frac = [it, ilat, ilon]
+    lower = []
+    weight = []
+
+    for idx, n in zip(frac, cube.shape):
+
+        # lower corner index, limited so that the upper corner exists; for
+        # axes of length 1, both corners are the same point
+        i0 = np.clip(np.floor(np.nan_to_num(idx)), 0, max(n - 2, 0))
+        lower.append(i0.astype(np.intp))
+        weight.append(np.clip(np.nan_to_num(idx) - i0, 0., 1.))
+
+    total = np.zeros(it.size)
+    wsum = np.zeros(it.size)
+
+    for dt in (0, 1):
+        wt = weight[0] if dt else 1. - weight[0]
+        t = np.minimum(lower[0] + dt, cube.shape[0] - 1)
+        for dy in (0, 1):
+            wy = weight[1] if dy else 1. - weight[1]
+            y = np.minimum(lower[1] + dy, cube.shape[1] - 1)
+            for dx in (0, 1):
+                wx = weight[2] if dx else 1. - weight[2]
+                x = np.minimum(lower[2] + dx, cube.shape[2] - 1)
+
+                val = cube[t, y, x]
+                w = wt * wy * wx
+                valid = np.isfinite(val)
+                total += np.where(valid, w * val, 0.)
+                wsum += np.where(valid, w, 0.)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = total / wsum
+
+    # samples outside the grid or surrounded by missing values
+    outside = np.isnan(it) | np.isnan(ilat) | np.isnan(ilon) | (wsum == 0.)
+    values[outside] = np.nan
+
+    return values
+
+
+#%%
+def glider_sst_matchup(df, sst, z_lim=5., var='temperature', chunk=1000000):
+    '''
+    Interpolate SST to the time and position of all near-surface glider
+    samples and compute the differences.
+
+    Input:
+    - df: pandas.DataFrame() with glider data (time index, columns lat, lon,
+      depth and var) as returned by get_glider_data()
+    - sst: xr.DataArray with SST (time, lat, lon) as returned by get_oisst()
+    - (optional) z_lim: only use samples shallower than z_lim (in m)
+    - (optional) var: glider variable which is compared to SST
+    - (optional) chunk: number of samples interpolated at once (limits the
+      memory of the temporary arrays)
+
+    Output:
+    - table: pandas.DataFrame() with time, lat, lon, depth, glider, sst and
+      diff (glider - sst) of all near-surface samples
+    '''
+
+    surf = df.loc[df['depth'] < z_lim]
+
+    time = surf.index.values.astype('datetime64[ns]').astype(np.int64)
+    lat = surf['lat'].values.astype(float)
+    lon = surf['lon'].values.astype(float)
+
+    # OISST longitudes go from 0 to 360 degrees
+    lon360 = np.mod(lon, 360.)
+
+    # only load the part of the SST cube which is covered by the glider
+    sst = _subset(sst, lat, lon360)
+
+    tcoord = sst['time'].values.astype('datetime64[ns]').astype(np.int64)
+    cube = np.asarray(sst.transpose('time', 'lat', 'lon').values, dtype=float)
+
+    values = np.empty(time.size)
+
+    for i0 in range(0, time.size, chunk):
+        sl = slice(i0, i0 + chunk)
+        it = fractional_index(tcoord, time[sl], OISST_STEP)
+        ilat = fractional_index(sst['lat'].values, lat[sl], OISST_RES)
+        ilon = fractional_index(sst['lon'].values, lon360[sl], OISST_RES)
+        values[sl] = interp_trilinear(cube, it, ilat, ilon)
+
+    table = pd.DataFrame({'lat': lat,
+                          'lon': lon,
+                          'depth': surf['depth'].values,
+                          'glider': surf[var].values,
+                          'sst': values},
+                         index=surf.index)
+    table['diff'] = table['glider'] - table['sst']
+
+    return table
+
+
+#%%
+def summary(table):
+    '''
+    Summary statistics of a matchup table.
+
+    Input:
+    - table: output of glider_sst_matchup()
+
+    Output:
+    - stats: pandas.Series() with number of matchups, bias (mean difference),
+      standard deviation and RMS of the differences, median absolute
+      difference and correlation between glider and SST
+    '''
+
+    valid = table.dropna(subset=['glider', 'sst'])
+    diff = valid['diff'].values
+
+    if diff.size == 0:
+        return pd.Series({'n': 0, 'bias': np.nan, 'std': np.nan,
+                          'rmse': np.nan, 'mad': np.nan, 'r': np.nan})
+
+    return pd.Series({'n': diff.size,
+                      'bias': diff.mean(),
+                      'std': diff.std(ddof=1) if diff.size > 1 else np.nan,
+                      'rmse': np.sqrt(np.mean(diff ** 2)),
+                      'mad': np.median(np.abs(diff)),
+                      'r': valid['glider'].corr(valid['sst'])})
+
+
+#%%
+def _subset(sst, lat, lon360):
+    '''
+    Select the part of the SST grid which covers the glider positions (plus
+    one grid cell on each side).
+    '''
+
+    if lat.size == 0:
+        return sst
+
+    isel = {}
+    for dim, vals in (('lat', lat), ('lon', lon360)):
+        idx = fractional_index(sst[dim].values, vals)
+        if np.all(np.isnan(idx)):
+            continue
+        i0 = max(int(np.floor(np.nanmin(idx))) - 1, 0)
+        i1 = min(int(np.ceil(np.nanmax(idx))) + 2, sst[dim].size)
+        isel[dim] = slice(i0, i1)
+
+    return sst.isel(**isel)
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+""" Quality control flags for glider and CTD data
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Instead of dropping every row in which one sensor is missing (df.dropna()),
+each value gets a quality flag. The flags follow the IOOS QARTOD convention
+and are stored as uint8:
+
+    1 = pass, 2 = not evaluated, 3 = suspect, 4 = fail, 9 = missing
+
+The tests (range, spike, gradient, stuck value and density inversion) compare
+each value with its neighbours using shifted copies of the whole column, so a
+mission with millions of rows is flagged in a single pass without loops.
+Neighbours in different profiles (or casts) are not compared.
+
+    from pipeline import qc
+
+    flags = qc.flag_dataframe(df, qc.GLIDER_TESTS, group='profile_id')
+    df = df.join(flags)                 # temperature_qc, salinity_qc, ...
+    clean = qc.mask(df, flags)          # failed values set to NaN
+
+Gridded data sets (the BBMP NetCDF file) keep the flags as uint8 variables
+<variable>_qc next to the data, and the reader masks them:
+
+    ds = qc.mask_dataset(xr.open_dataset(fname))
+"""
+
+#%% Import all packages which we will need
+import numpy as np
+import pandas as pd
+
+# quality flags (IOOS QARTOD)
+FLAG_PASS = 1
+FLAG_NOT_EVALUATED = 2
+FLAG_SUSPECT = 3
+FLAG_FAIL = 4
+FLAG_MISSING = 9
+
+# CF attributes of the flag variables
+FLAG_ATTRS = {'flag_values': np.array([FLAG_PASS, FLAG_NOT_EVALUATED,
+                                       FLAG_SUSPECT, FLAG_FAIL, FLAG_MISSING],
+                                      dtype=np.uint8),
+              'flag_meanings': 'pass not_evaluated suspect fail missing',
+              'standard_name': 'quality_flag'}
+
+# tests and thresholds per variable:
+# - range: (fail span, suspect span)
+# - spike, gradient: (suspect, fail) thresholds (Argo definitions)
+# - stuck: (suspect, fail) number of consecutive identical values
+# - inversion: (suspect, fail) decrease of density with depth in kg m-3
+GLIDER_TESTS = {
+    'temperature': {'range': ((-2.5, 40.), (-2., 30.)),
+                    'spike': (3., 6.), 'gradient': (4.5, 9.),
+                    'stuck': (20, 60)},
+    'salinity': {'range': ((2., 41.), (25., 37.)),
+                 'spike': (.45, .9), 'gradient': (.75, 1.5),
+                 'stuck': (20, 60)},
+    'conductivity': {'range': ((0., 7.), (2., 6.)),
+                     'stuck': (20, 60)},
+    'density': {'range': ((1000., 1040.), (1015., 1030.)),
+                'inversion': (.03, .1)},
+}
+
+BBMP_TESTS = {
+    'temperature': {'range': ((-2.5, 30.), (-2., 25.)),
+                    'spike': (3., 6.), 'gradient': (4.5, 9.)},
+    'salinity': {'range': ((2., 36.), (20., 33.)),
+                 'spike': (.45, .9), 'gradient': (.75, 1.5)},
+    'sigmaTheta': {'range': ((0., 30.), (15., 27.)),
+                   'inversion': (.03, .1)},
+    'oxygen': {'range': ((0., 15.), (0., 12.))},
+}
+
+
+#%%
+def _neighbours(x, group=None):
+    '''
+    Return the previous and next values of x (NaN at the ends and across
+    group boundaries).
+    '''
+
+    prev = np.full(x.shape, np.nan)
+    nxt = np.full(x.shape, np.nan)
+    prev[1:] = x[:-1]
+    nxt[:-1] = x[1:]
+
+    if group is not None:
+        change = group[1:] != group[:-1]
+        prev[1:][change] = np.nan
+        nxt[:-1][change] = np.nan
+
+    return prev, nxt
+
+
+#%%
+def _threshold_flags(value, suspect, fail):
+    '''
+    Flags of a test statistic: pass, suspect above suspect, fail above fail,
+    not evaluated where the statistic is NaN.
+    '''
+
+    flags = np.full(value.shape, FLAG_PASS, dtype=np.uint8)
+
+    with np.errstate(invalid='ignore'):
+        if suspect is not None:
+            flags[value > suspect] = FLAG_SUSPECT
+        if fail is not None:
+            flags[value > fail] = FLAG_FAIL
+
+    flags[np.isnan(value)] = FLAG_NOT_EVALUATED
+
+    return flags
+
+
+#%%
+def range_test(x, fail_span, suspect_span=None):
+    '''
+    Flag values outside the valid (fail) or expected (suspect) range.
+
+    Input:
+    - x: 1D array with data
+    - fail_span: (min, max) of valid values
+    - (optional) suspect_span: (min, max) of expected values
+
+    Output:
+    - flags: uint8 array
+    '''
+
+    flags = np.full(x.shape, FLAG_PASS, dtype=np.uint8)
+
+    with np.errstate(invalid='ignore'):
+        if suspect_span is not None:
+            flags[(x < suspect_span[0]) | (x > suspect_span[1])] = FLAG_SUSPECT
+        flags[(x < fail_span[0]) | (x > fail_span[1])] = FLAG_FAIL
+
+    flags[np.isnan(x)] = FLAG_MISSING
+
+    return flags
+
+
+#%%
+def spike_test(x, suspect, fail, group=None):
+    '''
+    Argo spike test: |V2 - (V3 + V1) / 2| - |(V3 - V1) / 2| compared with the
+    thresholds, where V1 and V3 are the neighbours of V2.
+    '''
+
+    prev, nxt = _neighbours(x, group)
+    value = np.abs(x - (nxt + prev) / 2.) - np.abs((nxt - prev) / 2.)
+
+    return _threshold_flags(value, suspect, fail)
+
+
+#%%
+def gradient_test(x, suspect, fail, group=None):
+    '''
+    Argo gradient test: |V2 - (V3 + V1) / 2| compared with the thresholds.
+    '''
+
+    prev, nxt = _neighbours(x, group)
+    value = np.abs(x - (nxt + prev) / 2.)
+
+    return _threshold_flags(value, suspect, fail)
+
+
+#%%
+def stuck_test(x, suspect, fail, tol=0., group=None):
+    '''
+    Flag runs of (nearly) identical consecutive values (flat line test).
+
+    Input:
+    - x: 1D array with data
+    - suspect, fail: minimum length of a run to be suspect or to fail
+    - (optional) tol: largest difference of values which count as identical
+    - (optional) group: array with profile IDs (runs end at new profiles)
+    '''
+
+    same = np.zeros(x.shape, dtype=bool)
+    with np.errstate(invalid='ignore'):
+        same[1:] = np.abs(np.diff(x)) <= tol
+    if group is not None:
+        same[1:] &= group[1:] == group[:-1]
+
+    # label the runs and look up the length of the run of each value
+    run = np.cumsum(~same)
+    length = np.bincount(run)[run]
+
+    flags = np.full(x.shape, FLAG_PASS, dtype=np.uint8)
+    flags[length >= suspect] = FLAG_SUSPECT
+    flags[length >= fail] = FLAG_FAIL
+    flags[np.isnan(x)] = FLAG_NOT_EVALUATED
+
+    return flags
+
+
+#%%
+def density_inversion_test(rho, z, suspect, fail, group=None):
+    '''
+    Flag values where the density decreases with depth compared with the
+    previous value (for descending and ascending profiles).
+
+    Input:
+    - rho: 1D array with (potential) density
+    - z: 1D array with depth or pressure
+    - suspect, fail: thresholds of the density decrease in kg m-3
+    - (optional) group: array with profile IDs
+    '''
+
+    prev_rho = _neighbours(rho, group)[0]
+    prev_z = _neighbours(z, group)[0]
+
+    # decrease of density in the direction of increasing depth
+    value = -(rho - prev_rho) * np.sign(z - prev_z)
+
+    # only steps with a change in depth can be evaluated
+    value[z == prev_z] = np.nan
+
+    return _threshold_flags(value, suspect, fail)
+
+
+#%%
+def aggregate(flags):
+    '''
+    Combine the flags of several tests: missing if the value is missing,
+    otherwise the worst of fail, suspect and pass (not evaluated if no test
+    could be evaluated).
+
+    Input:
+    - flags: list of uint8 arrays
+
+    Output:
+    - flag: uint8 array
+    '''
+
+    stack = np.stack(flags)
+
+    result = np.full(stack.shape[1:], FLAG_NOT_EVALUATED, dtype=np.uint8)
+    for flag in (FLAG_PASS, FLAG_SUSPECT, FLAG_FAIL, FLAG_MISSING):
+        result[(stack == flag).any(axis=0)] = flag
+
+    return result
+
+
+#%%
+def flag_dataframe(df, tests, group=None, depth='depth'):
+    '''
+    Run the QC tests on all variables of a DataFrame.
+
+    Input:
+    - df: pandas.DataFrame() with data ordered by time (or by depth per cast)
+    - tests: dictionary variable -> tests (see GLIDER_TESTS)
+    - (optional) group: column with profile or cast IDs
+    - (optional) depth: column with depth or pressure (density inversion)
+
+    Output:
+    - flags: pandas.DataFrame() with one uint8 column <variable>_qc for each
+      tested variable
+    '''
+
+    grp = None
+    if group in df:
+        grp = df[group].values
+    elif group is not None:
+        grp = df.index.get_level_values(group).values
+
+    flags = {}
+
+    for vname, vtests in tests.items():
+
+        if vname not in df:
+            continue
+
+        x = df[vname].values.astype(float)
+        results = []
+
+        if 'range' in vtests:
+            results.append(range_test(x, *vtests['range']))
+        if 'spike' in vtests:
+            results.append(spike_test(x, *vtests['spike'], group=grp))
+        if 'gradient' in vtests:
+            results.append(gradient_test(x, *vtests['gradient'], group=grp))
+        if 'stuck' in vtests:
+            results.append(stuck_test(x, *vtests['stuck'], group=grp))
+        if 'inversion' in vtests and depth in df:
+            z = df[depth].values.astype(float)
+            results.append(density_inversion_test(x, z, *vtests['inversion'],
+                                                  group=grp))
+
+        # missing values are flagged even if no test applies
+        results.append(np.where(np.isnan(x), FLAG_MISSING,
+                                FLAG_NOT_EVALUATED).astype(np.uint8))
+
+        flags[vname + '_qc'] = aggregate(results)
+
+    return pd.DataFrame(flags, index=df.index)
+
+
+#%%
+def mask(df, flags, worst=FLAG_SUSPECT):
+    '''
+    Return a copy of df in which the values with flags worse than worst are
+    replaced by NaN (e.g. worst=FLAG_PASS only keeps values which passed
+    or were not evaluated).
+
+    Input:
+    - df: pandas.DataFrame() with data
+    - flags: pandas.DataFrame() with <variable>_qc columns
+    - (optional) worst: worst flag which is kept
+    '''
+
+    df = df.copy()
+
+    for col in flags.columns:
+        vname = col[:-3]
+        if vname not in df:
+            continue
+        flag = flags[col].values
+        bad = (flag > worst) & (flag != FLAG_NOT_EVALUATED)
+        df.loc[bad, vname] = np.nan
+
+    return df
+
+
+#%%
+def mask_dataset(ds, worst=FLAG_SUSPECT):
+    '''
+    Return a copy of an xarray.Dataset() in which the values with flags
+    worse than worst are replaced by NaN (see mask()). The <variable>_qc
+    variables are dropped; a Dataset without flags is returned as it is.
+
+    Input:
+    - ds: xarray.Dataset() with data and <variable>_qc variables
+    - (optional) worst: worst flag which is kept
+    '''
+
+    columns = [v for v in ds.data_vars
+               if v.endswith('_qc') and v[:-3] in ds.data_vars]
+    if not columns:
+        return ds
+
+    ds = ds.copy()
+
+    for col in columns:
+        vname = col[:-3]
+        flag = ds[col]
+        bad = (flag > worst) & (flag != FLAG_NOT_EVALUATED)
+        attrs = dict(ds[vname].attrs)
+        attrs.pop('ancillary_variables', None)
+        attrs['qc_mask'] = 'values with {0} > {1} set to NaN'.format(col,
+                                                                   worst)
+        ds[vname] = ds[vname].where(~bad)
+        ds[vname].attrs = attrs
+
+    return ds.drop_vars(columns)
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+""" Embedded SQL database of the BBMP and glider holdings
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Loads the gridded BBMP data (NetCDF) and glider data (HDF5 stores or CSV
+files) into one SQLite database in long format, one row per measurement:
+
+    observations(source, time, year, month, depth, variable, value)
+
+Times are stored as seconds since 1970 (and as year and month, so selections
+by year or month can use an index) and depths in m (BBMP pressure in dbar is
+used as depth). The view 'obs' shows the time as text, so ad-hoc questions
+can be answered in SQL without loading a data set into pandas first:
+
+    from pipeline import query
+
+    db = query.Holdings('data/holdings.sqlite')
+    db.add_bbmp('data/raw/bedford_basin_monitoring_program.nc')
+    db.add_glider('data/raw/otn200_20151027_53_delayed.h5')
+
+    # mean salinity below 50 dbar by year
+    db.query("SELECT year, AVG(value) AS salinity FROM obs "
+             "WHERE source = 'bbmp' AND variable = 'salinity' AND depth > 50 "
+             "GROUP BY year")
+
+The data files are read and inserted in blocks (the rows of a block are
+built with NumPy), and the queries run inside SQLite on the database file, so
+neither needs to fit into memory.
+"""
+
+#%% Import all packages which we will need
+import itertools
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from pipeline import instrument, qc
+
+# default database file (relative to the working directory)
+HOLDINGS_DB = 'data/holdings.sqlite'
+
+# glider columns which are not variables
+GLIDER_COORDS = ['time', 'depth', 'lat', 'lon', 'latitude', 'longitude',
+                 'profile_id']
+
+# index for selections by source and variable (and year, month and time);
+# it is dropped while the first source is loaded, which is faster than
+# updating it row by row
+INDEX = '''
+CREATE INDEX IF NOT EXISTS obs_source_variable
+    ON observations (source, variable, year, month, time);
+'''
+
+COLUMNS = ['source', 'time', 'year', 'month', 'depth', 'variable', 'value']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS observations (
+    source TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    depth REAL,
+    variable TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE VIEW IF NOT EXISTS obs AS
+    SELECT source, datetime(time, 'unixepoch') AS time, year, month,
+           depth, variable, value
+    FROM observations;
+'''
+
+
+#%%
+def to_long(df, source, variables, depth='depth'):
+    '''
+    Convert a block of data in wide format (time index, one column per
+    variable) into rows of the observations table. The columns of the rows
+    are computed with NumPy for all values at once.
+
+    Input:
+    - df: pandas.DataFrame() with DatetimeIndex
+    - source: name of the data source
+    - variables: list of columns which are stored
+    - (optional) depth: column with the depth
+
+    Output:
+    - rows: list of tuples (source, time, year, month, depth, variable,
+      value)
+    '''
+
+    time = df.index.values.astype('datetime64[s]')
+    seconds = time.astype(np.int64)
+    year = time.astype('datetime64[Y]').astype(np.int64) + 1970
+    month = time.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    depths = df[depth].to_numpy(dtype=float)
+
+    # finite values, variable by variable
+    values = df[list(variables)].to_numpy(dtype=float).T
+    ivar, irow = np.nonzero(np.isfinite(values))
+
+    names = np.asarray(variables, dtype=object)[ivar]
+
+    return list(zip(itertools.repeat(source, ivar.size),
+                    seconds[irow].tolist(), year[irow].tolist(),
+                    month[irow].tolist(), depths[irow].tolist(),
+                    names.tolist(), values[ivar, irow].tolist()))
+
+
+#%%
+class Holdings(object):
+    '''
+    SQLite database with all observations in long format.
+
+    Input:
+    - (optional) dbfile: name of database file (created if needed)
+    '''
+
+    def __init__(self, dbfile=HOLDINGS_DB):
+
+        outdir = os.path.dirname(dbfile)
+        if outdir and not os.path.isdir(outdir):
+            os.makedirs(outdir)
+
+        self.dbfile = dbfile
+        self.con = sqlite3.connect(dbfile)
+        self.con.executescript(SCHEMA + INDEX)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.con.close()
+
+    def _load(self, source, blocks):
+        '''
+        Replace the observations of a source by the rows of blocks (an
+        iterable of lists of rows) in a single transaction. The index is only
+        rebuilt if there are no observations of other sources, which would be
+        indexed again.
+        '''
+
+        nrows = 0
+        insert = 'INSERT INTO observations ({0}) VALUES ({1})'.format(
+            ', '.join(COLUMNS), ', '.join('?' * len(COLUMNS)))
+
+        with instrument.stage('query.load.{}'.format(source)), self.con:
+
+            others = self.con.execute(
+                'SELECT 1 FROM observations WHERE source != ? LIMIT 1',
+                (source,)).fetchone() is not None
+            if not others:
+                self.con.execute('DROP INDEX IF EXISTS obs_source_variable')
+
+            self.con.execute('DELETE FROM observations WHERE source = ?',
+                             (source,))
+            for rows in blocks:
+                self.con.executemany(insert, rows)
+                nrows += len(rows)
+
+            if not others:
+                self.con.execute(INDEX)
+
+        return nrows
+
+    def add_bbmp(self, fname, source='bbmp', block=200):
+        '''
+        Load the gridded BBMP data (NetCDF file written by grid_bbmp_data).
+
+        Input:
+        - fname: name of NetCDF file
+        - (optional) source: name of the data source
+        - (optional) block: number of casts read at once
+
+        Output:
+        - nrows: number of loaded observations
+        '''
+
+        import xarray as xr
+
+        def blocks(ds):
+            ds = qc.mask_dataset(ds)
+            variables = [v for v in ds.data_vars
+                         if ds[v].dims == ('time', 'pressure')]
+            for i0 in range(0, ds['time'].size, block):
+                df = (ds[variables].isel(time=slice(i0, i0 + block))
+                      .to_dataframe().reset_index('pressure'))
+                yield to_long(df, source, variables, depth='pressure')
+
+        with xr.open_dataset(fname) as ds:
+            return self._load(source, blocks(ds))
+
+    def add_glider(self, fname, source=None, block=100000):
+        '''
+        Load glider data from an HDF5 store (written by get_glider_data or
+        tutorial_02) or a CSV file with a time column.
+
+        Input:
+        - fname: name of *.h5 or *.csv file
+        - (optional) source: name of the data source (default: file name
+          without suffix)
+        - (optional) block: number of rows read at once
+
+        Output:
+        - nrows: number of loaded observations
+        '''
+
+        if source is None:
+            source = os.path.splitext(os.path.basename(fname))[0]
+
+        def convert(df):
+            if 'time' in df.columns:
+                df = df.set_index(pd.to_datetime(df['time']))
+            variables = [c for c in df.columns if c not in GLIDER_COORDS
+                         and not c.endswith('_qc')
+                         and pd.api.types.is_numeric_dtype(df[c])]
+            return to_long(df, source, variables)
+
+        if fname.endswith('.h5'):
+            with pd.HDFStore(fname, 'r') as store:
+                key = store.keys()[0]
+                storer = store.get_storer(key)
+                nrows = storer.nrows if storer.is_table else storer.shape[0]
+                blocks = (convert(store.select(key, start=i0,
+                                               stop=i0 + block))
+                          for i0 in range(0, nrows, block))
+                return self._load(source, blocks)
+
+        blocks = (convert(df) for df in pd.read_csv(fname, chunksize=block))
+
+        return self._load(source, blocks)
+
+    def sources(self):
+        '''
+        Return the number of observations and the time range of each source.
+        '''
+
+        return self.query('SELECT source, COUNT(*) AS n, '
+                          "datetime(MIN(time), 'unixepoch') AS start, "
+                          "datetime(MAX(time), 'unixepoch') AS stop "
+                          'FROM observations GROUP BY source')
+
+    def query(self, sql, params=()):
+        '''
+        Run an SQL query and return the result as pandas.DataFrame().
+        '''
+
+        return pd.read_sql_query(sql, self.con, params=params)
+
+    def iterquery(self, sql, params=(), chunksize=100000):
+        '''
+        Run an SQL query and return an iterator over blocks of the result
+        (for results which are too large for memory).
+        '''
+
+        return pd.read_sql_query(sql, self.con, params=params,
+                                 chunksize=chunksize)
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+""" Realtime tail-follow of glider deployments on ERDDAP
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+get_glider_data() downloads a deployment once. Realtime deployments (e.g.
+Fundy_20180913_89_realtime) keep growing while the glider is at sea, so this
+module polls ERDDAP for the rows after the last time which was ingested:
+
+    <ERDDAP_URL>/<ID>.csvp?time,depth,...&time>2018-09-20T11:42:05Z
+
+and appends them to the HDF5 store data/raw/<ID>.h5 (see gliderstore.py), so
+each poll costs O(new rows) for the transfer, parsing, QC and writing. The QC
+tests compare neighbouring values, so the rows of the last stored profile are
+flagged again together with the new rows (and rewritten), which gives the
+same flags as a download of the full deployment. The last ingested time is the
+time of the last row in the store, so the state cannot get out of sync with
+the data. Only the figures of deployments which received
+new rows are rendered again (the animate:<ID> tasks of tasks.py, whose state
+is shared with 'python -m pipeline run').
+
+    python -m pipeline follow --id Fundy_20180913_89_realtime --interval 600
+
+For testing, standins.serve_erddap() and standins.GrowingDeployment() imitate
+an ERDDAP server with a growing deployment.
+"""
+
+#%% Import all packages which we will need
+import io
+import os
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from pipeline import add_tutorial_paths, fetch, gliderstore, instrument
+
+
+#%%
+def glider_store(ID):
+    '''
+    Return the name of the HDF5 store of a glider deployment.
+    '''
+    return 'data/raw/{}.h5'.format(ID)
+
+
+#%%
+def since_url(ID, since=None, base_url=fetch.ERDDAP_URL):
+    '''
+    Return the URL of the *.csvp data of a deployment after a given time.
+
+    Input:
+    - ID: deployment ID
+    - (optional) since: pandas.Timestamp() of the last ingested row (default:
+      all data)
+    - (optional) base_url: URL of ERDDAP tabledap server
+    '''
+
+    url = fetch.glider_url(ID, base_url)
+
+    if since is not None:
+        constraint = 'time>' + since.strftime('%Y-%m-%dT%H:%M:%SZ')
+        url += '&' + urllib.parse.quote(constraint)
+
+    return url
+
+
+#%%
+def fetch_new_rows(ID, since=None, base_url=fetch.ERDDAP_URL):
+    '''
+    Download and clean the rows of a deployment after a given time.
+
+    Output:
+    - df: pandas.DataFrame() as returned by get_glider_data() (None if there
+      are no new rows)
+    '''
+
+    add_tutorial_paths()
+    import tutorial_05
+
+    url = since_url(ID, since, base_url)
+
+    with instrument.stage('realtime.transfer.{}'.format(ID)) as st:
+        try:
+            with urllib.request.urlopen(url) as src:
+                data = src.read()
+        except urllib.error.HTTPError as err:
+            # ERDDAP answers 404 if the query has no matching rows
+            if err.code == 404:
+                return None
+            raise
+        st.add_bytes(len(data))
+
+    df = tutorial_05.read_glider_csv(io.BytesIO(data))
+
+    # the server compares whole seconds, never ingest a row twice
+    if since is not None:
+        df = df.loc[df.index > since]
+
+    return df if len(df) else None
+
+
+#%%
+def append_rows(df, outfile, replace=False):
+    '''
+    Append rows to the HDF5 store of a deployment (see gliderstore.py). With
+    replace, the stored rows from the first time of df on are replaced.
+    '''
+
+    with instrument.stage('realtime.append_hdf') as st:
+        if replace:
+            gliderstore.replace_tail(df, outfile)
+        else:
+            gliderstore.append_store(df, outfile)
+        st.add_bytes(df.memory_usage().sum())
+
+
+#%%
+def reflag(tail, df):
+    '''
+    Flag new rows again together with the stored rows of the last profile.
+    The spike, gradient, stuck and density inversion tests compare values
+    with their neighbours in the same profile, so the flags of the rows at
+    the end of a poll change with the rows of the next poll.
+
+    Input:
+    - tail: pandas.DataFrame() with the stored rows of the last profile (see
+      gliderstore.last_profile)
+    - df: pandas.DataFrame() with new rows
+
+    Output:
+    - df: pandas.DataFrame() with the rows of tail and df, flagged as if they
+      had been downloaded at once
+    '''
+
+    import pandas as pd
+
+    from pipeline import qc
+
+    df = pd.concat([tail, df[tail.columns]])
+
+    data = df[[c for c in df if not c.endswith('_qc')]]
+    flags = qc.flag_dataframe(data, qc.GLIDER_TESTS, group='profile_id')
+    df[flags.columns] = flags
+
+    return df
+
+
+#%%
+def poll(ID, base_url=fetch.ERDDAP_URL, outfile=None):
+    '''
+    Ingest the new rows of a deployment since the last poll.
+
+    Input:
+    - ID: deployment ID
+    - (optional) base_url: URL of ERDDAP tabledap server
+    - (optional) outfile: name of the HDF5 store (default: data/raw/<ID>.h5)
+
+    Output:
+    - nrows: number of new rows
+    '''
+
+    outfile = outfile or glider_store(ID)
+
+    df = fetch_new_rows(ID, gliderstore.last_time(outfile), base_url)
+    if df is None:
+        return 0
+
+    nrows = len(df)
+
+    # the last stored profile is flagged again with the new rows
+    tail = gliderstore.last_profile(outfile)
+    if tail is not None:
+        df = reflag(tail, df)
+
+    append_rows(df, outfile, replace=tail is not None)
+
+    return nrows
+
+
+#%%
+def render_graph(deployments):
+    '''
+    Task graph with the figures of the given deployments (see tasks.py). The
+    tasks only depend on the HDF5 stores, so the download and conversion of
+    the full deployment are not part of it. The OISST data depend on the
+    days of the outward leg (dates:<ID>), so they are only downloaded again
+    when the leg reaches a new day. The animation is rendered again in full
+    (all frames) after each poll with new rows.
+    '''
+
+    from pipeline import tasks
+    from pipeline.taskgraph import Task, TaskGraph
+
+    graph = TaskGraph()
+
+    for ID in deployments:
+        h5 = glider_store(ID)
+        days = 'data/raw/{}_outward_dates.txt'.format(ID)
+        sst = 'data/raw/oisst_{}_outward.nc'.format(ID)
+        mp4 = os.path.join('animations', '{}.mp4'.format(ID))
+        graph.add(Task('dates:' + ID, tasks.leg_dates, [h5], [days],
+                       args=(h5, days)))
+        graph.add(Task('oisst:' + ID, tasks.fetch_oisst, [days], [sst],
+                       args=(days, sst)))
+        graph.add(Task('animate:' + ID, tasks.animate_glider, [h5, sst],
+                       [mp4], args=(ID,)))
+
+    return graph
+
+
+#%%
+def follow(deployments, base_url=fetch.ERDDAP_URL, interval=600., count=None,
+           render=True, jobs=1):
+    '''
+    Poll ERDDAP for new rows of realtime deployments and render the figures
+    of the deployments which received new rows.
+
+    Input:
+    - deployments: list of deployment IDs
+    - (optional) base_url: URL of ERDDAP tabledap server
+    - (optional) interval: time between polls in seconds
+    - (optional) count: number of polls (default: poll forever)
+    - (optional) render: render the figures after each poll
+    - (optional) jobs: number of parallel worker processes for the figures
+
+    Output:
+    - total: dictionary deployment ID -> number of ingested rows
+    '''
+
+    # the stages of each poll are recorded, keep only the latest ones
+    instrument.limit(instrument.KEEP_STAGES)
+
+    total = dict.fromkeys(deployments, 0)
+    npoll = 0
+
+    # deployments whose figures have to be rendered (again, if rendering
+    # failed in an earlier poll)
+    outdated = []
+
+    while True:
+
+        t0 = time.perf_counter()
+
+        # a failed transfer (e.g. ERDDAP answers 503) is tried again at the
+        # next poll, the other deployments are polled anyway
+        for ID in deployments:
+            try:
+                nrows = poll(ID, base_url)
+            except fetch.TRANSFER_ERRORS as err:
+                print('follow: {0} ({1}), retry at next poll'.format(ID, err),
+                      file=sys.stderr)
+                continue
+            total[ID] += nrows
+            print('{0:40s} {1:8d} new rows'.format(ID, nrows))
+            if nrows and ID not in outdated:
+                outdated.append(ID)
+
+        if render and outdated:
+            try:
+                render_graph(outdated).run(jobs=jobs)
+            except fetch.TRANSFER_ERRORS as err:
+                print('follow: rendering failed ({}), retry at next poll'
+                      .format(err), file=sys.stderr)
+            else:
+                outdated = []
+
+        npoll += 1
+        if count is not None and npoll >= count:
+            return total
+
+        time.sleep(max(interval - (time.perf_counter() - t0), 0.))
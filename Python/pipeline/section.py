@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+""" Along-track sections of glider data
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Python counterpart of glider_to_section() and plot_section() of the R
+tutorials (R/tutorial_05/src/glider_functions.R). Instead of scattering the
+samples against time, the data are binned into a (distance, depth) grid:
+
+- the along-track distance is the cumulative great circle distance between
+  the mean positions of the dives and climbs (see segment.py), interpolated
+  to all samples,
+- all samples are sorted into the bins in one pass per variable (see
+  kernels.binned_stats()), no loop over profiles,
+- the section is saved as NetCDF file keyed by deployment and bin sizes
+  (data/processed/<ID>_section_<dx>km_<dz>m.nc), so plotting it again only
+  reads the file. The file is built again when the glider store is newer.
+
+    from pipeline import section
+
+    ds = section.get_section('otn200_20151027_53_delayed', dx=2., dz=1.)
+    section.plot_section(ds, 'temperature', 'figures/section.png')
+"""
+
+#%% Import all packages which we will need
+import os
+
+import numpy as np
+import pandas as pd
+
+from pipeline import instrument, kernels, qc, segment
+
+# directory of the section files
+SECTION_DIR = 'data/processed'
+
+# bin sizes: distance in km and depth in m
+DISTANCE_BIN = 2.
+DEPTH_BIN = 1.
+
+# variables of the section
+VARIABLES = ['temperature', 'salinity', 'density']
+
+# colour maps of the variables (cmocean)
+CMAPS = {'temperature': 'thermal', 'salinity': 'haline', 'density': 'dense'}
+
+
+#%%
+def along_track_distance(df, offsets=None, lon='lon', lat='lat'):
+    '''
+    Cumulative along-track distance of each sample in km.
+
+    Input:
+    - df: pandas.DataFrame() with glider data (sorted by time)
+    - (optional) offsets: offsets table of segment.profiles() (computed if
+      not given)
+    - (optional) lon, lat: columns with the position
+
+    Output:
+    - distance: 1D array with the distance from the first profile
+    '''
+
+    if offsets is None:
+        offsets = segment.profiles(df)
+
+    # distance between the mean positions of consecutive profiles
+    x, y = segment.positions(df, offsets, lon, lat)
+    step = segment.haversine(x[:-1], y[:-1], x[1:], y[1:])
+    cumulative = np.concatenate([[0.], np.cumsum(step)])
+
+    # interpolate to the samples between the centres of the profiles
+    centre = (offsets['start'].values + offsets['stop'].values - 1) / 2.
+
+    return np.interp(np.arange(len(df)), centre, cumulative)
+
+
+#%%
+def _bin_means(index, values, nbins):
+    '''
+    Mean of the values in each bin (NaN in empty bins).
+    '''
+
+    count, mean, _ = kernels.binned_stats(index, values, nbins, std=False)
+
+    return mean, count
+
+
+#%%
+def build_section(df, dx=DISTANCE_BIN, dz=DEPTH_BIN, variables=VARIABLES,
+                  zmax=None, depth='depth', offsets=None):
+    '''
+    Bin glider data into a (distance, depth) section.
+
+    Input:
+    - df: pandas.DataFrame() with glider data (time index, sorted)
+    - (optional) dx: size of the distance bins in km
+    - (optional) dz: size of the depth bins in m
+    - (optional) variables: list of variables
+    - (optional) zmax: largest depth (default: deepest sample)
+    - (optional) depth: column with depth
+    - (optional) offsets: offsets table of segment.profiles()
+
+    Output:
+    - ds: xr.Dataset() with the mean of each variable in each bin, the number
+      of samples (nsamples), and time, lon and lat of each distance bin
+
+    Values which fail the quality control (<variable>_qc columns, see qc.py)
+    are left out of the means.
+    '''
+
+    import xarray as xr
+
+    flags = [vname + '_qc' for vname in variables if vname + '_qc' in df]
+    df = qc.mask(df, df[flags])
+
+    with instrument.stage('section.build') as st:
+
+        dist = along_track_distance(df, offsets)
+        z = df[depth].values.astype(float)
+
+        if zmax is None:
+            zmax = np.nanmax(z)
+
+        # the deepest sample is in the last bin, also if zmax is a multiple
+        # of dz
+        nx = int(dist[-1] // dx) + 1
+        nz = int(zmax // dz) + 1
+
+        # bin of each sample (samples without depth or below zmax are not
+        # used)
+        ix = (dist // dx).astype(np.int64)
+        iz = np.floor(z / dz)
+        valid = np.isfinite(iz) & (iz >= 0) & (iz < nz)
+        index = np.where(valid, ix * nz + np.where(valid, iz, 0), nx * nz)
+        index = index.astype(np.int64)
+
+        data = {}
+        for vname in variables:
+            mean = _bin_means(index, df[vname].values.astype(float),
+                              nx * nz + 1)[0]
+            data[vname] = (('distance', 'depth'),
+                           mean[:-1].reshape(nx, nz).astype(np.float32))
+
+        count = np.bincount(index, minlength=nx * nz + 1)[:-1]
+        data['nsamples'] = (('distance', 'depth'),
+                            count.reshape(nx, nz).astype(np.int32))
+
+        # time and position of the distance bins
+        t = df.index.values.astype('datetime64[ns]').view(np.int64)
+        tmean = _bin_means(ix, (t - t[0]).astype(float), nx)[0]
+        data['time'] = ('distance', pd.to_datetime(t[0] + tmean))
+        for name in ['lon', 'lat']:
+            data[name] = ('distance',
+                          _bin_means(ix, df[name].values.astype(float),
+                                     nx)[0])
+
+        ds = xr.Dataset(data,
+                        coords={'distance': (np.arange(nx) + .5) * dx,
+                                'depth': (np.arange(nz) + .5) * dz})
+        ds['distance'].attrs['units'] = 'km'
+        ds['depth'].attrs['units'] = 'm'
+        ds.attrs.update({'distance_bin_km': dx, 'depth_bin_m': dz})
+
+        st.add_bytes(ds.nbytes)
+
+    return ds
+
+
+#%%
+def section_file(ID, dx=DISTANCE_BIN, dz=DEPTH_BIN, outdir=SECTION_DIR):
+    '''
+    Return the name of the section file of a deployment and bin sizes.
+    '''
+
+    return os.path.join(outdir, '{0}_section_{1:g}km_{2:g}m.nc'.format(
+        ID, dx, dz))
+
+
+#%%
+def get_section(ID, dx=DISTANCE_BIN, dz=DEPTH_BIN, variables=VARIABLES,
+                infile=None, outdir=SECTION_DIR):
+    '''
+    Return the section of a glider deployment. It is read from the section
+    file if this is newer than the glider store, otherwise it is built and
+    saved.
+
+    Input:
+    - ID: deployment ID
+    - (optional) dx, dz: bin sizes in km and m
+    - (optional) variables: list of variables
+    - (optional) infile: glider store (default: data/raw/<ID>.h5)
+    - (optional) outdir: directory of the section files
+
+    Output:
+    - ds: xr.Dataset() with the section
+    '''
+
+    import xarray as xr
+
+    from pipeline import gliderstore, storage
+
+    if infile is None:
+        infile = 'data/raw/{}.h5'.format(ID)
+
+    outfile = section_file(ID, dx, dz, outdir)
+
+    if (os.path.isfile(outfile) and
+            os.path.getmtime(outfile) >= os.path.getmtime(infile)):
+        with instrument.stage('section.read_netcdf') as st:
+            ds = xr.load_dataset(outfile)
+            st.add_bytes(os.path.getsize(outfile))
+        if all(vname in ds for vname in variables):
+            return ds
+
+    df = gliderstore.read_store(infile, columns=['depth', 'lon', 'lat'] +
+                                list(variables) +
+                                [vname + '_qc' for vname in variables])
+    ds = build_section(df, dx, dz, variables)
+    ds.attrs['deployment'] = ID
+
+    # written under another name first, so that processes which build the
+    # same section at the same time (e.g. the workers of figserver.py) do not
+    # write into the same file
+    partfile = '{0}.{1}.part'.format(outfile, os.getpid())
+    with instrument.stage('section.write_netcdf') as st:
+        st.add_bytes(storage.write_netcdf(ds, partfile))
+    os.replace(partfile, outfile)
+
+    return ds
+
+
+#%%
+def plot_section(ds, var='temperature', outfile=None, ax=None):
+    '''
+    Plot a variable of a section against distance and depth.
+
+    Input:
+    - ds: xr.Dataset() of build_section() or get_section()
+    - (optional) var: variable
+    - (optional) outfile: save the figure to this file
+    - (optional) ax: matplotlib axes (default: new figure)
+
+    Output:
+    - ax: matplotlib axes
+    '''
+
+    import cmocean.cm as cmo
+    import matplotlib.pyplot as plt
+
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(9.3, 5.))
+    fig = ax.figure
+
+    with instrument.stage('section.plot'):
+        pc = ax.pcolormesh(ds['distance'], ds['depth'], ds[var].T,
+                           cmap=getattr(cmo, CMAPS.get(var, 'thermal')),
+                           shading='nearest')
+        fig.colorbar(pc, ax=ax, label=var)
+
+        ax.set_ylim(float(ds['depth'].max()), 0)
+        ax.set_xlabel('Along-track distance [km]')
+        ax.set_ylabel('Depth [m]')
+        if 'deployment' in ds.attrs:
+            ax.set_title(ds.attrs['deployment'])
+
+        if outfile is not None:
+            outdir = os.path.dirname(outfile)
+            if outdir and not os.path.isdir(outdir):
+                os.makedirs(outdir)
+            fig.savefig(outfile)
+
+    return ax
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+""" Segmentation of glider data into dives, climbs and mission legs
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+The profiles of the glider data are identified by the profile_id from the
+ERDDAP server, and the outward leg of a mission was found with
+df['lon'].idxmax() or a hard-coded date. Here both are derived from the data:
+
+- profiles(): dives (depth increases) and climbs (depth decreases). The
+  direction only changes when the depth reverses by more than a hysteresis
+  (e.g. 3 m), so noise and small wiggles do not start a new profile.
+- legs(): parts of the mission in which the glider moves away from its
+  deployment position (outbound) or back to it (inbound), from the mean
+  positions of the profiles with a hysteresis in km.
+
+Both return an offsets table with the first (start) and one past the last
+(stop) row of each segment, which can be used as index for later work per
+profile, e.g. df.iloc[start:stop] or np.add.reduceat(x, offsets['start']):
+
+    from pipeline import segment
+
+    profiles = segment.profiles(df)
+    legs = segment.legs(df, profiles)
+    outward = df.iloc[:legs['stop'].iloc[0]]
+    df['profile'] = segment.label(profiles, len(df))
+    profiles['leg'] = segment.label(legs)[profiles['start']]
+
+The hysteresis is computed with a play (backlash) operator, which follows the
+signal only when it moves more than half the hysteresis away. Each step is a
+clamp, and consecutive clamps combine into one clamp, so the operator is
+computed for blocks of samples side by side. Everything runs in linear time
+with O(sqrt(n)) vectorized steps.
+"""
+
+#%% Import all packages which we will need
+import numpy as np
+import pandas as pd
+
+# direction of the profiles and legs
+DIVE = 1
+CLIMB = -1
+OUTBOUND = 1
+INBOUND = -1
+
+# depth change in m which starts a new profile
+HYSTERESIS = 3.
+
+# change of the distance to the deployment position in km which starts a new
+# leg
+LEG_HYSTERESIS = 5.
+
+# earth radius in km
+EARTH_RADIUS = 6371.
+
+
+#%%
+def _ffill(x):
+    '''
+    Replace NaN with the previous valid value (leading NaN with the first).
+    '''
+
+    x = np.asarray(x, dtype=float)
+    valid = np.isfinite(x)
+
+    if valid.all() or not valid.any():
+        return x
+
+    idx = np.where(valid, np.arange(x.size), 0)
+    idx[:np.argmax(valid)] = np.argmax(valid)
+    np.maximum.accumulate(idx, out=idx)
+
+    return x[idx]
+
+
+#%%
+def play(x, width):
+    '''
+    Play (backlash) operator: the output follows the input only when the
+    input is more than width / 2 away from it.
+
+    Input:
+    - x: 1D array (NaN are replaced by the previous value)
+    - width: width of the hysteresis
+
+    Output:
+    - u: 1D array, which only increases (decreases) while x increases
+      (decreases), and is constant until x reverses by more than width
+    '''
+
+    x = _ffill(x)
+    n = x.size
+    r = width / 2.
+
+    if n == 0:
+        return x
+
+    # blocks of samples side by side (the padding does not move the output)
+    size = int(np.ceil(np.sqrt(n)))
+    nblocks = -(-n // size)
+    xt = np.full(size * nblocks, x[-1])
+    xt[:n] = x
+    xt = np.ascontiguousarray(xt.reshape(nblocks, size).T)
+
+    # each step clamps the output to [x - r, x + r], all steps of a block
+    # combined clamp the input of the block to [lo, hi]
+    lo = xt[0] - r
+    hi = xt[0] + r
+    for row in xt[1:]:
+        np.clip(lo, row - r, row + r, out=lo)
+        np.clip(hi, row - r, row + r, out=hi)
+
+    # output at the beginning of each block
+    u0 = np.empty(nblocks)
+    state = x[0]
+    for jj in range(nblocks):
+        u0[jj] = state
+        state = min(max(state, lo[jj]), hi[jj])
+
+    # output of all blocks
+    u = np.empty_like(xt)
+    state = u0
+    for ii, row in enumerate(xt):
+        state = np.clip(state, row - r, row + r, out=u[ii])
+
+    return u.T.ravel()[:n]
+
+
+#%%
+def direction(x, hysteresis):
+    '''
+    Direction of a signal (1: increasing, -1: decreasing) with hysteresis.
+    The extremes belong to the segments which end there.
+
+    Input:
+    - x: 1D array, e.g. depth
+    - hysteresis: change of x which reverses the direction
+
+    Output:
+    - sign: 1D int8 array (0 if x never changes by more than hysteresis)
+    '''
+
+    u = play(x, hysteresis)
+    step = np.sign(np.diff(u, prepend=u[:1])).astype(np.int8)
+
+    moves = np.flatnonzero(step)
+    if not moves.size:
+        return step
+
+    # samples without movement belong to the next movement (the previous one
+    # after the last movement)
+    nxt = np.where(step != 0, np.arange(step.size), moves[-1])
+    nxt[moves[-1]:] = moves[-1]
+    nxt = np.minimum.accumulate(nxt[::-1])[::-1]
+
+    return step[nxt]
+
+
+#%%
+def _offsets(sign):
+    '''
+    First and one past the last position of the runs of equal values.
+    '''
+
+    start = np.flatnonzero(np.diff(sign, prepend=sign[:1] - 1))
+    stop = np.append(start[1:], sign.size)[:start.size]
+
+    return start, stop
+
+
+#%%
+def _add_times(table, df):
+    '''
+    Add the time of the first and last row of each segment to an offsets
+    table (if df has a time index).
+    '''
+
+    if isinstance(df.index, pd.DatetimeIndex) and len(table):
+        table['time_start'] = df.index[table['start'].values]
+        table['time_stop'] = df.index[table['stop'].values - 1]
+
+
+#%%
+def profiles(df, depth='depth', hysteresis=HYSTERESIS):
+    '''
+    Split glider data into dives and climbs.
+
+    Input:
+    - df: pandas.DataFrame() with glider data (sorted by time)
+    - (optional) depth: column with depth (or pressure)
+    - (optional) hysteresis: depth change which starts a new profile
+
+    Output:
+    - offsets: pandas.DataFrame() with one row per profile and the columns
+      start, stop (rows of df), phase (DIVE or CLIMB), time_start, time_stop,
+      depth_min, depth_max
+    '''
+
+    z = df[depth].values.astype(float)
+    sign = direction(z, hysteresis)
+    start, stop = _offsets(sign)
+
+    table = pd.DataFrame({'start': start, 'stop': stop, 'phase': sign[start]})
+    table.index.name = 'profile'
+    _add_times(table, df)
+
+    if start.size:
+        table['depth_min'] = np.fmin.reduceat(z, start)
+        table['depth_max'] = np.fmax.reduceat(z, start)
+
+    return table
+
+
+#%%
+def haversine(lon1, lat1, lon2, lat2, radius=EARTH_RADIUS):
+    '''
+    Great circle distance between points in km (arrays are broadcast).
+    '''
+
+    lon1, lat1, lon2, lat2 = [np.deg2rad(np.asarray(v, dtype=float))
+                              for v in (lon1, lat1, lon2, lat2)]
+
+    a = (np.sin((lat2 - lat1) / 2.) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.) ** 2)
+
+    return 2. * radius * np.arcsin(np.sqrt(np.minimum(a, 1.)))
+
+
+#%%
+def positions(df, offsets, lon='lon', lat='lat'):
+    '''
+    Mean position of each segment (dead reckoning and GPS noise average out
+    over a profile).
+
+    Input:
+    - df: pandas.DataFrame() with glider data
+    - offsets: offsets table of profiles() or legs()
+    - (optional) lon, lat: columns with the position
+
+    Output:
+    - lon, lat: 1D arrays with one position per segment
+    '''
+
+    start = offsets['start'].values
+    count = offsets['stop'].values - start
+
+    return [np.add.reduceat(_ffill(df[name].values), start) / count
+            for name in [lon, lat]]
+
+
+#%%
+def legs(df, offsets=None, origin=None, hysteresis=LEG_HYSTERESIS,
+         lon='lon', lat='lat'):
+    '''
+    Split a glider mission into legs away from and back to the deployment
+    position. The legs are made of whole profiles, and the turning points
+    are the profiles farthest from (or closest to) the deployment position.
+
+    Input:
+    - df: pandas.DataFrame() with glider data (sorted by time)
+    - (optional) offsets: offsets table of profiles() (computed if not
+      given)
+    - (optional) origin: (lon, lat) of the reference position (default:
+      position of the first profile)
+    - (optional) hysteresis: change of the distance in km which starts a new
+      leg
+    - (optional) lon, lat: columns with the position
+
+    Output:
+    - offsets: pandas.DataFrame() with one row per leg and the columns start,
+      stop (rows of df), direction (OUTBOUND or INBOUND), time_start,
+      time_stop, distance_min, distance_max (km from the origin of the
+      mean positions of the profiles)
+    '''
+
+    if offsets is None:
+        offsets = profiles(df)
+
+    start = offsets['start'].values
+    stop = offsets['stop'].values
+    pos = positions(df, offsets, lon, lat)
+
+    if origin is None:
+        origin = (pos[0][0], pos[1][0])
+
+    dist = haversine(origin[0], origin[1], pos[0], pos[1])
+    sign = direction(dist, hysteresis)
+
+    # a mission which never moves away is one outbound leg
+    sign[sign == 0] = OUTBOUND
+
+    first, last = _offsets(sign)
+
+    table = pd.DataFrame({'start': start[first], 'stop': stop[last - 1],
+                          'direction': sign[first]})
+    table.index.name = 'leg'
+    _add_times(table, df)
+
+    if first.size:
+        table['distance_min'] = np.fmin.reduceat(dist, first)
+        table['distance_max'] = np.fmax.reduceat(dist, first)
+
+    return table
+
+
+#%%
+def label(offsets, n=None):
+    '''
+    Number of the segment of each row, e.g. to group the data by profile.
+
+    Input:
+    - offsets: offsets table of profiles() or legs()
+    - (optional) n: number of rows (default: stop of the last segment)
+
+    Output:
+    - labels: 1D int array (-1 for rows which are not in a segment)
+    '''
+
+    start = offsets['start'].values
+    stop = offsets['stop'].values
+
+    if n is None:
+        n = int(stop[-1]) if stop.size else 0
+
+    labels = np.full(n, -1, dtype=np.int64)
+    if start.size:
+        labels[start[0]:stop[-1]] = np.repeat(np.arange(start.size),
+                                              stop - start)
+
+    return labels
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+""" Worker pool which shares data cubes through shared memory
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Parallel plots or analyses of the BBMP cube or the OISST subset open and
+decode the NetCDF file in every process (xr.open_dataset()). Here each cube
+is loaded once by the parent process and its data variables are copied into
+multiprocessing.shared_memory blocks. The workers only get descriptors
+(name of the block, shape, dtype, dimensions) and the coordinates, which are
+small, and attach to the blocks when they start. The arrays of the workers
+are views of the blocks, so memory use stays at about one copy of the data
+however many workers run:
+
+    from pipeline import sharedpool
+
+    def level_mean(vname, level):
+        ds = sharedpool.get('bbmp')
+        return float(ds[vname].isel(pressure=level).mean())
+
+    with sharedpool.SharedPool({'bbmp': 'data/raw/bbmp.nc'}, jobs=4) as pool:
+        means = list(pool.map(level_mean, vnames, levels))
+
+The functions which run in the workers have to be defined at module level
+(they are pickled), and the shared arrays are read-only. The blocks are
+removed when the pool is closed.
+"""
+
+#%% Import all packages which we will need
+import collections
+import concurrent.futures
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from pipeline import instrument
+
+# descriptor of an array in a shared memory block
+SharedArray = collections.namedtuple('SharedArray',
+                                     ['name', 'shape', 'dtype', 'dims'])
+
+# datasets attached by a worker process (or by the parent) by key
+_DATASETS = {}
+
+# shared memory blocks attached by this process, kept open while the arrays
+# are used
+_BLOCKS = []
+
+
+#%%
+def _to_shared(values):
+    '''
+    Copy an array into a new shared memory block.
+
+    Output:
+    - block: SharedMemory() (has to be closed and unlinked by the caller)
+    - desc: SharedArray() descriptor without dimensions
+    '''
+
+    values = np.asarray(values)
+
+    # blocks of size 0 are not allowed
+    block = shared_memory.SharedMemory(create=True,
+                                       size=max(values.nbytes, 1))
+    view = np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)
+    view[...] = values
+
+    return block, SharedArray(block.name, values.shape, values.dtype.str,
+                              None)
+
+
+#%%
+def _attach(desc):
+    '''
+    Read-only view of an array in a shared memory block.
+    '''
+
+    block = shared_memory.SharedMemory(name=desc.name)
+    _BLOCKS.append(block)
+
+    values = np.ndarray(desc.shape, dtype=np.dtype(desc.dtype),
+                        buffer=block.buf)
+    values.flags.writeable = False
+
+    return values
+
+
+#%%
+def share_dataset(ds):
+    '''
+    Copy the data variables of a dataset into shared memory blocks.
+
+    Input:
+    - ds: xarray.Dataset() (loaded into memory if it is not)
+
+    Output:
+    - blocks: list of SharedMemory(), close and unlink them when done
+    - desc: picklable descriptor of the dataset for attach_dataset()
+    '''
+
+    blocks = []
+    variables = {}
+
+    try:
+        for vname, da in ds.data_vars.items():
+            block, shared = _to_shared(da.values)
+            blocks.append(block)
+            variables[vname] = (shared._replace(dims=da.dims), da.attrs)
+    except Exception:
+        release(blocks)
+        raise
+
+    # the coordinates are small and sent along with the descriptor
+    coords = {name: (c.dims, c.values, c.attrs)
+              for name, c in ds.coords.items()}
+
+    desc = {'variables': variables, 'coords': coords,
+            'attrs': dict(ds.attrs)}
+
+    return blocks, desc
+
+
+#%%
+def attach_dataset(desc):
+    '''
+    Build a dataset on top of the shared memory blocks of a descriptor
+    without copying the data.
+
+    Input:
+    - desc: descriptor of share_dataset()
+
+    Output:
+    - ds: xarray.Dataset() with read-only data variables
+    '''
+
+    import xarray as xr
+
+    data = {vname: (shared.dims, _attach(shared), attrs)
+            for vname, (shared, attrs) in desc['variables'].items()}
+
+    return xr.Dataset(data, coords=desc['coords'], attrs=desc['attrs'])
+
+
+#%%
+def release(blocks):
+    '''
+    Close and remove shared memory blocks.
+    '''
+
+    for block in blocks:
+        block.close()
+        try:
+            block.unlink()
+        except FileNotFoundError:
+            pass
+
+
+#%%
+def _init_worker(descs):
+    '''
+    Attach all shared datasets when a worker process starts.
+    '''
+
+    for key, desc in descs.items():
+        _DATASETS[key] = attach_dataset(desc)
+
+
+#%%
+def get(key):
+    '''
+    Return a shared dataset in a function which runs in a SharedPool.
+
+    Input:
+    - key: key of the dataset given to SharedPool()
+
+    Output:
+    - ds: xarray.Dataset() backed by shared memory (read-only)
+    '''
+
+    try:
+        return _DATASETS[key]
+    except KeyError:
+        raise KeyError('no shared dataset {!r} in this process, available: '
+                       '{}'.format(key, sorted(_DATASETS)))
+
+
+#%%
+class SharedPool(object):
+    '''
+    Process pool whose workers share datasets through shared memory.
+
+    Input:
+    - datasets: dict of key: xarray.Dataset() or name of a NetCDF file
+    - (optional) jobs: number of worker processes (default: number of CPUs)
+
+    The pool is used as context manager. submit() and map() work as for
+    concurrent.futures.ProcessPoolExecutor, and the functions get the
+    datasets with sharedpool.get(key).
+    '''
+
+    def __init__(self, datasets, jobs=None):
+
+        import xarray as xr
+
+        self.blocks = []
+        self.descs = {}
+        self.executor = None
+
+        try:
+            for key, ds in datasets.items():
+                with instrument.stage('sharedpool.share.{}'.format(key)) \
+                        as st:
+                    if isinstance(ds, str):
+                        ds = xr.load_dataset(ds)
+                    blocks, self.descs[key] = share_dataset(ds)
+                    self.blocks.extend(blocks)
+                    st.add_bytes(sum(b.size for b in blocks))
+
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                jobs, initializer=_init_worker, initargs=(self.descs,))
+        except Exception:
+            release(self.blocks)
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def nbytes(self):
+        '''
+        Size of the shared memory blocks in bytes.
+        '''
+        return sum(block.size for block in self.blocks)
+
+    def submit(self, fn, *args, **kwargs):
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def map(self, fn, *iterables, **kwargs):
+        return self.executor.map(fn, *iterables, **kwargs)
+
+    def close(self):
+        '''
+        Wait for the workers to finish and remove the shared memory blocks.
+        '''
+
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+        release(self.blocks)
+        self.blocks = []
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+""" Fast rendering of gridded SST maps for animations
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+ax.contourf(lon, lat, sst, 255) builds 255 sets of filled contour polygons
+for every frame of an animation, which takes most of the rendering time. OISST
+is a regular grid, so each frame can be drawn as one image instead:
+
+- on PlateCarree maps, the grid is drawn with imshow() (optionally with
+  bilinear interpolation for a smooth field like the contours),
+- on other projections as one QuadMesh (pcolormesh), whose vertices are
+  projected once (gouraud shading for a smooth field).
+
+The artist is created for the first frame, later frames only replace its
+array data:
+
+    from pipeline import sstmap
+
+    renderer = sstmap.SSTMap(ax, sst['lon'], sst['lat'], vmin=3., vmax=27.,
+                             cmap=cmo.thermal)
+    for frame in range(sst['time'].size):
+        renderer.update(sst.isel(time=frame).values)
+
+compare() returns the RMS difference between two rendered figures, e.g. of
+the contourf and image renderers, which should stay below VISUAL_TOLERANCE.
+"""
+
+#%% Import all packages which we will need
+import numpy as np
+
+# largest RMS difference (0-255 colour scale) to the 255-level contourf map
+# of the ocean between the outer grid points, see compare() (measured: 0.5 to
+# 0.7 for image and mesh, see benchmarks/bench_sstmap.py)
+VISUAL_TOLERANCE = 2.
+
+
+#%%
+def _edges(centres):
+    '''
+    Return the cell edges of a regular grid given its cell centres.
+    '''
+
+    centres = np.asarray(centres, dtype=float)
+    step = (centres[-1] - centres[0]) / max(centres.size - 1, 1)
+
+    return centres[0] - step / 2., centres[-1] + step / 2.
+
+
+#%%
+class SSTMap(object):
+    '''
+    SST maps of a regular longitude-latitude grid on a cartopy GeoAxes, drawn
+    by a single artist which is updated for each frame.
+
+    Input:
+    - ax: cartopy GeoAxes
+    - lon, lat: 1D arrays with the grid (longitudes in 0-360 or -180-180)
+    - (optional) smooth: interpolate between the grid points
+    - (optional) method: 'image', 'mesh' or 'auto' (image on PlateCarree
+      maps, mesh otherwise)
+    - (optional) kwargs: vmin, vmax, cmap, zorder, ...
+    '''
+
+    def __init__(self, ax, lon, lat, smooth=True, method='auto', **kwargs):
+
+        import cartopy.crs as ccrs
+
+        self.ax = ax
+        self.lon = np.asarray(lon, dtype=float)
+        self.lat = np.asarray(lat, dtype=float)
+        self.smooth = smooth
+        self.kwargs = kwargs
+        self.artist = None
+
+        # an image can only be drawn without reprojection
+        if method == 'auto':
+            method = ('image' if isinstance(ax.projection, ccrs.PlateCarree)
+                      else 'mesh')
+        self.method = method
+
+        # image rows must go from south to north
+        self._flip = self.lat.size > 1 and self.lat[1] < self.lat[0]
+
+    def _image(self, field):
+
+        import cartopy.crs as ccrs
+
+        # longitudes in the coordinates of the map (e.g. -70 instead of 290)
+        x = self.ax.projection.transform_points(
+            ccrs.PlateCarree(), np.array(_edges(self.lon)),
+            np.zeros(2))[:, 0]
+        y = _edges(self.lat[::-1] if self._flip else self.lat)
+
+        # imshow() directly in the data coordinates of the map, so cartopy
+        # does not warp the image
+        return self.ax.imshow(field, origin='lower',
+                              extent=[x[0], x[1], y[0], y[1]],
+                              interpolation='bilinear' if self.smooth
+                              else 'nearest',
+                              transform=self.ax.transData, **self.kwargs)
+
+    def _mesh(self, field):
+
+        import cartopy.crs as ccrs
+
+        shading = 'gouraud' if self.smooth else 'nearest'
+
+        return self.ax.pcolormesh(self.lon, self.lat, field, shading=shading,
+                                  transform=ccrs.PlateCarree(), **self.kwargs)
+
+    def update(self, field):
+        '''
+        Draw the SST field of the next frame.
+
+        Input:
+        - field: 2D array (lat, lon)
+
+        Output:
+        - artist: matplotlib AxesImage or QuadMesh
+        '''
+
+        field = np.ma.masked_invalid(np.asarray(field))
+
+        if self.method == 'image' and self._flip:
+            field = field[::-1]
+
+        if self.artist is None:
+            if self.method == 'image':
+                self.artist = self._image(field)
+            else:
+                self.artist = self._mesh(field)
+        elif self.method == 'image':
+            self.artist.set_data(field)
+        else:
+            self.artist.set_array(field)
+
+        return self.artist
+
+
+#%%
+def render_rgb(fig):
+    '''
+    Draw a figure and return its pixels as (height, width, 3) uint8 array.
+    '''
+
+    fig.canvas.draw()
+
+    return np.asarray(fig.canvas.buffer_rgba())[..., :3].copy()
+
+
+#%%
+def compare(fig_a, fig_b):
+    '''
+    RMS difference between the pixels of two figures of the same size on a
+    0-255 colour scale (0: identical).
+    '''
+
+    a = render_rgb(fig_a).astype(float)
+    b = render_rgb(fig_b).astype(float)
+
+    return float(np.sqrt(np.mean((a - b) ** 2)))
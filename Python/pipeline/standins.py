@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+""" Local stand-ins for the remote data servers
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+The tutorials download data from the DFO FTP server, the ERDDAP server of the
+Ocean Tracking Network and NOAA's THREDDS server. For benchmarks and offline
+development, the functions in this module serve local files in the same way,
+so the real download code can be run without network access.
+serve_erddap() and GrowingDeployment also imitate a realtime glider data set
+on ERDDAP which grows while it is polled. serve_flaky() and serve_ftp() with
+drop_after drop connections in the middle of a transfer.
+"""
+
+#%% Import all packages which we will need
+import contextlib
+import functools
+import http.server
+import logging
+import os
+import shutil
+import socket
+import threading
+import urllib.parse
+
+
+#%%
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    '''
+    HTTP request handler which serves files without logging each request.
+    '''
+
+    def log_message(self, format, *args):
+        pass
+
+
+#%%
+@contextlib.contextmanager
+def serve_directory(directory, handler=_QuietHandler):
+    '''
+    Serve the files of a local directory over HTTP in a background thread.
+
+    Input:
+    - directory: directory with files to serve
+    - (optional) handler: request handler class
+
+    Output:
+    - yields the base URL of the server, e.g. http://127.0.0.1:43210
+    '''
+
+    # port 0 lets the operating system choose a free port
+    server = http.server.ThreadingHTTPServer(
+        ('127.0.0.1', 0), functools.partial(handler, directory=directory))
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        yield 'http://{0}:{1}'.format(*server.server_address)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+#%%
+class _Drops(object):
+    '''
+    Positions at which the transfers of a flaky server are dropped: at the
+    byte offsets drop_after, 2 * drop_after, ..., ndrops * drop_after of the
+    file. A transfer which starts (or resumes) before one of these offsets
+    stops there, so every complete download sees ndrops dropped connections.
+    '''
+
+    def __init__(self, ndrops, drop_after):
+
+        self.ndrops = ndrops
+        self.drop_after = drop_after
+
+    def limit(self, start, size):
+        '''
+        Return the number of bytes after which a transfer which starts at
+        byte offset start is dropped (None if it is not dropped).
+        '''
+
+        if not self.ndrops:
+            return None
+
+        k = start // self.drop_after + 1
+        stop = k * self.drop_after
+        if k > self.ndrops or stop >= size:
+            return None
+
+        return stop - start
+
+
+#%%
+class _FlakyHandler(_QuietHandler):
+    '''
+    HTTP request handler which supports Range requests (with an ETag for
+    If-Range) and drops connections in the middle of the transfer (see
+    _Drops).
+    '''
+
+    drops = _Drops(0, None)
+
+    def do_GET(self):
+
+        fname = self.translate_path(self.path)
+        if not os.path.isfile(fname):
+            self.send_error(404, 'File not found')
+            return
+
+        stat = os.stat(fname)
+        size = stat.st_size
+        etag = '"{0:x}-{1:x}"'.format(stat.st_mtime_ns, size)
+
+        # only single open-ended ranges (bytes=<first>-) are supported, and
+        # only if the file has not changed since the If-Range ETag
+        start = 0
+        byte_range = self.headers.get('Range', '')
+        if_range = self.headers.get('If-Range')
+        if byte_range.startswith('bytes=') and if_range in (None, etag):
+            start = int(byte_range[len('bytes='):].split('-')[0] or 0)
+
+        if start >= size > 0:
+            self.send_error(416, 'Requested Range Not Satisfiable')
+            return
+
+        if start:
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(
+                start, size - 1, size))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(size - start))
+        self.send_header('ETag', etag)
+        self.end_headers()
+
+        limit = self.drops.limit(start, size)
+
+        with open(fname, 'rb') as f:
+            f.seek(start)
+            if limit is None:
+                shutil.copyfileobj(f, self.wfile)
+                return
+            self.wfile.write(f.read(limit))
+
+        # drop the connection without sending the rest
+        self.wfile.flush()
+        self.close_connection = True
+        self.connection.shutdown(socket.SHUT_RDWR)
+
+
+#%%
+@contextlib.contextmanager
+def serve_flaky(directory, drop_after=100000, ndrops=3):
+    '''
+    Serve the files of a local directory over HTTP with support for Range
+    requests, but drop the connection every drop_after bytes of a file, up
+    to ndrops times per download (to test resumed downloads).
+
+    Input:
+    - directory: directory with files to serve
+    - (optional) drop_after: distance of the drops in bytes
+    - (optional) ndrops: number of drops per download
+
+    Output:
+    - yields the base URL of the server
+    '''
+
+    handler = type('FlakyHandler', (_FlakyHandler,),
+                   {'drops': _Drops(ndrops, drop_after)})
+
+    with serve_directory(directory, handler=handler) as url:
+        yield url
+
+
+#%%
+class _ERDDAPHandler(_QuietHandler):
+    '''
+    HTTP request handler which answers tabledap requests for <ID>.csvp like
+    ERDDAP: a time>... constraint in the query selects the rows after that
+    time, and a request without matching rows gets status 404.
+    '''
+
+    def do_GET(self):
+
+        path, _, query = self.path.partition('?')
+        fname = os.path.join(self.directory,
+                             os.path.basename(urllib.parse.unquote(path)))
+
+        if not fname.endswith('.csvp') or not os.path.isfile(fname):
+            self.send_error(404, 'Resource not found: ' + path)
+            return
+
+        # constraints are separated by '&', e.g. time>2015-10-27T12:00:00Z
+        since = None
+        for constraint in urllib.parse.unquote(query).split('&')[1:]:
+            if constraint.startswith('time>'):
+                since = constraint[len('time>'):]
+
+        with open(fname, 'rb') as f:
+            lines = f.readlines()
+
+        # ISO 8601 times in the first column can be compared as text (an
+        # incomplete last line, which is still being written, is left out)
+        header = lines[0]
+        rows = [line for line in lines[1:] if line.endswith(b'\n')]
+        if since is not None:
+            since = since.encode()
+            rows = [line for line in rows if line.split(b',', 1)[0] > since]
+
+        if not rows:
+            self.send_error(404, 'Your query produced no matching results.')
+            return
+
+        body = header + b''.join(rows)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+#%%
+@contextlib.contextmanager
+def serve_erddap(directory):
+    '''
+    Serve the *.csvp files of a local directory like ERDDAP's tabledap, with
+    support for time>... constraints (see _ERDDAPHandler). Together with
+    GrowingDeployment, this is a stand-in for a realtime glider deployment.
+
+    Input:
+    - directory: directory with <ID>.csvp files
+
+    Output:
+    - yields the base URL of the server
+    '''
+
+    with serve_directory(directory, handler=_ERDDAPHandler) as url:
+        yield url
+
+
+#%%
+class GrowingDeployment(object):
+    '''
+    Synthetic realtime glider deployment: a *.csvp file which grows by new
+    rows each time grow() is called, like the data set of a glider which is
+    still at sea.
+
+    Input:
+    - directory: directory of the file <ID>.csvp
+    - ID: deployment ID
+    - nrows: total number of rows of the deployment
+    - (optional) seed: seed of the random number generator
+    '''
+
+    def __init__(self, directory, ID, nrows, seed=42):
+
+        from pipeline import synthetic
+
+        self.fname = os.path.join(directory, ID + '.csvp')
+        self.df = synthetic.glider_profiles(nrows, seed=seed)
+        self.df.columns = synthetic.GLIDER_HEADER
+        self.nrows = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.df.iloc[:0].to_csv(self.fname, index=False)
+
+    def grow(self, nrows):
+        '''
+        Append the next nrows rows to the file and return the number of rows
+        which were written.
+        '''
+
+        new = self.df.iloc[self.nrows:self.nrows + nrows]
+        new.to_csv(self.fname, mode='a', header=False, index=False,
+                   float_format='%.5f')
+        self.nrows += len(new)
+
+        return len(new)
+
+
+#%%
+@contextlib.contextmanager
+def serve_ftp(directory, max_cons=16, drop_after=None, ndrops=0):
+    '''
+    Serve the files of a local directory over anonymous FTP in a background
+    thread. Requires the pyftpdlib package.
+
+    Input:
+    - directory: directory with files to serve
+    - (optional) max_cons: maximum number of simultaneous connections
+    - (optional) drop_after: distance in bytes at which file transfers are
+      dropped (to test resumed downloads, see serve_flaky)
+    - (optional) ndrops: number of drops per download
+
+    Output:
+    - yields (host, port) of the server
+    '''
+
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import DTPHandler, FTPHandler
+    from pyftpdlib.servers import ThreadedFTPServer
+
+    # pyftpdlib logs every command at level INFO to stderr unless its logger
+    # already has a handler
+    logger = logging.getLogger('pyftpdlib')
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+    logger.setLevel(logging.WARNING)
+
+    authorizer = DummyAuthorizer()
+    authorizer.add_anonymous(directory)
+
+    # subclass, so the settings do not change the pyftpdlib defaults
+    handler = type('StandinFTPHandler', (FTPHandler,),
+                   {'authorizer': authorizer, 'banner': 'stand-in'})
+
+    if ndrops:
+        drops = _Drops(ndrops, drop_after)
+
+        class FlakyDTPHandler(DTPHandler):
+
+            _limit = None
+
+            # send() is not used with sendfile()
+            def use_sendfile(self):
+                return False
+
+            def push_with_producer(self, producer):
+                # only file transfers (RETR) are dropped, not listings; the
+                # file is already at the position of a REST command
+                if self.file_obj is not None:
+                    self._limit = drops.limit(
+                        self.file_obj.tell(),
+                        os.fstat(self.file_obj.fileno()).st_size)
+                DTPHandler.push_with_producer(self, producer)
+
+            def send(self, data):
+                if self._limit is None:
+                    return DTPHandler.send(self, data)
+                left = self._limit - self.tot_bytes_sent
+                sent = DTPHandler.send(self, data[:left]) if left > 0 else 0
+                if self.tot_bytes_sent >= self._limit:
+                    self._resp = ('426 Connection closed; transfer aborted.',
+                                  logger.debug)
+                    self.close()
+                return sent
+
+        handler.dtp_handler = FlakyDTPHandler
+
+    server = ThreadedFTPServer(('127.0.0.1', 0), handler)
+    server.max_cons = max_cons
+
+    thread = threading.Thread(target=server.serve_forever,
+                              kwargs={'timeout': .1}, daemon=True)
+    thread.start()
+
+    try:
+        yield server.address
+    finally:
+        server.close_all()
+        thread.join(5.)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+""" Chunked and compressed NetCDF4 storage of the BBMP cube
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+By default, xarray writes the gridded BBMP data (time, pressure) as NetCDF
+without chunking or compression. The data are mostly read in two ways:
+
+- the full time series at one depth (e.g. the Hovmoeller diagrams and
+  climatologies), and
+- the full profile at one time.
+
+The chunks have the same proportions as the cube, so both reads touch about
+the same number of values, and are small enough to be decompressed quickly.
+The data are stored as float32 (or packed into int16 with scale_factor and
+add_offset, or with their own precision, e.g. float64 for exports) and
+compressed with zlib and the shuffle filter.
+
+    from pipeline import storage
+
+    storage.write_netcdf(ds, 'data/raw/bedford_basin_monitoring_program.nc')
+"""
+
+#%% Import all packages which we will need
+import os
+
+import numpy as np
+
+# uncompressed size of a chunk in bytes
+CHUNK_BYTES = 64 * 1024
+
+# zlib compression level (higher levels hardly reduce the size of the BBMP
+# data, but take longer to write)
+COMPLEVEL = 1
+
+# fill value of packed variables
+INT16_FILL = -32767
+
+
+#%%
+def chunk_shape(shape, itemsize, chunk_bytes=CHUNK_BYTES):
+    '''
+    Chunk shape with the same proportions as the variable. Reading a full
+    time series at one depth then touches as many values as reading a full
+    profile at one time (ntime * chunk_pressure = npressure * chunk_time).
+
+    Input:
+    - shape: shape of the variable
+    - itemsize: number of bytes per value
+    - (optional) chunk_bytes: uncompressed size of a chunk in bytes
+
+    Output:
+    - chunks: tuple with the chunk size along each dimension
+    '''
+
+    shape = np.asarray(shape, dtype=float)
+
+    # shrink all dimensions by the same factor
+    factor = (chunk_bytes / itemsize / np.prod(shape)) ** (1. / shape.size)
+    chunks = np.clip(np.round(shape * min(factor, 1.)), 1, shape)
+
+    return tuple(int(c) for c in chunks)
+
+
+#%%
+def packing(values, nbits=16):
+    '''
+    Scale factor and offset to pack values into signed integers. The most
+    negative integers are reserved for the fill value.
+
+    Input:
+    - values: array with data
+    - (optional) nbits: number of bits of the packed integers
+
+    Output:
+    - scale_factor, add_offset: unpacked = packed * scale_factor + add_offset
+    '''
+
+    vmin = float(np.nanmin(values))
+    vmax = float(np.nanmax(values))
+
+    # packed values go from -(2**(nbits-1) - 2) to 2**(nbits-1) - 2, which
+    # keeps the fill value and a margin for rounding free
+    steps = 2 ** nbits - 4
+
+    scale_factor = (vmax - vmin) / steps if vmax > vmin else 1.
+    add_offset = (vmax + vmin) / 2.
+
+    return scale_factor, add_offset
+
+
+#%%
+def encoding(ds, pack=False, complevel=COMPLEVEL, chunk_bytes=CHUNK_BYTES,
+             full_precision=False):
+    '''
+    NetCDF4 encoding of the data variables of a Dataset.
+
+    Input:
+    - ds: xarray.Dataset() with gridded data (time, pressure)
+    - (optional) pack: pack the data into int16 instead of float32 (the error
+      is at most half the scale_factor)
+    - (optional) complevel: zlib compression level (1-9)
+    - (optional) chunk_bytes: uncompressed size of a chunk in bytes
+    - (optional) full_precision: keep the float type of the data (e.g.
+      float64) instead of float32 (pack is ignored)
+
+    Output:
+    - enc: dictionary variable name -> encoding for Dataset.to_netcdf()
+    '''
+
+    enc = {}
+
+    for vname, var in ds.data_vars.items():
+
+        if var.ndim == 0:
+            continue
+
+        venc = {'zlib': True, 'complevel': complevel, 'shuffle': True}
+
+        if np.issubdtype(var.dtype, np.integer):
+            # e.g. quality flags, compressed as they are
+            venc['dtype'] = var.dtype
+        elif not np.issubdtype(var.dtype, np.floating):
+            continue
+        elif full_precision:
+            venc.update({'dtype': var.dtype,
+                         '_FillValue': np.array(np.nan, dtype=var.dtype)})
+        elif pack and np.isfinite(var.values).any():
+            scale_factor, add_offset = packing(var.values)
+            venc.update({'dtype': 'int16', 'scale_factor': scale_factor,
+                         'add_offset': add_offset, '_FillValue': INT16_FILL})
+        else:
+            venc.update({'dtype': 'float32', '_FillValue': np.float32(np.nan)})
+
+        itemsize = np.dtype(venc['dtype']).itemsize
+        venc['chunksizes'] = chunk_shape(var.shape, itemsize, chunk_bytes)
+
+        enc[vname] = venc
+
+    return enc
+
+
+#%%
+def write_netcdf(ds, outfile, pack=False, complevel=COMPLEVEL,
+                 chunk_bytes=CHUNK_BYTES, full_precision=False):
+    '''
+    Write a Dataset as chunked and compressed NetCDF4 file (see encoding()).
+
+    Output:
+    - nbytes: size of the file in bytes
+    '''
+
+    outdir = os.path.dirname(outfile)
+    if outdir and not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    ds.to_netcdf(outfile, format='NETCDF4', engine='netcdf4',
+                 encoding=encoding(ds, pack=pack, complevel=complevel,
+                                   chunk_bytes=chunk_bytes,
+                                   full_precision=full_precision))
+
+    return os.path.getsize(outfile)
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+""" Synthetic data generators for benchmarks
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+The functions in this module create files which look like the real data used
+in the tutorials, but can be made arbitrarily large:
+
+- the aggregated CTD profiles of the Bedford Basin Monitoring Program
+  (bbmp_aggregated_profiles.csv on the DFO FTP server) and the per-cast files
+  with metadata headers in the yearly directories
+- glider data in ERDDAP's *.csvp format (time, depth, latitude, ...)
+- daily OISST NetCDF files in the directory layout of the NCEI server
+
+All generators use a seeded random number generator, so the same arguments
+always produce the same data.
+"""
+
+#%% Import all packages which we will need
+import numpy as np
+import os
+import pandas as pd
+import xarray as xr
+
+# columns of bbmp_aggregated_profiles.csv - the analysis only uses the columns
+# 0, 6, 7, 13, 14 and 15, the others are filled with dummy values
+BBMP_COLUMNS = ['time_string', 'cast_id', 'year', 'month', 'day', 'latitude',
+                'pressure', 'temperature', 'longitude', 'conductivity',
+                'fluorescence', 'par', 'depth', 'salinity', 'sigmaTheta',
+                'oxygen']
+
+# header of ERDDAP's *.csvp output of the glider data sets
+GLIDER_HEADER = ['time (UTC)', 'depth (m)', 'latitude (degrees_north)',
+                 'longitude (degrees_east)', 'conductivity (S m-1)',
+                 'temperature (Celsius)', 'salinity (1e-3)',
+                 'density (kg m-3)', 'pressure (dbar)', 'profile_id']
+
+
+#%%
+def bbmp_profiles(ncasts, dp=.5, pmax=72., seed=42):
+    '''
+    Create synthetic CTD casts shaped like the aggregated BBMP profiles.
+
+    Input:
+    - ncasts: number of casts (one cast per week starting in 1999)
+    - (optional) dp: vertical resolution in dbar
+    - (optional) pmax: maximum pressure of each cast in dbar
+    - (optional) seed: seed of the random number generator
+
+    Output:
+    - df: pandas.DataFrame() with the columns of bbmp_aggregated_profiles.csv
+    '''
+
+    rng = np.random.default_rng(seed)
+
+    # weekly casts at a random time of the day
+    times = (pd.date_range('1999-01-06 10:00', periods=ncasts, freq='7D')
+             + pd.to_timedelta(rng.integers(0, 3600, ncasts), unit='s'))
+
+    # pressure levels of one cast, with a few levels in between the half meter
+    # grid which the analysis has to filter out
+    pres = np.arange(dp, pmax + dp, dp)
+    pres = np.sort(np.concatenate([pres, pres[::7] + .25]))
+    nlev = pres.size
+
+    # repeat casts and levels to long format
+    time = np.repeat(times.values, nlev)
+    p = np.tile(pres, ncasts)
+
+    # seasonal cycle at the surface which decays with depth
+    doy = np.repeat(times.dayofyear.values, nlev)
+    season = np.cos(2. * np.pi * (doy - 220.) / 365.25)
+    decay = np.exp(-p / 15.)
+
+    temp = 2.5 + (6. + 8. * season) * decay + .1 * rng.standard_normal(p.size)
+    salt = 31.5 - 1.5 * decay + .02 * rng.standard_normal(p.size)
+    sigt = 22. + 3. * (1. - decay) + .02 * rng.standard_normal(p.size)
+    oxy = 7. - 3. * (1. - decay) + .1 * rng.standard_normal(p.size)
+
+    df = pd.DataFrame({'time_string': time,
+                       'cast_id': np.repeat(np.arange(ncasts), nlev),
+                       'year': np.repeat(times.year.values, nlev),
+                       'month': np.repeat(times.month.values, nlev),
+                       'day': np.repeat(times.day.values, nlev),
+                       'latitude': 44.6936,
+                       'pressure': p,
+                       'temperature': temp,
+                       'longitude': -63.6403,
+                       'conductivity': 3.,
+                       'fluorescence': 0.,
+                       'par': 0.,
+                       'depth': p,
+                       'salinity': salt,
+                       'sigmaTheta': sigt,
+                       'oxygen': oxy},
+                      columns=BBMP_COLUMNS)
+
+    # the real file contains duplicate (time, pressure) pairs
+    dup = df.iloc[::97]
+    df = pd.concat([df, dup]).sort_values(['time_string', 'pressure'],
+                                          kind='stable')
+
+    return df.reset_index(drop=True)
+
+
+#%%
+def write_bbmp_csv(outfile, ncasts, chunk=500, seed=42):
+    '''
+    Write a synthetic bbmp_aggregated_profiles.csv file.
+
+    Input:
+    - outfile: name of output file
+    - ncasts: number of casts
+    - (optional) chunk: number of casts generated and written at once
+    - (optional) seed: seed of the random number generator
+
+    Output:
+    - outfile: name of output file
+    '''
+
+    _makedirs(outfile)
+
+    for ii, i0 in enumerate(range(0, ncasts, chunk)):
+
+        # generate a block of casts and shift it in time
+        df = bbmp_profiles(min(chunk, ncasts - i0), seed=seed + ii)
+        df['time_string'] = df['time_string'] + pd.Timedelta(weeks=i0)
+        df['cast_id'] += i0
+
+        df.to_csv(outfile, mode='w' if ii == 0 else 'a', header=(ii == 0),
+                  index=False, float_format='%.4f',
+                  date_format='%Y-%m-%d %H:%M:%S')
+
+    return outfile
+
+
+#%%
+def bbmp_dataset(ncasts, seed=42):
+    '''
+    Create a synthetic BBMP cube like the one returned by download_bbmp_data.
+
+    Input:
+    - ncasts: number of casts
+    - (optional) seed: seed of the random number generator
+
+    Output:
+    - ds: xarray.Dataset() with dimensions (time, pressure)
+    '''
+
+    df = bbmp_profiles(ncasts, seed=seed)
+    df = df.loc[df['pressure'] % .5 == 0.]
+    df = df.drop_duplicates(['time_string', 'pressure'])
+
+    df = df.set_index(['time_string', 'pressure'])
+    df = df[['temperature', 'salinity', 'sigmaTheta', 'oxygen']]
+
+    return df.to_xarray().rename({'time_string': 'time'})
+
+
+#%%
+def write_bbmp_casts(outdir, ncasts, start='2017-01-04', seed=42):
+    '''
+    Write synthetic per-cast BBMP files like the ones in the yearly
+    directories on the DFO FTP server (BIOWebMaster/BBMP/CSV/<year>/). Each
+    file starts with 10 lines of metadata ('name: value') followed by the CSV
+    data of the cast.
+
+    Input:
+    - outdir: base directory, the files are written to <outdir>/<year>/
+    - ncasts: number of casts (one per week)
+    - (optional) start: date of the first cast
+    - (optional) seed: seed of the random number generator
+
+    Output:
+    - files: list with names of the written files
+    '''
+
+    df = bbmp_profiles(ncasts, seed=seed)
+    df = df.drop_duplicates(['time_string', 'pressure'])
+
+    # shift the casts to the desired start date
+    shift = pd.Timestamp(start) - df['time_string'].iloc[0].normalize()
+    df['time_string'] += shift
+
+    files = []
+
+    for cid, cast in df.groupby('cast_id'):
+
+        time = cast['time_string'].iloc[0]
+        cast_id = 'D{0:%y}{1:06d}'.format(time, 667000 + cid)
+
+        header = ['Cast ID: {}'.format(cast_id),
+                  'Station: Bedford Basin Compass Buoy Station',
+                  'Time: {:%Y-%m-%d %H:%M:%S}'.format(time),
+                  'Latitude: {:.4f}'.format(cast['latitude'].iloc[0]),
+                  'Longitude: {:.4f}'.format(cast['longitude'].iloc[0]),
+                  'Instrument: CTD',
+                  'Vessel: synthetic',
+                  'Number of scans: {}'.format(len(cast)),
+                  'Pressure interval: 0.5 dbar',
+                  'Data: see below']
+
+        data = cast[['pressure', 'temperature', 'salinity', 'sigmaTheta',
+                     'oxygen']].copy()
+        data.insert(0, 'scan', np.arange(len(cast)) * 10 + 1000)
+
+        fname = os.path.join(outdir, str(time.year), cast_id + '.csv')
+        _makedirs(fname)
+
+        with open(fname, 'w') as f:
+            f.write('\n'.join(header) + '\n')
+            data.to_csv(f, index=False, float_format='%.4f')
+
+        files.append(fname)
+
+    return files
+
+
+#%%
+def glider_profiles(nrows, start='2015-10-27', dt=4., seed=42):
+    '''
+    Create synthetic glider data with dives and climbs between the surface and
+    200 m along a track from Halifax to the shelf break and back.
+
+    Input:
+    - nrows: number of samples
+    - (optional) start: start time of the mission
+    - (optional) dt: sampling interval in seconds
+    - (optional) seed: seed of the random number generator
+
+    Output:
+    - df: pandas.DataFrame() with the columns of get_glider_data (before the
+      time column is converted)
+    '''
+
+    rng = np.random.default_rng(seed)
+
+    # time axis
+    t = np.arange(nrows) * dt
+    time = pd.Timestamp(start) + pd.to_timedelta(t, unit='s')
+
+    # saw tooth between the surface and 200 m with a period of 2 hours
+    period = 7200.
+    phase = (t % period) / period
+    depth = 200. * (1. - np.abs(2. * phase - 1.)) + .5 * rng.random(nrows)
+    profile_id = (t // (period / 2.)).astype(int)
+
+    # track: out to the shelf break and back
+    frac = t / max(t[-1], 1.)
+    leg = 1. - np.abs(2. * frac - 1.)
+    lon = -63.3 + 1.8 * leg + .01 * rng.standard_normal(nrows)
+    lat = 44.4 - 1.2 * leg + .01 * rng.standard_normal(nrows)
+
+    decay = np.exp(-depth / 40.)
+    temp = 4. + 10. * decay + .1 * rng.standard_normal(nrows)
+    salt = 32.5 - 1.5 * decay + .02 * rng.standard_normal(nrows)
+    dens = 1025. + .8 * (salt - 31.) - .15 * (temp - 4.)
+    cond = 3. + .1 * temp
+    pres = depth * 1.01
+
+    df = pd.DataFrame({'time': time.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                       'depth': depth,
+                       'lat': lat,
+                       'lon': lon,
+                       'conductivity': cond,
+                       'temperature': temp,
+                       'salinity': salt,
+                       'density': dens,
+                       'pressure': pres,
+                       'profile_id': profile_id})
+
+    # sensors drop out from time to time
+    for vname in ['conductivity', 'salinity', 'density']:
+        df.loc[rng.random(nrows) < .01, vname] = np.nan
+
+    return df
+
+
+#%%
+def write_glider_csvp(outfile, nrows, chunk=1000000, seed=42):
+    '''
+    Write synthetic glider data in ERDDAP's *.csvp format.
+
+    Input:
+    - outfile: name of output file
+    - nrows: number of samples
+    - (optional) chunk: number of samples generated and written at once
+    - (optional) seed: seed of the random number generator
+
+    Output:
+    - outfile: name of output file
+    '''
+
+    _makedirs(outfile)
+
+    dt = 4.
+    for ii, i0 in enumerate(range(0, nrows, chunk)):
+
+        start = pd.Timestamp('2015-10-27') + pd.Timedelta(seconds=i0 * dt)
+        df = glider_profiles(min(chunk, nrows - i0), start=start, dt=dt,
+                             seed=seed + ii)
+
+        if ii == 0:
+            df.columns = GLIDER_HEADER
+
+        df.to_csv(outfile, mode='w' if ii == 0 else 'a', header=(ii == 0),
+                  index=False, float_format='%.5f')
+
+    return outfile
+
+
+#%%
+def write_oisst_days(outdir, dates, res=.25, seed=42):
+    '''
+    Write synthetic daily OISST files with the directory layout and file names
+    of the NCEI server (YYYYMM/avhrr-only-v2.YYYYMMDD.nc), so that a local
+    directory can be used as base_url of get_oisst.
+
+    Input:
+    - outdir: base directory of the daily files
+    - dates: pandas.DatetimeIndex() with the desired days
+    - (optional) res: grid spacing in degrees (OISST: 0.25)
+    - (optional) seed: seed of the random number generator
+
+    Output:
+    - files: list with names of the written files
+    '''
+
+    rng = np.random.default_rng(seed)
+
+    lat = np.arange(-90. + res / 2., 90., res)
+    lon = np.arange(res / 2., 360., res)
+
+    # meridional SST gradient
+    base = 28. * np.cos(np.deg2rad(lat))[:, np.newaxis] - 1.
+    base = np.broadcast_to(base, (lat.size, lon.size))
+
+    files = []
+
+    for dd in pd.DatetimeIndex(dates).normalize().unique():
+
+        noise = rng.standard_normal((lat.size, lon.size))
+        sst = (base + .3 * noise).astype(np.float32)
+
+        ds = xr.Dataset({'sst': (('time', 'zlev', 'lat', 'lon'),
+                                 sst[np.newaxis, np.newaxis])},
+                        coords={'time': [dd], 'zlev': [0.],
+                                'lat': lat, 'lon': lon})
+
+        fname = os.path.join(outdir, '{0}{1:02d}'.format(dd.year, dd.month),
+                             'avhrr-only-v2.{0}{1:02d}{2:02d}.nc'.format(
+                                 dd.year, dd.month, dd.day))
+        _makedirs(fname)
+        ds.to_netcdf(fname)
+        files.append(fname)
+
+    return files
+
+
+#%%
+def _makedirs(fname):
+    '''
+    Create the directory of file fname if it does not exist.
+    '''
+
+    dirname = os.path.dirname(fname)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
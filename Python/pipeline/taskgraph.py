@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+""" Dependency-aware task graph with content-hash caching
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+A small make-like runner. Each task declares its input and output files and
+the function which creates the outputs from the inputs. A task only runs if
+
+- one of its outputs does not exist (tasks without inputs, e.g. downloads,
+  only run in this case),
+- the content (SHA-256 hash) of one of its inputs changed since the last run,
+- or its arguments changed.
+
+Tasks depend on the tasks which produce their input files. Tasks which do not
+depend on each other (e.g. the figures of different variables or the downloads
+of different glider deployments) run in parallel worker processes.
+
+The hashes of the last successful run are stored in .pipeline_state.json in
+the working directory.
+"""
+
+#%% Import all packages which we will need
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+import time
+
+from pipeline import instrument
+
+# name of the file with the hashes of the last run
+STATE_FILE = '.pipeline_state.json'
+
+
+#%%
+class Task(object):
+    '''
+    A step of the pipeline which creates output files from input files.
+
+    Input:
+    - name: unique name of the task
+    - func: module-level function (must be picklable for parallel runs)
+    - inputs: list of input files
+    - outputs: list of output files
+    - (optional) args: tuple of positional arguments of func
+    - (optional) kwargs: dictionary of keyword arguments of func
+    '''
+
+    def __init__(self, name, func, inputs, outputs, args=(), kwargs=None):
+
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+
+    def signature(self):
+        '''
+        Return a hash of the function and its arguments.
+        '''
+
+        text = '{0}.{1}|{2!r}|{3!r}'.format(self.func.__module__,
+                                            self.func.__name__, self.args,
+                                            sorted(self.kwargs.items()))
+
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def __repr__(self):
+        return 'Task({!r})'.format(self.name)
+
+
+#%%
+def file_hash(fname, cache, chunk=1024 * 1024):
+    '''
+    Return the SHA-256 hash of a file. Hashes are cached by (size, mtime), so
+    large files are only read again if they were modified.
+
+    Input:
+    - fname: name of file
+    - cache: dictionary fname -> [size, mtime, hash], updated in place
+    - (optional) chunk: number of bytes read at once
+    '''
+
+    stat = os.stat(fname)
+    key = [stat.st_size, stat.st_mtime_ns]
+
+    if fname in cache and cache[fname][:2] == key:
+        return cache[fname][2]
+
+    sha = hashlib.sha256()
+    with open(fname, 'rb') as f:
+        for block in iter(lambda: f.read(chunk), b''):
+            sha.update(block)
+
+    cache[fname] = key + [sha.hexdigest()]
+
+    return cache[fname][2]
+
+
+#%%
+def _execute(task):
+    '''
+    Run a task (in a worker process) and return its wall time in seconds.
+    '''
+
+    t0 = time.perf_counter()
+    task.func(*task.args, **task.kwargs)
+
+    return time.perf_counter() - t0
+
+
+#%%
+class TaskGraph(object):
+    '''
+    Collection of tasks whose dependencies are given by their files.
+    '''
+
+    def __init__(self, tasks=()):
+
+        self.tasks = collections.OrderedDict()
+        for task in tasks:
+            self.add(task)
+
+    def add(self, task):
+        '''
+        Add a task to the graph.
+        '''
+
+        if task.name in self.tasks:
+            raise ValueError('Duplicate task name: {}'.format(task.name))
+
+        self.tasks[task.name] = task
+
+        return task
+
+    def producers(self):
+        '''
+        Return a dictionary output file -> name of the producing task.
+        '''
+
+        prod = {}
+        for task in self.tasks.values():
+            for fname in task.outputs:
+                if fname in prod:
+                    raise ValueError('{0} is created by {1} and {2}'.format(
+                        fname, prod[fname], task.name))
+                prod[fname] = task.name
+
+        return prod
+
+    def dependencies(self):
+        '''
+        Return a dictionary task name -> set of names of upstream tasks.
+        '''
+
+        prod = self.producers()
+
+        return {name: {prod[f] for f in task.inputs if f in prod}
+                for name, task in self.tasks.items()}
+
+    def select(self, targets):
+        '''
+        Return the names of the target tasks and all their upstream tasks in
+        topological order. Targets are task names or name prefixes.
+        '''
+
+        deps = self.dependencies()
+
+        # expand prefixes, e.g. 'figure' selects all figure tasks
+        if targets:
+            wanted = [n for n in self.tasks
+                      if any(n == t or n.startswith(t + ':') for t in targets)]
+            if not wanted:
+                raise KeyError('No task matches {}'.format(targets))
+        else:
+            wanted = list(self.tasks)
+
+        order = []
+        state = {}
+
+        def visit(name):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError('Dependency cycle at {}'.format(name))
+            state[name] = 'visiting'
+            for dep in sorted(deps[name]):
+                visit(dep)
+            state[name] = 'done'
+            order.append(name)
+
+        for name in wanted:
+            visit(name)
+
+        return order
+
+    def run(self, targets=None, jobs=1, force=False, dry_run=False,
+            state_file=STATE_FILE):
+        '''
+        Run all outdated tasks needed for the targets.
+
+        Input:
+        - (optional) targets: list of task names or prefixes (default: all)
+        - (optional) jobs: number of parallel worker processes
+        - (optional) force: run all selected tasks even if up to date
+        - (optional) dry_run: only report which tasks would run
+        - (optional) state_file: file with the hashes of the last run
+
+        Output:
+        - ran: list of names of the tasks which were (or would be) run
+        '''
+
+        order = self.select(targets)
+        deps = self.dependencies()
+
+        state = _load_state(state_file)
+        hashes = state.setdefault('hashes', {})
+        done = state.setdefault('tasks', {})
+
+        def outdated(name):
+            task = self.tasks[name]
+            if force or any(not os.path.exists(f) for f in task.outputs):
+                return True
+            if name not in done:
+                # like make, existing outputs of tasks without inputs (e.g.
+                # downloads) are up to date
+                return bool(task.inputs)
+            if done[name]['signature'] != task.signature():
+                return True
+            return any(not os.path.exists(f) or
+                       done[name]['inputs'].get(f) != file_hash(f, hashes)
+                       for f in task.inputs)
+
+        def record(name):
+            task = self.tasks[name]
+            done[name] = {'signature': task.signature(),
+                          'inputs': {f: file_hash(f, hashes)
+                                     for f in task.inputs}}
+
+        ran = []
+        pending = list(order)
+
+        if dry_run:
+            # without running, assume that the outputs of outdated upstream
+            # tasks will change
+            dirty = set()
+            for name in pending:
+                if deps[name] & dirty or outdated(name):
+                    dirty.add(name)
+                    ran.append(name)
+            return ran
+
+        executor = None
+        if jobs > 1:
+            executor = concurrent.futures.ProcessPoolExecutor(jobs)
+
+        running = {}
+        finished = set()
+
+        try:
+            while pending or running:
+
+                # submit all tasks whose upstream tasks are finished
+                for name in list(pending):
+                    if not deps[name] <= finished:
+                        continue
+                    pending.remove(name)
+
+                    # outputs of upstream tasks may have changed, so the
+                    # check is done just before the task is started (if the
+                    # upstream outputs did not change, the task is skipped)
+                    if not outdated(name):
+                        finished.add(name)
+                        continue
+
+                    _prepare_outputs(self.tasks[name])
+
+                    if executor is None:
+                        with instrument.stage('task.{}'.format(name)):
+                            _execute(self.tasks[name])
+                        print('{0:40s} done'.format(name))
+                        record(name)
+                        _save_state(state, state_file)
+                        finished.add(name)
+                        ran.append(name)
+                    else:
+                        future = executor.submit(_execute, self.tasks[name])
+                        running[future] = name
+
+                if not running:
+                    continue
+
+                # wait for at least one worker to finish
+                complete, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for future in complete:
+                    name = running.pop(future)
+                    seconds = future.result()
+                    print('{0:40s} done in {1:.2f} s'.format(name, seconds))
+                    record(name)
+                    _save_state(state, state_file)
+                    finished.add(name)
+                    ran.append(name)
+
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        return ran
+
+
+#%%
+def _prepare_outputs(task):
+    '''
+    Create the directories of the output files of a task.
+    '''
+
+    for fname in task.outputs:
+        outdir = os.path.dirname(fname)
+        if outdir and not os.path.isdir(outdir):
+            os.makedirs(outdir)
+
+
+#%%
+def _load_state(state_file):
+    '''
+    Read the hashes of the last run (empty if there was none).
+    '''
+
+    if not os.path.isfile(state_file):
+        return {}
+
+    with open(state_file) as f:
+        return json.load(f)
+
+
+#%%
+def _save_state(state, state_file):
+    '''
+    Write the hashes of the last run (atomically, so a crash does not leave a
+    corrupted state file).
+    '''
+
+    tmpfile = state_file + '.tmp'
+    with open(tmpfile, 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmpfile, state_file)
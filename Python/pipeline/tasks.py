@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+""" Task graph of the Bedford Basin and glider pipelines
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+Defines the steps of the pipelines as tasks of a TaskGraph (see taskgraph.py):
+
+    fetch:bbmp -> grid:bbmp -> weekly:bbmp -> climatology:bbmp
+                                           -> anomaly:<variable>
+                                           -> figure:<variable>
+                            -> figure:hovmoeller
+                            -> derive:bbmp -> figure:N2
+    fetch:<ID> -> store:<ID> -> animate:<ID>
+                            -> section:<ID> -> figure:section:<ID>
+
+The functions below are the actual work of each task. They are module-level
+functions, so they can be sent to worker processes, and they import the
+tutorial modules only when they are run.
+"""
+
+#%% Import all packages which we will need
+import os
+
+from pipeline import add_tutorial_paths, cli
+from pipeline.taskgraph import Task, TaskGraph
+
+# data variables of the gridded BBMP data
+BBMP_VARIABLES = ['temperature', 'salinity', 'sigmaTheta', 'oxygen']
+
+# file with the monthly climatology of the BBMP data
+BBMP_CLIM = 'data/processed/bbmp_climatology.nc'
+
+# derived (time, pressure) variables of the BBMP data
+DERIVED_VARIABLES = ['N2']
+
+
+#%%
+def fetch_bbmp(outfile):
+    '''
+    Download the aggregated BBMP profiles.
+    '''
+
+    from pipeline import fetch
+    fetch.fetch_bbmp(outfile)
+
+
+#%%
+def fetch_glider(ID, outfile):
+    '''
+    Download the raw data of a glider deployment.
+    '''
+
+    from pipeline import fetch
+    fetch.fetch_glider(ID, outfile=outfile)
+
+
+#%%
+def grid_bbmp(infile, outfile):
+    '''
+    Grid the BBMP profiles and save them as NetCDF file.
+    '''
+
+    add_tutorial_paths()
+    import analysis
+    analysis.grid_bbmp_data(infile, outfile)
+
+
+#%%
+def weekly_bbmp(infile, outfile):
+    '''
+    Regrid the gridded BBMP data onto a weekly time axis.
+    '''
+
+    from pipeline import weekly
+    weekly.get_weekly(infile, outfile)
+
+
+#%%
+def climatology_bbmp(infile, outfile):
+    '''
+    Compute the monthly climatology of the weekly BBMP data (every week has
+    the same weight).
+    '''
+
+    import xarray as xr
+
+    with xr.open_dataset(infile) as ds:
+        clim = ds.groupby('time.month').mean(dim='time')
+        clim.to_netcdf(outfile)
+
+
+#%%
+def derive_bbmp(infile, outfile):
+    '''
+    Compute N2, mixed-layer depth etc. of the gridded BBMP data.
+    '''
+
+    from pipeline import derived
+    derived.derive_file(infile, outfile)
+
+
+#%%
+def anomalies(ds, climfile):
+    '''
+    Anomalies of a dataset from the monthly climatology in climfile.
+    '''
+
+    import xarray as xr
+
+    with xr.open_dataset(climfile) as clim:
+        anom = ds.groupby('time.month') - clim
+
+    return anom.drop_vars('month')
+
+
+#%%
+def _save_hovmoeller(ds, vname, outfile):
+    '''
+    Plot the Hovmoeller diagram of one variable into its own figure.
+    '''
+
+    add_tutorial_paths()
+    import analysis
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(7.5, 3.))
+    pcm = analysis.plot_hovmoeller(ds, vname, ax)
+    fig.colorbar(pcm, ax=ax)
+    ax.invert_yaxis()
+    fig.tight_layout()
+    fig.savefig(outfile)
+    plt.close(fig)
+
+
+#%%
+def plot_variable(infile, vname, outfile, climfile=None):
+    '''
+    Plot the Hovmoeller diagram of one variable (or of its anomalies from the
+    monthly climatology if climfile is given).
+    '''
+
+    import xarray as xr
+
+    from pipeline import qc
+
+    ds = qc.mask_dataset(xr.open_dataset(infile))
+
+    if climfile is not None:
+        ds = anomalies(ds, climfile)
+
+    _save_hovmoeller(ds, vname, outfile)
+
+    ds.close()
+
+
+#%%
+def _plot_shared(key, vname, outfile):
+    '''
+    Plot one variable of a dataset shared by a SharedPool.
+    '''
+
+    from pipeline import sharedpool
+    _save_hovmoeller(sharedpool.get(key), vname, outfile)
+
+
+#%%
+def plot_variables(infile, variables=BBMP_VARIABLES, climfile=None,
+                   jobs=None, figdir='figures'):
+    '''
+    Plot the Hovmoeller diagrams of several variables in parallel. The data
+    are read once and shared with the worker processes (see sharedpool.py)
+    instead of being read by each task as in plot_variable().
+
+    Input:
+    - infile: NetCDF file with gridded BBMP data
+    - (optional) variables: list of variables
+    - (optional) climfile: plot the anomalies from this climatology
+    - (optional) jobs: number of worker processes
+    - (optional) figdir: directory of the figures
+
+    Output:
+    - outfiles: list of figure names (bbmp_<variable>[_anomalies].png)
+    '''
+
+    import xarray as xr
+
+    from pipeline import qc, sharedpool
+
+    suffix = '' if climfile is None else '_anomalies'
+    outfiles = [os.path.join(figdir, 'bbmp_{0}{1}.png'.format(vname, suffix))
+                for vname in variables]
+
+    if figdir and not os.path.isdir(figdir):
+        os.makedirs(figdir)
+
+    ds = qc.mask_dataset(xr.load_dataset(infile))[list(variables)]
+    if climfile is not None:
+        ds = anomalies(ds, climfile)
+
+    with sharedpool.SharedPool({'bbmp': ds}, jobs=jobs) as pool:
+        list(pool.map(_plot_shared, ['bbmp'] * len(outfiles), variables,
+                      outfiles))
+
+    return outfiles
+
+
+#%%
+def plot_all(infile, outfile):
+    '''
+    Plot the Hovmoeller diagrams of all variables in one figure.
+    '''
+
+    add_tutorial_paths()
+    import analysis
+    import matplotlib
+    matplotlib.use('Agg')
+    import xarray as xr
+
+    with xr.open_dataset(infile) as ds:
+        analysis.plot_hovmoeller_figure(ds, outfile)
+
+
+#%%
+def store_glider(ID, infile, outfile):
+    '''
+    Convert the raw glider data to an HDF5 store (data/raw/<ID>.h5).
+    '''
+
+    add_tutorial_paths()
+    import tutorial_05
+    tutorial_05.get_glider_data(ID, infile=infile, outfile=outfile)
+
+
+#%%
+def leg_dates(infile, outfile):
+    '''
+    Write the days of the outward leg of a deployment (one date per line).
+    The file only changes when the leg reaches a new day, so the OISST data
+    (fetch_oisst) are not downloaded again for each new row of a realtime
+    deployment.
+    '''
+
+    import pandas as pd
+
+    from pipeline import segment
+
+    df = pd.read_hdf(infile)
+    df = df.iloc[:segment.legs(df)['stop'].iloc[0]]
+
+    with open(outfile, 'w') as f:
+        for day in df.index.normalize().unique():
+            f.write('{:%Y-%m-%d}\n'.format(day))
+
+
+#%%
+def fetch_oisst(infile, outfile):
+    '''
+    Download the OISST data of the days in infile (see leg_dates) and save
+    them as the file which glider_sst_animation() reads.
+    '''
+
+    add_tutorial_paths()
+    import pandas as pd
+    import tutorial_05
+
+    with open(infile) as f:
+        dates = pd.DatetimeIndex(f.read().split())
+
+    sst = tutorial_05.get_oisst(dates, outfile=outfile)
+    sst.to_netcdf(outfile)
+
+
+#%%
+def animate_glider(ID):
+    '''
+    Create the glider and OISST animation of a deployment.
+    '''
+
+    add_tutorial_paths()
+    import matplotlib
+    matplotlib.use('Agg')
+    import tutorial_05
+    tutorial_05.glider_sst_animation(ID)
+
+
+#%%
+def section_glider(ID, infile):
+    '''
+    Build the along-track section of a deployment (data/processed/).
+    '''
+
+    from pipeline import section
+    section.get_section(ID, infile=infile)
+
+
+#%%
+def plot_section(ID, infile, outfile):
+    '''
+    Plot the temperature section of a deployment.
+    '''
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import xarray as xr
+
+    from pipeline import section
+    with xr.open_dataset(infile) as ds:
+        ax = section.plot_section(ds, 'temperature', outfile)
+    plt.close(ax.figure)
+
+
+#%%
+def build_graph(deployments=(cli.GLIDER_ID,), variables=BBMP_VARIABLES):
+    '''
+    Create the task graph of the BBMP pipeline and of the glider pipeline for
+    a number of glider deployments.
+
+    Input:
+    - (optional) deployments: list of glider deployment IDs
+    - (optional) variables: list of BBMP variables to plot
+
+    Output:
+    - graph: TaskGraph
+    '''
+
+    from pipeline import section
+
+    graph = TaskGraph()
+
+    # Bedford Basin Monitoring Program
+    graph.add(Task('fetch:bbmp', fetch_bbmp, [], [cli.BBMP_CSV],
+                   args=(cli.BBMP_CSV,)))
+    graph.add(Task('grid:bbmp', grid_bbmp, [cli.BBMP_CSV], [cli.BBMP_NC],
+                   args=(cli.BBMP_CSV, cli.BBMP_NC)))
+    graph.add(Task('weekly:bbmp', weekly_bbmp, [cli.BBMP_NC],
+                   [cli.BBMP_WEEKLY], args=(cli.BBMP_NC, cli.BBMP_WEEKLY)))
+    graph.add(Task('climatology:bbmp', climatology_bbmp, [cli.BBMP_WEEKLY],
+                   [BBMP_CLIM], args=(cli.BBMP_WEEKLY, BBMP_CLIM)))
+    graph.add(Task('figure:hovmoeller', plot_all, [cli.BBMP_NC],
+                   [cli.BBMP_FIG], args=(cli.BBMP_NC, cli.BBMP_FIG)))
+
+    for vname in variables:
+        fig = 'figures/bbmp_{}.png'.format(vname)
+        graph.add(Task('figure:' + vname, plot_variable, [cli.BBMP_WEEKLY],
+                       [fig], args=(cli.BBMP_WEEKLY, vname, fig)))
+
+        fig = 'figures/bbmp_{}_anomalies.png'.format(vname)
+        graph.add(Task('anomaly:' + vname, plot_variable,
+                       [cli.BBMP_WEEKLY, BBMP_CLIM], [fig],
+                       args=(cli.BBMP_WEEKLY, vname, fig, BBMP_CLIM)))
+
+    # derived variables
+    graph.add(Task('derive:bbmp', derive_bbmp, [cli.BBMP_NC],
+                   [cli.BBMP_DERIVED], args=(cli.BBMP_NC, cli.BBMP_DERIVED)))
+
+    for vname in DERIVED_VARIABLES:
+        fig = 'figures/bbmp_{}.png'.format(vname)
+        graph.add(Task('figure:' + vname, plot_variable, [cli.BBMP_DERIVED],
+                       [fig], args=(cli.BBMP_DERIVED, vname, fig)))
+
+    # glider deployments
+    for ID in deployments:
+        raw = 'data/raw/{}.csvp'.format(ID)
+        h5 = 'data/raw/{}.h5'.format(ID)
+        days = 'data/raw/{}_outward_dates.txt'.format(ID)
+        sst = 'data/raw/oisst_{}_outward.nc'.format(ID)
+        mp4 = os.path.join('animations', '{}.mp4'.format(ID))
+
+        graph.add(Task('fetch:' + ID, fetch_glider, [], [raw], args=(ID, raw)))
+        graph.add(Task('store:' + ID, store_glider, [raw], [h5],
+                       args=(ID, raw, h5)))
+        graph.add(Task('dates:' + ID, leg_dates, [h5], [days],
+                       args=(h5, days)))
+        graph.add(Task('oisst:' + ID, fetch_oisst, [days], [sst],
+                       args=(days, sst)))
+        graph.add(Task('animate:' + ID, animate_glider, [h5, sst], [mp4],
+                       args=(ID,)))
+
+        nc = section.section_file(ID)
+        fig = 'figures/{}_section_temperature.png'.format(ID)
+        graph.add(Task('section:' + ID, section_glider, [h5], [nc],
+                       args=(ID, h5)))
+        graph.add(Task('figure:section:' + ID, plot_section, [nc], [fig],
+                       args=(ID, nc, fig)))
+
+    return graph
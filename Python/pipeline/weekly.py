@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+""" Regridding of the irregular BBMP casts onto a weekly time axis
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+The BBMP casts are taken roughly once a week, but with gaps of several weeks
+and some weeks with more than one cast. pcolormesh() stretches each cast
+until the next one, and ds.groupby('time.month') gives months with more
+casts more weight. Here the cube is put on a uniform time axis with one
+value every 7 days, for all pressure levels at once:
+
+- method='linear': linear interpolation between the two casts around each
+  week. The weights come from np.searchsorted() on the cast times, and a
+  value is only used if the nearer of the two casts has one,
+- method='bin': mean of the casts within each week.
+
+Weeks which are not covered by the data (the casts around them are more than
+max_gap apart, or there is no cast in the week) are NaN and flagged by the
+coordinate 'gap'. The weekly cube is saved as NetCDF file next to the input
+(data/processed/bbmp_weekly.nc), so climatologies, anomalies and plots can
+use it without regridding again:
+
+    from pipeline import weekly
+
+    ds = weekly.get_weekly('data/raw/bedford_basin_monitoring_program.nc')
+    clim = ds.groupby('time.month').mean(dim='time')
+"""
+
+#%% Import all packages which we will need
+import os
+
+import numpy as np
+import pandas as pd
+
+from pipeline import instrument, qc
+
+# weekly cube of the BBMP data
+WEEKLY_FILE = 'data/processed/bbmp_weekly.nc'
+
+# spacing of the time axis
+WEEK = pd.Timedelta(days=7)
+
+# largest time between two casts which are interpolated
+MAX_GAP = pd.Timedelta(days=21)
+
+# regridding methods
+METHODS = ['linear', 'bin']
+
+
+#%%
+def _ns(time):
+    '''
+    Times as int64 nanoseconds.
+    '''
+
+    return np.asarray(time, dtype='datetime64[ns]').view(np.int64)
+
+
+#%%
+def weekly_axis(time, freq=WEEK):
+    '''
+    Uniform time axis from the day of the first time, which covers all times
+    within half a step.
+
+    Input:
+    - time: array of datetime64 values
+    - (optional) freq: spacing of the axis
+
+    Output:
+    - axis: pandas.DatetimeIndex()
+    '''
+
+    time = pd.DatetimeIndex(time)
+
+    return pd.date_range(time.min().normalize(),
+                         time.max() + pd.Timedelta(freq) / 2, freq=freq)
+
+
+#%%
+def linear_weights(time, axis, max_gap=MAX_GAP):
+    '''
+    Indices and weights of the casts around each time of the axis.
+
+    Input:
+    - time: sorted array of cast times (datetime64)
+    - axis: times of the new axis
+    - (optional) max_gap: largest time between the two casts
+
+    Output:
+    - i0, i1: index of the cast before and after each time
+    - w1: weight of the cast after (1 - w1 for the cast before)
+    - gap: True where the time is outside of the casts or between casts
+      more than max_gap apart
+    '''
+
+    t = _ns(time)
+    x = _ns(axis)
+
+    # a single cast is only used at its own time
+    i1 = np.clip(np.searchsorted(t, x, side='left'), 1, max(t.size - 1, 0))
+    i0 = np.maximum(i1 - 1, 0)
+
+    dt = t[i1] - t[i0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w1 = np.where(dt > 0, (x - t[i0]) / dt, 0.)
+
+    gap = ((x < t[0]) | (x > t[-1]) |
+           (dt > pd.Timedelta(max_gap).value))
+
+    return i0, i1, np.clip(w1, 0., 1.), gap
+
+
+#%%
+def _interp_linear(values, i0, i1, w1):
+    '''
+    Interpolate an array (time, ...) with the weights of linear_weights().
+    Where one of the two casts has no value, the value of the other cast is
+    used if it is the nearer one.
+    '''
+
+    w1 = w1.reshape((-1,) + (1,) * (values.ndim - 1))
+    x0 = values[i0]
+    x1 = values[i1]
+
+    new = x0 + w1 * (x1 - x0)
+
+    # only the (few) missing values are looked at again
+    bad = np.isnan(new)
+    if bad.any():
+        a0 = x0[bad]
+        a1 = x1[bad]
+        wb = np.broadcast_to(w1, new.shape)[bad]
+        new[bad] = np.where(np.isfinite(a1) & (wb >= .5), a1,
+                            np.where(wb <= .5, a0, np.nan))
+
+    return new
+
+
+#%%
+def _bins(time, axis, freq):
+    '''
+    First and one past the last cast of the bins of width freq centred on
+    the times of the axis (the casts are sorted, so the casts of a bin are
+    contiguous).
+    '''
+
+    t = _ns(time)
+    x = _ns(axis)
+    half = pd.Timedelta(freq).value // 2
+
+    return (np.searchsorted(t, x - half, side='left'),
+            np.searchsorted(t, x + half, side='left'))
+
+
+#%%
+def _bin_mean(values, start, stop):
+    '''
+    Mean of the casts in each bin of an array (time, ...), NaN in bins
+    without values.
+    '''
+
+    filled = stop > start
+    mean = np.full((start.size,) + values.shape[1:], np.nan)
+
+    if not filled.any():
+        return mean
+
+    # one sum over the casts of each non-empty bin (the bins are adjacent,
+    # so each sum ends at the start of the next non-empty bin)
+    values = values[:stop[filled][-1]]
+    ok = np.isfinite(values)
+    total = np.add.reduceat(np.where(ok, values, 0.), start[filled], axis=0)
+    count = np.add.reduceat(ok, start[filled], axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean[filled] = np.where(count > 0, total / count, np.nan)
+
+    return mean
+
+
+#%%
+def regrid(ds, method='linear', freq=WEEK, max_gap=MAX_GAP):
+    '''
+    Regrid the casts of a (time, ...) dataset onto a uniform time axis.
+
+    Input:
+    - ds: xarray.Dataset() with a time dimension (e.g. the gridded BBMP data)
+    - (optional) method: 'linear' or 'bin'
+    - (optional) freq: spacing of the time axis
+    - (optional) max_gap: largest time between casts which are interpolated
+      (method='linear')
+
+    Output:
+    - dsw: xarray.Dataset() on the new time axis with the coordinates
+      'gap' (True for weeks without data) and 'ncasts' (number of casts
+      within half a week)
+    '''
+
+    import xarray as xr
+
+    if method not in METHODS:
+        raise ValueError('unknown method {0!r}, use one of {1}'.format(
+            method, METHODS))
+
+    ds = ds.sortby('time')
+    time = ds['time'].values
+    axis = weekly_axis(time, freq)
+
+    with instrument.stage('weekly.regrid.{}'.format(method)) as st:
+
+        start, stop = _bins(time, axis, freq)
+        ncasts = stop - start
+
+        if method == 'linear':
+            i0, i1, w1, gap = linear_weights(time, axis, max_gap)
+        else:
+            gap = ncasts == 0
+
+        data = {}
+        for vname, da in ds.data_vars.items():
+
+            if 'time' not in da.dims:
+                data[vname] = da
+                continue
+
+            da = da.transpose('time', ...)
+            values = da.values.astype(float)
+
+            if method == 'linear':
+                new = _interp_linear(values, i0, i1, w1)
+                new[gap] = np.nan
+            else:
+                new = _bin_mean(values, start, stop)
+
+            if da.dtype.kind == 'f':
+                new = new.astype(da.dtype)
+
+            data[vname] = (da.dims, new, da.attrs)
+            st.add_bytes(values.nbytes)
+
+        coords = {name: c for name, c in ds.coords.items()
+                  if 'time' not in c.dims}
+        coords.update({'time': axis, 'gap': ('time', gap),
+                       'ncasts': ('time', ncasts.astype(np.int32))})
+
+        dsw = xr.Dataset(data, coords=coords, attrs=ds.attrs)
+        dsw.attrs.update({'regrid_method': method,
+                          'regrid_freq': str(pd.Timedelta(freq))})
+
+    return dsw
+
+
+#%%
+def get_weekly(infile, outfile=WEEKLY_FILE, method='linear'):
+    '''
+    Return the weekly cube of a gridded file. It is read from outfile if
+    this is newer than infile and was made with the same method, otherwise
+    it is regridded and saved.
+
+    Input:
+    - infile: NetCDF file with (time, pressure) data
+    - (optional) outfile: NetCDF file of the weekly cube
+    - (optional) method: 'linear' or 'bin'
+
+    Output:
+    - ds: xarray.Dataset() on the weekly axis
+    '''
+
+    import xarray as xr
+
+    from pipeline import storage
+
+    if (os.path.isfile(outfile) and
+            os.path.getmtime(outfile) >= os.path.getmtime(infile)):
+        with instrument.stage('weekly.read_netcdf') as st:
+            ds = xr.load_dataset(outfile)
+            st.add_bytes(os.path.getsize(outfile))
+        if ds.attrs.get('regrid_method') == method:
+            return ds
+
+    with xr.open_dataset(infile) as ds:
+        dsw = regrid(qc.mask_dataset(ds.load()), method=method)
+
+    with instrument.stage('weekly.write_netcdf') as st:
+        st.add_bytes(storage.write_netcdf(dsw, outfile))
+
+    return dsw
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+""" Tests of the resumable downloads of pipeline/fetch.py
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+The downloads are run against the local stand-in servers of
+pipeline/standins.py, which drop connections in the middle of a transfer.
+Run from the Python directory:
+
+    python -m pytest tests
+"""
+
+#%% Import all packages which we will need
+import hashlib
+import os
+import time
+
+import pytest
+
+from pipeline import fetch, standins
+
+# size of the served file, and distance of the dropped connections
+SIZE = 350000
+DROP_AFTER = 100000
+
+
+#%%
+def _serve(tmp_path, data, fname='profiles.csv'):
+    '''
+    Write the file which is served and return the directory.
+    '''
+
+    srvdir = tmp_path / 'server'
+    srvdir.mkdir(exist_ok=True)
+    (srvdir / fname).write_bytes(data)
+
+    return str(srvdir)
+
+
+@pytest.fixture
+def data():
+    return os.urandom(SIZE)
+
+
+@pytest.fixture(params=['http', 'ftp'])
+def flaky(request):
+    '''
+    Function which serves a directory with dropped connections and yields
+    the URL of a file in it.
+    '''
+
+    if request.param == 'ftp':
+        pytest.importorskip('pyftpdlib')
+
+        def serve(srvdir, fname, ndrops=3):
+            server = standins.serve_ftp(srvdir, drop_after=DROP_AFTER,
+                                        ndrops=ndrops)
+            with server as (host, port):
+                yield 'ftp://{0}:{1}/{2}'.format(host, port, fname)
+    else:
+        def serve(srvdir, fname, ndrops=3):
+            server = standins.serve_flaky(srvdir, drop_after=DROP_AFTER,
+                                          ndrops=ndrops)
+            with server as url:
+                yield '{0}/{1}'.format(url, fname)
+
+    return serve
+
+
+#%%
+def test_resume_after_drop(tmp_path, data, flaky, capsys):
+
+    srvdir = _serve(tmp_path, data)
+    outfile = str(tmp_path / 'profiles.csv')
+
+    for url in flaky(srvdir, 'profiles.csv'):
+        fetch.download(url, outfile,
+                       sha256=hashlib.sha256(data).hexdigest())
+
+    with open(outfile, 'rb') as f:
+        assert f.read() == data
+    assert not os.path.exists(outfile + '.part')
+    assert not os.path.exists(outfile + '.part.validator')
+    assert capsys.readouterr().err.count('resuming at byte') == 3
+
+
+#%%
+def test_checksum_mismatch(tmp_path, data, flaky):
+
+    srvdir = _serve(tmp_path, data)
+    outfile = str(tmp_path / 'profiles.csv')
+
+    for url in flaky(srvdir, 'profiles.csv'):
+        with pytest.raises(fetch.VerificationError, match='SHA-256'):
+            fetch.download(url, outfile, sha256='0' * 64)
+
+    assert not os.path.exists(outfile)
+    assert not os.path.exists(outfile + '.part')
+    assert not os.path.exists(outfile + '.part.validator')
+
+
+#%%
+def test_resume_earlier_run(tmp_path, data, flaky):
+
+    srvdir = _serve(tmp_path, data)
+    outfile = str(tmp_path / 'profiles.csv')
+
+    for url in flaky(srvdir, 'profiles.csv', ndrops=1):
+        # the first run stops at the dropped connection
+        with pytest.raises(fetch.VerificationError):
+            fetch.download(url, outfile, retries=0)
+        assert os.path.getsize(outfile + '.part') == DROP_AFTER
+
+        fetch.download(url, outfile, retries=0,
+                       sha256=hashlib.sha256(data).hexdigest())
+
+    with open(outfile, 'rb') as f:
+        assert f.read() == data
+
+
+#%%
+def test_stale_part(tmp_path, data, flaky, capsys):
+
+    srvdir = _serve(tmp_path, data)
+    outfile = str(tmp_path / 'profiles.csv')
+    new = os.urandom(SIZE + 1000)
+
+    for url in flaky(srvdir, 'profiles.csv', ndrops=1):
+        with pytest.raises(fetch.VerificationError):
+            fetch.download(url, outfile, retries=0)
+
+        # the remote file changes between the runs (FTP's MDTM only has a
+        # resolution of seconds)
+        fname = _serve(tmp_path, new)
+        mtime = os.path.getmtime(os.path.join(fname, 'profiles.csv')) + 10
+        os.utime(os.path.join(fname, 'profiles.csv'), (mtime, mtime))
+
+        fetch.download(url, outfile, retries=1,
+                       sha256=hashlib.sha256(new).hexdigest())
+
+    with open(outfile, 'rb') as f:
+        assert f.read() == new
+    assert 'changed, restarting at byte 0' in capsys.readouterr().err
+
+
+#%%
+def test_part_without_validator(tmp_path, data, flaky):
+
+    srvdir = _serve(tmp_path, data)
+    outfile = str(tmp_path / 'profiles.csv')
+
+    # a .part file of which the remote file is unknown is not resumed
+    with open(outfile + '.part', 'wb') as f:
+        f.write(b'x' * DROP_AFTER)
+
+    for url in flaky(srvdir, 'profiles.csv', ndrops=0):
+        fetch.download(url, outfile, sha256=hashlib.sha256(data).hexdigest())
+
+    with open(outfile, 'rb') as f:
+        assert f.read() == data
+
+
+#%%
+def test_open_url(tmp_path, data, flaky):
+
+    srvdir = _serve(tmp_path, data)
+    outfile = str(tmp_path / 'profiles.csv')
+
+    for url in flaky(srvdir, 'profiles.csv'):
+        with fetch.open_url(url, outfile, chunk=4096) as src:
+            assert src.read() == data
+
+    assert os.path.exists(outfile)
+
+
+#%%
+def test_open_url_close_early(tmp_path, data, flaky, capsys):
+
+    srvdir = _serve(tmp_path, data)
+    outfile = str(tmp_path / 'profiles.csv')
+
+    for url in flaky(srvdir, 'profiles.csv', ndrops=0):
+        src = fetch.open_url(url, outfile, chunk=1024, maxsize=2)
+        assert src.read(1000) == data[:1000]
+
+        # the download stops without reconnecting
+        tic = time.perf_counter()
+        src.close()
+        assert time.perf_counter() - tic < 1.
+
+    assert not os.path.exists(outfile)
+    assert 'retry' not in capsys.readouterr().err
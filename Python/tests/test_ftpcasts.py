@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+""" Tests of the FTP client of pipeline/ftpcasts.py
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+The per-cast BBMP files are written with pipeline/synthetic.py and served by
+the local FTP stand-in of pipeline/standins.py. Run from the Python
+directory:
+
+    python -m pytest tests
+"""
+
+#%% Import all packages which we will need
+import os
+
+import pytest
+
+from pipeline import ftpcasts, standins, synthetic
+
+pytest.importorskip('pyftpdlib')
+
+# number of casts (one per week, so they span two years)
+NCASTS = 60
+
+
+#%%
+@pytest.fixture
+def server(tmp_path):
+    '''
+    Serve synthetic cast files and yield (host, port, files).
+    '''
+
+    srvdir = str(tmp_path / 'server')
+    files = synthetic.write_bbmp_casts(
+        os.path.join(srvdir, ftpcasts.BBMP_CSV_DIR), NCASTS)
+
+    with standins.serve_ftp(srvdir) as (host, port):
+        yield host, port, files
+
+
+#%%
+def _years(files):
+
+    return sorted({int(os.path.basename(os.path.dirname(f))) for f in files})
+
+
+#%%
+def test_list_years(server):
+
+    host, port, files = server
+
+    with ftpcasts.CastClient(host, port, nsessions=2) as client:
+        paths = client.list_years(_years(files))
+
+    assert len(_years(files)) == 2
+    assert paths == sorted('{0}/{1}'.format(os.path.basename(
+        os.path.dirname(f)), os.path.basename(f)) for f in files)
+
+
+#%%
+def test_read_casts(server):
+
+    host, port, files = server
+
+    with ftpcasts.CastClient(host, port, nsessions=4) as client:
+        casts = client.read_casts(client.list_years(_years(files)))
+
+    assert len(casts) == NCASTS
+    for fname in files:
+        cast_id = os.path.splitext(os.path.basename(fname))[0]
+        with open(fname, 'rb') as f:
+            expected = ftpcasts.read_cast_csv(f)
+        assert casts[cast_id].equals(expected)
+
+
+#%%
+def test_parser_error_discards_session(server):
+
+    host, port, files = server
+
+    def broken(f):
+        # stop in the middle of the transfer
+        f.read(100)
+        raise ValueError('broken cast file')
+
+    with ftpcasts.CastClient(host, port, nsessions=1) as client:
+        path = client.list_year(_years(files)[0])[0]
+        assert client._nopen == 1
+
+        with pytest.raises(ValueError, match='broken'):
+            client.read_cast(path, broken)
+
+        # the session is closed, the next read logs in again
+        assert client._nopen == 0
+        assert client._idle.empty()
+
+        cast = client.read_cast(path)
+        assert client._nopen == 1
+
+    with open(os.path.join(os.path.dirname(files[0]), '..', path), 'rb') as f:
+        assert cast.equals(ftpcasts.read_cast_csv(f))
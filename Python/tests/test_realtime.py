@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+""" Tests of the realtime tail-follow of pipeline/realtime.py
+
+Follow along at: https://christophrenkl.github.io/programming_tutorials/
+
+A growing deployment is polled from the local ERDDAP stand-in of
+pipeline/standins.py. Run from the Python directory:
+
+    python -m pytest tests
+"""
+
+#%% Import all packages which we will need
+import pytest
+
+from pipeline import add_tutorial_paths, gliderstore, qc, realtime, standins
+
+pytest.importorskip('tables')
+
+# total number of rows, and the number of new rows per poll
+NROWS = 6000
+POLLS = [1500, 700, 1, 1800, 1999]
+
+
+#%%
+def test_poll_flags_like_full_download(tmp_path, monkeypatch):
+
+    add_tutorial_paths()
+    import tutorial_05
+
+    monkeypatch.chdir(tmp_path)
+    deployment = standins.GrowingDeployment('server', 'gl', NROWS)
+
+    # a spike of the temperature (column 5) in the last row of the first
+    # poll is only found with the rows of the next poll
+    deployment.df.iloc[POLLS[0] - 1, 5] += 8.
+
+    with standins.serve_erddap('server') as url:
+        for nrows in POLLS:
+            deployment.grow(nrows)
+            assert realtime.poll('gl', url) == nrows
+
+    df = gliderstore.read_store(realtime.glider_store('gl'))
+    full = tutorial_05.read_glider_csv(deployment.fname)
+
+    assert len(df) == NROWS
+    assert (df.index == full.index).all()
+    for column in full:
+        if column.endswith('_qc'):
+            assert (df[column].values == full[column].values).all(), column
+    assert df['temperature_qc'].iloc[POLLS[0] - 1] == qc.FLAG_FAIL
+
+
+#%%
+def test_follow_survives_transfer_errors(tmp_path, monkeypatch, capsys):
+
+    monkeypatch.chdir(tmp_path)
+
+    # nothing listens on the port of a closed server
+    with standins.serve_erddap(str(tmp_path)) as url:
+        pass
+
+    total = realtime.follow(['gl'], base_url=url, interval=0., count=2,
+                            render=False)
+
+    assert total == {'gl': 0}
+    assert capsys.readouterr().err.count('retry at next poll') == 2
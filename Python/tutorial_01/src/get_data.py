@@ -11,8 +11,23 @@ http://www.bio.gc.ca/science/monitoring-monitorage/bbmp-pobb/bbmp-pobb-en.php
 
 # import modules
 from ftplib import FTP
+import io
 import os
 import pandas as pd
+import sys
+
+# make the shared pipeline tools in Python/pipeline importable: they are in
+# the Python directory, two levels above this script. __file__ is not defined
+# when the cells are run one by one, then start Python in the Python
+# directory or add it to PYTHONPATH.
+try:
+    import pipeline
+except ImportError:
+    if '__file__' not in globals():
+        raise
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                    '..', '..')))
+from pipeline import instrument
 
 def main():
 
@@ -37,27 +52,38 @@ def main():
     server = 'ftp.dfo-mpo.gc.ca'
     path = 'BIOWebMaster/BBMP/CSV/{}'.format(year)
     
-    # connect to DFO FTP server
-    ftp = FTP(server)
-    ftp.login()
+    with instrument.stage('bbmp_cast.ftp_list'):
+        
+        # connect to DFO FTP server
+        ftp = FTP(server)
+        ftp.login()
+    
+        # move do data directory with CSV files
+        ftp.cwd(path)
+    
+        # ftp.nlst() returns a list of all files in remote directory - choose
+        # the last one (index [-1])
+        file = ftp.nlst()[-1]
     
-    # move do data directory with CSV files
-    ftp.cwd(path)
+    # We are already connected, so we download the file over the same
+    # connection into memory instead of opening a second connection.
+    with instrument.stage('bbmp_cast.transfer_parse_csv') as st:
+        
+        buf = io.BytesIO()
+        ftp.retrbinary('RETR {}'.format(file), buf.write)
+        st.add_bytes(buf.tell())
     
-    # ftp.nlst() returns a list of all files in remote directory - choose the
-    # last one (index [-1])
-    file = ftp.nlst()[-1]
+        # close connection to FTP server
+        ftp.close()
     
-    # close connection to FTP server
-    ftp.close()
+        # read file into pandas DataFrame, skip the first 10 rows with metadata
+        buf.seek(0)
+        df = pd.read_csv(buf,
+                         skiprows=10)
     
     # create full path to file
     fname = 'ftp://{0}/{1}/{2}'.format(server, path, file)
     
-    # read file into pandas DataFrame, skip the first 10 rows with metadata
-    df = pd.read_csv(fname,
-                     skiprows=10)
-    
     # define columns to write to output file
     outvars = ['scan', 'pressure', 'temperature', 'salinity', 'sigmaTheta']
     
@@ -66,7 +92,12 @@ def main():
     outfile = os.path.join(data_dir, '{}_subset.csv'.format(cast_id))
     
     # write subset of DataFrame to output file
-    df[outvars].to_csv(outfile, index=False)
+    with instrument.stage('bbmp_cast.write_csv') as st:
+        df[outvars].to_csv(outfile, index=False)
+        st.add_bytes(os.path.getsize(outfile))
+    
+    # write timing and memory report of this run
+    instrument.write_report('reports/get_data.json')
     
 
 if __name__ == "__main__":
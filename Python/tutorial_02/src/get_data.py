@@ -7,6 +7,20 @@ This script downloads data of a glider mission and store it as a .csv file.
 
 import os
 import pandas as pd
+import sys
+
+# make the shared pipeline tools in Python/pipeline importable: they are in
+# the Python directory, two levels above this script. __file__ is not defined
+# when the cells are run one by one, then start Python in the Python
+# directory or add it to PYTHONPATH.
+try:
+    import pipeline
+except ImportError:
+    if '__file__' not in globals():
+        raise
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                    '..', '..')))
+from pipeline import instrument, qc
 
 def main():
 
@@ -31,20 +45,28 @@ def main():
     url = '{}/{}.csvp?time%2Cdepth%2Clatitude%2Clongitude%2Cconductivity%2Ctemperature%2Csalinity%2Cdensity%2Cpressure%2Cprofile_id'.format(base_url, ID)
 
     # read *.csv file from ERRDAP server 
-    df = pd.read_csv(url,
-                     header=0,
-                     names=['time', 'depth', 'lat', 'lon', 'conductivity',
-                            'temperature', 'salinity', 'density', 'pressure',
-                            'profile_id'])
+    with instrument.stage('glider.transfer_parse_csv'):
+        df = pd.read_csv(url,
+                         header=0,
+                         names=['time', 'depth', 'lat', 'lon', 'conductivity',
+                                'temperature', 'salinity', 'density',
+                                'pressure', 'profile_id'])
     
-    # only retain complete rows
-    df = df.dropna()
+    # only drop rows without time or position; bad or missing sensor values
+    # get quality flags in <variable>_qc columns instead
+    df = df.dropna(subset=['time', 'lat', 'lon'])
+    df = df.join(qc.flag_dataframe(df, qc.GLIDER_TESTS, group='profile_id'))
     
     # name of output file
     outfile = os.path.join(data_dir, '{}.csv'.format(ID))
     
     # write output file
-    df.to_csv(outfile, index=False)
+    with instrument.stage('glider.write_csv') as st:
+        df.to_csv(outfile, index=False)
+        st.add_bytes(os.path.getsize(outfile))
+    
+    # write timing and memory report of this run
+    instrument.write_report('reports/get_data.json')
 
 
 if __name__ == "__main__":
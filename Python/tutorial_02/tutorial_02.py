@@ -174,6 +174,16 @@ print(df.head())
 # can simply select all data until the day before
 dfs = df.loc[:'2015-11-07']
 
+# Aside: if you don't know the date of the turnaround, the shared pipeline
+# tools (Python/pipeline/segment.py) can split a mission into legs, i.e. parts
+# in which the glider moves away from its deployment position or back to it
+# (the Python directory of this repository has to be the working directory
+# or on sys.path to import pipeline):
+#     from pipeline import segment
+#     legs = segment.legs(df)
+# Each row of legs has the first (start) and one past the last (stop) row of
+# a leg. Note that the first leg ends at the turnaround, not at midnight.
+
 #%% Advanced Plotting
 
 # Note that we will use functions from the matplotlib package which we imported
@@ -200,6 +210,14 @@ ax.plot(df.index, df['depth'],
         color='grey',
         label='Whole Mission')
 
+# Aside: the whole mission has far more samples than the figure has pixels.
+# The shared pipeline tools (Python/pipeline/downsample.py) can plot only the
+# shallowest and deepest sample of each pixel column instead, which keeps the
+# turning points of all dives and is much faster (zooming in shows more
+# samples):
+#     from pipeline import downsample
+#     downsample.plot(ax, df.index, df['depth'], color='grey')
+
 # On the same axis, we now plot the subset of the outward leg in blue
 ax.plot(dfs.index, dfs['depth'],
         color='C0',
@@ -301,3 +319,12 @@ store.close()
 # text editor or even Microsoft Excel
 dfs.to_csv('data/processed/otn200_20151027_53_delayed_outward_leg.csv')
 
+# Aside: you can also write both at the same time. The shared pipeline tools
+# (Python/pipeline/export.py) pick the format from the file suffix (*.h5,
+# *.csv, *.nc and *.parquet) and write all files at once, so it takes about
+# as long as the slowest format:
+#     from pipeline import export
+#     export.export(dfs, ['outward_leg.h5', 'outward_leg.csv'])
+# Note that export() writes the HDF file in the compressed 'table' format
+# instead of the 'fixed' format of store.put() above.
+
@@ -12,6 +12,20 @@ http://www.bio.gc.ca/science/monitoring-monitorage/bbmp-pobb/bbmp-pobb-en.php
 # import modules
 import os
 import pandas as pd
+import sys
+
+# make the shared pipeline tools in Python/pipeline importable: they are in
+# the Python directory, two levels above this script. __file__ is not defined
+# when the cells are run one by one, then start Python in the Python
+# directory or add it to PYTHONPATH.
+try:
+    import pipeline
+except ImportError:
+    if '__file__' not in globals():
+        raise
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                    '..', '..')))
+from pipeline import dedup, instrument
 
 def main():
 
@@ -38,35 +52,48 @@ def main():
     fname = 'ftp://{0}/{1}'.format(server, file)
     
     # read file into pandas DataFrame, skip the first 10 rows with metadata
-    df = pd.read_csv(fname,
-                     usecols=[0, 6, 7, 13, 14, 15])
+    with instrument.stage('bbmp.transfer_parse_csv'):
+        df = pd.read_csv(fname,
+                         usecols=[0, 6, 7, 13, 14, 15])
         
     # convert time_string column to datetime format
-    df['time_string'] = pd.to_datetime(df['time_string'],
-                                       format='%Y-%m-%d %H:%M:%S')
+    with instrument.stage('bbmp.to_datetime'):
+        df['time_string'] = pd.to_datetime(df['time_string'],
+                                           format='%Y-%m-%d %H:%M:%S')
     
-    # set time and pressure columns as index
-    df = df.set_index(['time_string', 'pressure'])
+    # there are duplicate (time, pressure) pairs, we only keep the first
+    # occurence (see Python/pipeline/dedup.py)
+    with instrument.stage('bbmp.dedup'):
+        df, duplicates = dedup.drop_duplicates(df, 'time_string',
+                                               'pressure')
+    print(dedup.summary(duplicates))
     
-    # there are duplicate indices, we only keep the first occurence
-    df = df.loc[~df.index.duplicated(keep='first')]
+    with instrument.stage('bbmp.reindex'):
+        
+        # set time and pressure columns as index
+        df = df.set_index(['time_string', 'pressure'])
     
-    # convert DataFrame to xarray Dataset
-    ds = df.to_xarray().rename({'time_string': 'time'})
+        # convert DataFrame to xarray Dataset
+        ds = df.to_xarray().rename({'time_string': 'time'})
     
-    # only keep measurements every half meter
-    ds = ds.where((ds.pressure % .5 == 0.) &
-                  (ds.pressure <= 70.), drop=True)
+        # only keep measurements every half meter
+        ds = ds.where((ds.pressure % .5 == 0.) &
+                      (ds.pressure <= 70.), drop=True)
     
     # name of output file
     outfile = os.path.join(data_dir, 'bedford_basin_monitoring_program.nc')
     
     # write Dataset tp output file
-    ds.to_netcdf(outfile)
+    with instrument.stage('bbmp.write_netcdf') as st:
+        ds.to_netcdf(outfile)
+        st.add_bytes(os.path.getsize(outfile))
     
     # close Dataset
     ds.close()
     
+    # write timing and memory report of this run
+    instrument.write_report('reports/get_data.json')
+    
 
 if __name__ == "__main__":
     main()
@@ -257,6 +257,16 @@ clim = ds.groupby('time.month').mean(dim='time')
 # We can subtract the climatology from our original data to get anomalies
 anom = ds.groupby('time.month') - clim
 
+# Aside: the casts are not evenly spaced in time. Some months have more casts
+# than others and there are gaps of several weeks, so every cast counts the
+# same in the mean above, not every week. The shared pipeline tools
+# (Python/pipeline/weekly.py) interpolate the casts onto a weekly time axis
+# first, leaving weeks without casts nearby as NaN, so that every week counts
+# the same (the Python directory of this repository has to be on sys.path):
+#     from pipeline import weekly
+#     dsw = weekly.regrid(ds)
+#     clim = dsw.groupby('time.month').mean(dim='time')
+
 # Define a variable with the year of interest
 year = '2018'
 
@@ -11,13 +11,28 @@ mistakes or issues, please report them to christoph.renkl@dal.ca.
 """
 
 #%% Import all packages which we will need
-import cmocean.cm as cmo
-import matplotlib.pyplot as plt
+# Note that the plotting packages (matplotlib and cmocean) are imported inside
+# the plotting functions. This way, the download and gridding functions can be
+# used without paying for the (slow) import of the plotting packages.
 import numpy as np
 import os
 import pandas as pd
+import sys
 import xarray as xr
 
+# make the shared pipeline tools in Python/pipeline importable: they are in
+# the Python directory, two levels above this script. __file__ is not defined
+# when the cells are run one by one, then start Python in the Python
+# directory or add it to PYTHONPATH.
+try:
+    import pipeline
+except ImportError:
+    if '__file__' not in globals():
+        raise
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                    '..', '..')))
+from pipeline import dedup, fetch, instrument, kernels, qc, storage
+
 #%% Master script (function) to run data analysis
 def main():
 
@@ -35,7 +50,9 @@ def main():
     if os.path.isfile(os.path.join(rawdir, fname)):
         
         # open existing data file as xarray.Dataset()
-        ds =  xr.open_dataset(os.path.join(rawdir, fname))
+        with instrument.stage('bbmp.open_netcdf') as st:
+            ds =  xr.open_dataset(os.path.join(rawdir, fname))
+            st.add_bytes(os.path.getsize(os.path.join(rawdir, fname)))
         
     else:
         
@@ -43,19 +60,42 @@ def main():
         ds = download_bbmp_data(fname)
 
     # PLOTTING ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-        
+    plot_hovmoeller_figure(ds, 'figures/bbmp_hovmeoller_diagrams.png')
+    
+    # write timing and memory report of this run
+    instrument.write_report('reports/analysis.json')
+    
+    return
+
+
+#%%
+def plot_hovmoeller_figure(ds, outfile):
+    '''
+    Plot Hovmoeller diagrams of all data variables in one figure and save it.
+    
+    Input:
+    - ds: xarray.Dataset with data
+    - outfile: filename of the figure
+    '''
+    
+    import matplotlib.pyplot as plt
+    
     # define the name of the subfolder for figures
-    figdir = 'figures'
+    figdir = os.path.dirname(outfile)
     
     # use the isdir() function from os package
-    if not os.path.isdir(figdir):
+    if figdir and not os.path.isdir(figdir):
         os.makedirs(figdir)
     
     # The idea is to plot a Hovmoeller diagram (variable as function of depth
     # and time) for all data variables in ds.
     
-    # get names of all data variables
-    dvars = list(ds.data_vars)
+    # values which fail the quality control are not plotted
+    ds = qc.mask_dataset(ds)
+    
+    # get names of all data variables which are functions of depth and time
+    # (e.g. not the mixed-layer depth of Python/pipeline/derived.py)
+    dvars = [v for v in ds.data_vars if ds[v].dims == ('time', 'pressure')]
     
     # Create a figure with as many axes as variables in ds
     fig, axs = plt.subplots(nrows=len(dvars), ncols=1,
@@ -64,10 +104,11 @@ def main():
     
     # plot Hovmoeller diagrams
     for ii, vname in enumerate(dvars):
-        pcm = plot_hovmoeller(ds, vname, axs[ii])
+        with instrument.stage('bbmp.plot.{}'.format(vname)):
+            pcm = plot_hovmoeller(ds, vname, axs[ii])
     
-        # colorbar
-        fig.colorbar(pcm, ax=axs[ii])
+            # colorbar
+            fig.colorbar(pcm, ax=axs[ii])
 
     # invert y-axes
     axs[ii].invert_yaxis()
@@ -77,9 +118,12 @@ def main():
     fig.tight_layout()
     
     # save figure
-    fig.savefig('figures/bbmp_hovmeoller_diagrams.png')
+    with instrument.stage('bbmp.savefig') as st:
+        fig.savefig(outfile)
+        st.add_bytes(os.path.getsize(outfile))
     
-    return
+    # free the memory of the figure
+    plt.close(fig)
 
 
 #%% 
@@ -95,6 +139,8 @@ def plot_hovmoeller(ds, vname, ax):
     Output:
     - pcm: handle to pcolormesh plot
     '''
+    
+    import cmocean.cm as cmo
 
     # Create an if-statement
     if vname == 'temperature':
@@ -125,6 +171,14 @@ def plot_hovmoeller(ds, vname, ax):
         vmin = ds[vname].min()
         vmax = ds[vname].max()
         
+    elif vname == 'N2':
+        # derived variable, see Python/pipeline/derived.py
+        units = r'[s$^{-2}$]'
+        name = r'Buoyancy Frequency $N^2$'
+        cmap = cmo.amp
+        vmin = 0.
+        vmax = ds[vname].quantile(.99)
+        
     else:
         units = ''
         name = vname.capitalize()
@@ -150,13 +204,15 @@ def plot_hovmoeller(ds, vname, ax):
 
 
 #%% 
-def download_bbmp_data(outfile):
+def download_bbmp_data(outfile, url=None):
     '''
     Downloads Bedford Basin Monitoring Program data from the FTP server at
     Bedford Institute for Oceanography and saves it as NetCDF file.
     
     Input:
     - outfile: name of output data file
+    - (optional) url: location of the aggregated CSV file, defaults to the
+      file on the DFO FTP server
     
     Output:
     - ds: xarray.Dataset() with data
@@ -178,34 +234,99 @@ def download_bbmp_data(outfile):
     file = 'BIOWebMaster/BBMP/CSV/bbmp_aggregated_profiles.csv'
        
     # create full path to file
-    fname = 'ftp://{0}/{1}'.format(server, file)
+    fname = url or 'ftp://{0}/{1}'.format(server, file)
+    
+    if '://' not in fname:
+        # read, grid and save the data of a local file
+        return grid_bbmp_data(fname, os.path.join(outdir, outfile))
+    
+    # The file is downloaded in the background (a dropped connection is
+    # resumed) and saved in data/raw, while pandas parses the data which have
+    # already arrived.
+    rawfile = os.path.join(outdir, os.path.basename(fname))
+    with fetch.open_url(fname, rawfile) as src:
+        return grid_bbmp_data(src, os.path.join(outdir, outfile))
+
+
+#%%
+def grid_bbmp_data(fname, outfile):
+    '''
+    Reads the aggregated CTD profiles of the Bedford Basin Monitoring Program,
+    grids them onto a (time, pressure) grid and saves them as NetCDF file.
+    
+    Input:
+    - fname: local file name, URL or file object of
+      bbmp_aggregated_profiles.csv
+    - outfile: name of output NetCDF file
     
-    # read file into pandas DataFrame, only use certain columns
-    df = pd.read_csv(fname,
-                     usecols=[0, 6, 7, 13, 14, 15])
+    Output:
+    - ds: xarray.Dataset() with data, their quality flags (<variable>_qc,
+      see Python/pipeline/qc.py) and the number of removed duplicate rows of
+      each cast (coordinate 'nduplicates')
+    '''
+    
+    # read file into pandas DataFrame, only use certain columns (the FTP
+    # transfer and the CSV parsing happen in the same call)
+    with instrument.stage('bbmp.transfer_parse_csv'):
+        df = pd.read_csv(fname,
+                         usecols=[0, 6, 7, 13, 14, 15])
         
     # convert time_string column to datetime format
-    df['time_string'] = pd.to_datetime(df['time_string'],
-                                       format='%Y-%m-%d %H:%M:%S')
+    with instrument.stage('bbmp.to_datetime'):
+        df['time_string'] = pd.to_datetime(df['time_string'],
+                                           format='%Y-%m-%d %H:%M:%S')
     
-    # set time and pressure columns as index
-    df = df.set_index(['time_string', 'pressure'])
+    # quality flags of the values (range, spike, gradient and density
+    # inversion tests of each cast) in <variable>_qc columns; they are
+    # gridded and saved along with the data, which are not masked (use
+    # qc.mask_dataset() when reading the file)
+    with instrument.stage('bbmp.qc'):
+        flags = qc.flag_dataframe(df, qc.BBMP_TESTS, group='time_string',
+                                  depth='pressure')
+        df = df.join(flags)
     
-    # there are duplicate indices, we only keep the first occurence
-    df = df.loc[~df.index.duplicated(keep='first')]
+    # there are duplicate (time, pressure) pairs, we only keep the first
+    # occurence (see Python/pipeline/dedup.py)
+    with instrument.stage('bbmp.dedup'):
+        df, duplicates = dedup.drop_duplicates(df, 'time_string',
+                                               'pressure')
     
-    # convert DataFrame to xarray Dataset
-    ds = df.to_xarray().rename({'time_string': 'time'})
-    
-    # only keep measurements every half meter
-    ds = ds.where((ds.pressure % .5 == 0.) &
-                  (ds.pressure <= 70.), drop=True)
+    with instrument.stage('bbmp.reindex'):
+        
+        # Put the data on a (time, pressure) grid, and only keep measurements
+        # every half meter. This is the same as
+        # 
+        #   df = df.set_index(['time_string', 'pressure'])
+        #   df = df.loc[~df.index.duplicated(keep='first')]
+        #   ds = df.to_xarray().rename({'time_string': 'time'})
+        #   ds = ds.where((ds.pressure % .5 == 0.) &
+        #                 (ds.pressure <= 70.), drop=True)
+        # 
+        # but without the overhead of pandas (see Python/pipeline/kernels.py)
+        ds = kernels.grid_profiles(
+            df, 'time_string', 'pressure',
+            keep=lambda p: (p % .5 == 0.) & (p <= 70.))
+        
+        # flags as uint8, cells without data are missing
+        for col in flags.columns:
+            ds[col] = ds[col].fillna(qc.FLAG_MISSING).astype(np.uint8)
+            ds[col].attrs.update(qc.FLAG_ATTRS)
+            ds[col[:-3]].attrs['ancillary_variables'] = col
+        
+        # number of removed duplicates of each cast
+        ndup = duplicates['nduplicates'].reindex(ds['time'].values,
+                                                 fill_value=0)
+        ds.coords['nduplicates'] = ('time', ndup.values)
     
-    # name of output file
-    outfile = os.path.join(outdir, outfile)
+    # create output directory if it doesn't exist
+    outdir = os.path.dirname(outfile)
+    if outdir and not os.path.isdir(outdir):
+        os.makedirs(outdir)
     
-    # write Dataset tp output file
-    ds.to_netcdf(outfile)
+    # write Dataset to output file, chunked and compressed for reading time
+    # series at a depth as well as single profiles
+    with instrument.stage('bbmp.write_netcdf') as st:
+        st.add_bytes(storage.write_netcdf(ds, outfile))
         
     return ds
 
@@ -11,17 +11,28 @@ mistakes or issues, please report them to christoph.renkl@dal.ca.
 """
 
 #%% Import all packages which we will need
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
-import cmocean.cm as cmo
-import matplotlib.animation as anim
-import matplotlib.pyplot as plt
-from mpl_toolkits.axes_grid1 import make_axes_locatable
+# Note that the plotting packages (cartopy, cmocean, matplotlib) are imported
+# inside animate_glider_sst(). This way, the download functions can be used
+# without paying for the (slow) import of the plotting packages.
 import numpy as np
 import os
 import pandas as pd
+import sys
 import xarray as xr
 
+# make the shared pipeline tools in Python/pipeline importable: they are in
+# the Python directory, two levels above this script. __file__ is not defined
+# when the cells are run one by one, then start Python in the Python
+# directory or add it to PYTHONPATH.
+try:
+    import pipeline
+except ImportError:
+    if '__file__' not in globals():
+        raise
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                    '..', '..')))
+from pipeline import fetch, gliderstore, instrument, qc, segment
+
 
 #%% Master script (function) to run data analysis
 def main():
@@ -30,31 +41,52 @@ def main():
     wdir = '/home/chrenkl/Projects/programming_tutorials/Python/tutorial_05/'
     os.chdir(wdir)
     
-    # directory with raw data
-    rawdir = 'data/raw'# deployment ID
-    
     # deployment ID
     ID = 'otn200_20151027_53_delayed'
     
+    # create animation of the outward leg
+    glider_sst_animation(ID)
+    
+    # write timing and memory report of this run
+    instrument.write_report('reports/tutorial_05.json')
+
+
+#%%
+def glider_sst_animation(ID):
+    '''
+    Loads the glider data and OISST data of the outward leg of a glider mission
+    and creates an animation in the animations/ directory.
+    
+    Input:
+    - ID: deployment ID of glider mission
+    '''
+    
     # A try-except block is similar to an if statement. In this case, we are
     # trying to read a data file. If the file does not exist, we download the
     # data first.
     try:
-        df = pd.read_hdf('data/raw/{}.h5'.format(ID))
+        with instrument.stage('glider.read_hdf'):
+            df = pd.read_hdf('data/raw/{}.h5'.format(ID))
     except:
-        # get data from glider mission
-        df = get_glider_data(ID)
+        # get data from glider mission - use the raw file if it was already
+        # downloaded (e.g. with 'python -m pipeline fetch glider')
+        rawfile = 'data/raw/{}.csvp'.format(ID)
+        if os.path.isfile(rawfile):
+            df = get_glider_data(ID, infile=rawfile)
+        else:
+            df = get_glider_data(ID)
     
     # The data are from a mission along the Halifax line and contain an 
-    # outbound and inbound part. Let's only focus on the former, so we find the
-    # date and time of the maximum longitude and select all the data until
-    # then.
+    # outbound and inbound part. Let's only focus on the former, so we split
+    # the mission into legs away from and back to the deployment position
+    # (made of whole dives and climbs) and select the first one.
     
-    # determine return date
-    ret_date = df['lon'].idxmax()
+    # determine the legs of the mission
+    with instrument.stage('glider.segment'):
+        legs = segment.legs(df)
     
     # subset DataFrame
-    df = df.loc[:ret_date]
+    df = df.iloc[:legs['stop'].iloc[0]]
     
     # We would like to compare the glider measurements with satellite
     # observations. OISST is a gridded dataset of sea surface temperature (SST)
@@ -67,7 +99,8 @@ def main():
     # try to open sstfile or download OISST data for the time period of the
     # glider mission.
     try:
-        sst = xr.open_dataset(sstfile)['sst']
+        with instrument.stage('oisst.open_netcdf'):
+            sst = xr.open_dataset(sstfile)['sst']
     except:
         sst = get_oisst(df.index, outfile=sstfile)
 
@@ -78,24 +111,53 @@ def main():
     
     sst = sst.sel(lon=slice(lonmin, lonmax), lat=slice(latmin, latmax))
 
-    # Visualization
-    data_crs = ccrs.PlateCarree()
-    land50 = cfeature.NaturalEarthFeature('physical', 'land', '50m',
-                                          linewidth=.5,
-                                          edgecolor=[.4, .4, .4],
-                                          facecolor=[.6, .6, .6])
+    # create animation of SST maps and the glider track
+    outfile = 'animations/{}.mp4'.format(ID)
+    animate_glider_sst(df, sst, [lonmin, lonmax, latmin, latmax], outfile)
+
+
+#%%
+def animate_glider_sst(df, sst, extent, outfile):
+    '''
+    Creates an animation of daily SST maps with the glider track on top and
+    the glider temperature section below.
+    
+    Input:
+    - df: pandas.DataFrame() with glider data
+    - sst: xr.DataArray with SST data (one frame per time step)
+    - extent: map extent [lonmin, lonmax, latmin, latmax]
+    - outfile: filename of output file (*.mp4)
+    '''
+    
+    import cartopy.crs as ccrs
+    import cmocean.cm as cmo
+    import matplotlib.animation as anim
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.axes_grid1 import make_axes_locatable
+    
+    from pipeline import coastline, sstmap
     
     # set up figure
     fig = plt.figure(figsize=(8.5, 11.))
     
     # screate axis
     ax1 = fig.add_subplot(111, projection=ccrs.PlateCarree())
-    ax1.set_extent([lonmin, lonmax, latmin, latmax], crs=ccrs.PlateCarree())
+    ax1.set_extent(extent, crs=ccrs.PlateCarree())
+    
+    # add land once: the 50m Natural Earth polygons are clipped to the map
+    # and projected only in the first run (cached in data/cache) and are
+    # drawn on top of the SST maps of all frames
+    coastline.add_land(ax1, linewidth=.5, edgecolor=[.4, .4, .4],
+                       facecolor=[.6, .6, .6])
     
     divider = make_axes_locatable(ax1)
     ax2 = divider.append_axes('bottom', size='50%', pad=0.25,
                               axes_class=plt.Axes)
     
+    # SST maps of the regular OISST grid
+    sst_map = sstmap.SSTMap(ax1, sst['lon'].values, sst['lat'].values,
+                            vmin=3., vmax=27., cmap=cmo.thermal)
+    
     frames = sst['time'].size
     
     def draw(frame):
@@ -103,12 +165,9 @@ def main():
         # get date
         date = sst['time'].isel(time=frame).values + np.timedelta64(1, 'D')       
             
-        # plot SST as contours
-        cs = ax1.contourf(sst['lon'], sst['lat'], sst.isel(time=frame), 255,
-                          vmin=3.,
-                          vmax=27.,
-                          cmap=cmo.thermal,
-                          transform=data_crs)
+        # plot SST as one image, which is only updated with the data of
+        # the next frame (instead of 255 levels of filled contours)
+        cs = sst_map.update(sst.isel(time=frame).values)
         
         # plot glider track
         track = ax1.plot(df.loc[df.index < date, 'lon'],
@@ -116,9 +175,6 @@ def main():
                          '-k',
                          linewidth=3)
 
-        # add coastlines
-        ax1.add_feature(land50)
-        
         sc = ax2.scatter(df.loc[df.index < date].index,
                          df.loc[df.index < date, 'depth'],
                          c=df.loc[df.index < date, 'temperature'],
@@ -143,30 +199,33 @@ def main():
     ani = anim.FuncAnimation(fig, animate, frames,
                               blit=False, init_func=init, repeat=True)
     
-    outfile = 'animations/{}.mp4'.format(ID)
-    
     # create output directory if it does not exist
     if not os.path.exists(os.path.dirname(outfile)):
         os.makedirs(os.path.dirname(outfile))
         
-    ani.save(outfile, writer=anim.FFMpegWriter(fps=1))
+    # rendering all frames and encoding them happens in ani.save()
+    with instrument.stage('animation.render_encode') as st:
+        ani.save(outfile, writer=anim.FFMpegWriter(fps=1))
+        st.add_bytes(os.path.getsize(outfile))
+    
+    # free the memory of the figure
+    plt.close(fig)
 
 
 #%%    
-def get_oisst(dates, outfile='data/raw/oisst.nc'):
+def get_oisst(dates, outfile='data/raw/oisst.nc',
+              base_url='http://www.ncei.noaa.gov/thredds/dodsC/OisstBase/NetCDF/AVHRR'):
     '''Downloads OISST data for specific dates and saves them locally.
     
     Input:
     - dates: pandas.DatetimeIndex() with desired dates
     - (optional) outfile: filename of output file
+    - (optional) base_url: URL or local directory with the daily OISST files
     
     Output:
     - sst: xr.DataArray with SST data for desired dates
     '''
     
-    # base URL
-    base_url = 'http://www.ncei.noaa.gov/thredds/dodsC/OisstBase/NetCDF/AVHRR'
-    
     # find unique days
     unique_dates = dates.normalize().unique()
     
@@ -181,11 +240,12 @@ def get_oisst(dates, outfile='data/raw/oisst.nc'):
         day = dd.day
         
         # add filename to list
-        files.append('{0}/{1}{2}/avhrr-only-v2.{1}{2:02d}{3:02d}.nc'.format(base_url, year, month, day))
+        files.append('{0}/{1}{2:02d}/avhrr-only-v2.{1}{2:02d}{3:02d}.nc'.format(base_url, year, month, day))
     
     # read data files
-    sst = xr.open_mfdataset(files)['sst']
-    sst = sst.drop('zlev').squeeze()
+    with instrument.stage('oisst.open_mfdataset'):
+        sst = xr.open_mfdataset(files)['sst']
+        sst = sst.drop('zlev').squeeze()
         
     # create output directory if it does not exist
     if not os.path.exists(os.path.dirname(outfile)):
@@ -197,56 +257,93 @@ def get_oisst(dates, outfile='data/raw/oisst.nc'):
     return sst
 
 #%% 
-def get_glider_data(ID):
+def get_glider_data(ID,
+                    base_url='http://belafonte.ocean.dal.ca:8080/erddap/tabledap',
+                    infile=None, outfile=None):
     '''
     Downloads data from OTN glider mission and saves them locally.
     
     Input:
     - ID: deployment ID of glider mission
+    - (optional) base_url: URL of ERDDAP tabledap server
+    - (optional) infile: local *.csvp file downloaded earlier, which is read
+      instead of the ERDDAP server
+    - (optional) outfile: name of the HDF5 store, defaults to
+      data/raw/<ID>.h5
     
     Output:
     - df: pandas.DataFrame() with glider data
     '''
     
-    # base URL of ERRDAP server
-    base_url = 'http://belafonte.ocean.dal.ca:8080/erddap/tabledap'
-
-    # construct full URL
-    url = '{}/{}.csvp?time%2Cdepth%2Clatitude%2Clongitude%2Cconductivity%2Ctemperature%2Csalinity%2Cdensity%2Cpressure%2Cprofile_id'.format(base_url, ID)
-
-    # read *.csv file from ERRDAP server 
-    df = pd.read_csv(url,
-                     header=0,
-                     names=['time', 'depth', 'lat', 'lon', 'conductivity',
-                            'temperature', 'salinity', 'density', 'pressure',
-                            'profile_id'])
-    
-    # only retain complete rows
-    df = df.dropna()
-    
-    # The time column is a string which is formatted in a specific way that
-    # allows us to extract the individual parts of the date and time
-    df['time'] = pd.to_datetime(df['time'], format='%Y-%m-%dT%H:%M:%SZ')
-       
-    # Now that we successfully formatted our time column, we will use it to replace
-    # the (meaningless) integer labels
-    df = df.set_index('time')
+    if infile is not None:
+        # read and clean the data
+        df = read_glider_csv(infile)
+    else:
+        # construct full URL
+        url = '{}/{}.csvp?time%2Cdepth%2Clatitude%2Clongitude%2Cconductivity%2Ctemperature%2Csalinity%2Cdensity%2Cpressure%2Cprofile_id'.format(base_url, ID)
+        
+        # the raw data are saved as data/raw/<ID>.csvp while they are parsed
+        # (a dropped connection is resumed, see Python/pipeline/fetch.py)
+        with fetch.open_url(url, 'data/raw/{}.csvp'.format(ID)) as src:
+            df = read_glider_csv(src)
     
     # name of output file
-    outfile = os.path.join('data/raw/{}.h5'.format(ID))
+    if outfile is None:
+        outfile = os.path.join('data/raw/{}.h5'.format(ID))
     
     # create output directory if it does not exist
     if not os.path.exists(os.path.dirname(outfile)):
         os.makedirs(os.path.dirname(outfile))
         
-    # save data in HDF5 store
-    store = pd.HDFStore(outfile, 'w')
-    store.put('df', df, data_columns=df.columns)
-    store.close()
+    # save data in HDF5 store (as appendable table with an indexed time
+    # column, see Python/pipeline/gliderstore.py)
+    with instrument.stage('glider.write_hdf') as st:
+        st.add_bytes(gliderstore.write_store(df, outfile))
     
     return df
 
 
+#%%
+def read_glider_csv(source):
+    '''
+    Reads glider data in ERDDAP's *.csvp format, flags the data and uses the
+    time as index. This is also used for the new rows of realtime deployments
+    (see Python/pipeline/realtime.py).
+    
+    Input:
+    - source: URL, file name or file-like object of *.csvp data
+    
+    Output:
+    - df: pandas.DataFrame() with glider data
+    '''
+
+    # read *.csv file from ERRDAP server 
+    with instrument.stage('glider.transfer_parse_csv'):
+        df = pd.read_csv(source,
+                         header=0,
+                         names=['time', 'depth', 'lat', 'lon', 'conductivity',
+                                'temperature', 'salinity', 'density',
+                                'pressure', 'profile_id'])
+    
+    # only drop rows without time or position; missing or bad sensor values
+    # are flagged instead (flags are stored next to the data as
+    # <variable>_qc columns, see Python/pipeline/qc.py)
+    df = df.dropna(subset=['time', 'lat', 'lon'])
+    
+    with instrument.stage('glider.qc'):
+        df = df.join(qc.flag_dataframe(df, qc.GLIDER_TESTS,
+                                       group='profile_id'))
+    
+    # The time column is a string which is formatted in a specific way that
+    # allows us to extract the individual parts of the date and time
+    with instrument.stage('glider.to_datetime'):
+        df['time'] = pd.to_datetime(df['time'], format='%Y-%m-%dT%H:%M:%SZ')
+       
+    # Now that we successfully formatted our time column, we will use it to replace
+    # the (meaningless) integer labels
+    return df.set_index('time')
+
+
 #%%
 if __name__ == "__main__":
     main()
\ No newline at end of file